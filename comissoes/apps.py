@@ -2,4 +2,10 @@ from django.apps import AppConfig
 
 class ComissoesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'comissoes'
\ No newline at end of file
+    name = 'comissoes'
+
+    def ready(self):
+        # Regista os sinais que mantêm os totais pagos dos lotes
+        from . import signals  # noqa: F401
+        # Regista a definição da exportação de lotes (tarefas em segundo plano)
+        from . import exportacao  # noqa: F401
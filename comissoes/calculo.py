@@ -0,0 +1,145 @@
+# Em: comissoes/calculo.py
+#
+# Motor de cálculo de comissões. A cascata é sempre a mesma:
+#   1. valor personalizado da venda (comissao_personalizada_valor);
+#   2. exceção do vendedor para o produto (RegraComissaoVendedor);
+#   3. regra padrão do produto.
+# Para recálculos em massa as regras são carregadas uma única vez para
+# memória e as vendas são escritas com bulk_update em lotes.
+
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from common.models import Produto
+from vendas.models import Venda
+from vendas.resumo import atualizar_resumo_das_vendas
+from .models import LotePagamentoComissao, RegraComissaoVendedor
+from .pagamentos import atualizar_status_lotes
+
+CENTAVOS = Decimal('0.01')
+TAMANHO_LOTE = 1000
+
+
+def valor_da_regra(tipo_comissao, valor_comissao, honorarios):
+    """ Aplica uma regra ('F' = valor fixo, 'P' = percentual sobre os honorários). """
+    if tipo_comissao == 'F':
+        valor = valor_comissao
+    else:
+        valor = honorarios * (valor_comissao / Decimal(100))
+    # (Mesmo arredondamento que o DecimalField aplica ao gravar)
+    return Decimal(valor).quantize(CENTAVOS)
+
+
+def calcular_comissao(venda):
+    """ Comissão de uma única venda (no máximo 1 query, à exceção do vendedor). """
+    if venda.comissao_personalizada_valor is not None:
+        return venda.comissao_personalizada_valor
+    regra = RegraComissaoVendedor.objects.filter(
+        vendedor_id=venda.vendedor_id, produto_id=venda.produto_id
+    ).values_list('tipo_comissao', 'valor_comissao').first()
+    if regra is None:
+        regra = (venda.produto.tipo_comissao, venda.produto.valor_comissao)
+    return valor_da_regra(regra[0], regra[1], venda.honorarios)
+
+
+@dataclass
+class TabelaRegras:
+    """ Regras de comissão em memória: exceções por (vendedor_id, produto_id) e padrões por produto_id. """
+    excecoes: dict
+    padroes: dict
+
+    @classmethod
+    def carregar(cls):
+        excecoes = {
+            (vendedor_id, produto_id): (tipo, valor)
+            for vendedor_id, produto_id, tipo, valor in RegraComissaoVendedor.objects.values_list(
+                'vendedor_id', 'produto_id', 'tipo_comissao', 'valor_comissao'
+            )
+        }
+        padroes = {
+            produto_id: (tipo, valor)
+            for produto_id, tipo, valor in Produto.objects.values_list('id', 'tipo_comissao', 'valor_comissao')
+        }
+        return cls(excecoes, padroes)
+
+    def calcular(self, vendedor_id, produto_id, honorarios, personalizada=None):
+        if personalizada is not None:
+            return personalizada
+        regra = self.excecoes.get((vendedor_id, produto_id)) or self.padroes[produto_id]
+        return valor_da_regra(regra[0], regra[1], honorarios)
+
+
+@dataclass
+class DiferencaComissao:
+    venda_id: int
+    lote_id: int
+    anterior: Decimal
+    nova: Decimal
+
+
+def vendas_a_recalcular(vendas=None, incluir_lotes=False):
+    """ Vendas aprovadas; por padrão só as que ainda não estão num lote de pagamento. """
+    vendas = (Venda.objects.all() if vendas is None else vendas).filter(status_pagamento='aprovado')
+    if not incluir_lotes:
+        vendas = vendas.filter(lote_pagamento__isnull=True)
+    return vendas
+
+
+def comparar_comissoes(vendas, regras=None):
+    """
+    Percorre as vendas (só os campos necessários, em blocos) e devolve
+    as diferenças entre a comissão gravada e a que as regras atuais dão.
+    """
+    regras = regras or TabelaRegras.carregar()
+    linhas = vendas.order_by().values_list(
+        'id', 'vendedor_id', 'produto_id', 'honorarios',
+        'comissao_personalizada_valor', 'comissao_calculada_final', 'lote_pagamento_id',
+    ).iterator(chunk_size=TAMANHO_LOTE)
+
+    diferencas = []
+    for venda_id, vendedor_id, produto_id, honorarios, personalizada, atual, lote_id in linhas:
+        nova = regras.calcular(vendedor_id, produto_id, honorarios, personalizada)
+        if nova != atual:
+            diferencas.append(DiferencaComissao(venda_id, lote_id, atual, nova))
+    return diferencas
+
+
+def _atualizar_totais_lotes(lote_ids):
+    """ Recalcula o total devido (e o status) dos lotes cujas vendas mudaram de comissão. """
+    lotes = LotePagamentoComissao.objects.filter(id__in=lote_ids)
+    soma = Venda.objects.filter(lote_pagamento=OuterRef('pk')).order_by().values(
+        'lote_pagamento'
+    ).annotate(soma=Sum('comissao_calculada_final')).values('soma')
+    lotes.update(total_comissoes=Coalesce(Subquery(soma), Value(Decimal(0))))
+    atualizar_status_lotes(lotes)
+
+
+@transaction.atomic
+def recalcular_comissoes(vendas=None, incluir_lotes=False, dry_run=False):
+    """
+    Recalcula a comissão de um queryset de vendas aprovadas (por padrão,
+    todas as que ainda não estão num lote) e grava só as que mudaram.
+    Retorna a lista de DiferencaComissao; com dry_run=True nada é gravado.
+    """
+    diferencas = comparar_comissoes(vendas_a_recalcular(vendas, incluir_lotes))
+    if dry_run or not diferencas:
+        return diferencas
+
+    Venda.objects.bulk_update(
+        [Venda(id=d.venda_id, comissao_calculada_final=d.nova) for d in diferencas],
+        ['comissao_calculada_final'],
+        batch_size=TAMANHO_LOTE,
+    )
+    # ('bulk_update()' não dispara os sinais do resumo diário)
+    ids = [d.venda_id for d in diferencas]
+    for i in range(0, len(ids), TAMANHO_LOTE):
+        atualizar_resumo_das_vendas(Venda.objects.filter(id__in=ids[i:i + TAMANHO_LOTE]))
+
+    lote_ids = {d.lote_id for d in diferencas if d.lote_id}
+    if lote_ids:
+        _atualizar_totais_lotes(lote_ids)
+    return diferencas
@@ -0,0 +1,81 @@
+# Em: comissoes/exportacao.py
+#
+# Definição das colunas do relatório de Lotes de Comissão (usada pelas exportações).
+
+from common.exportacao import EXPORTACAO_CHUNK_SIZE, DefinicaoExportacao, registar_exportacao
+
+from .filtros import FILTROS_LOTES, filtrar_lotes
+from .models import LotePagamentoComissao
+
+LOTES_CABECALHO_CSV = ['Lote ID', 'Data Fechamento', 'Vendedor', 'Responsável (Fechou)',
+                       'Período Início', 'Período Fim',
+                       'Total Devido', 'Total Pago', 'Status']
+
+LOTES_CABECALHO_XLSX = ['Lote ID', 'Data Fechamento', 'Vendedor', 'Responsável (Fechou)',
+                        'Período Início', 'Período Fim',
+                        'Total Devido (R$)', 'Total Pago (R$)', 'Status']
+
+LOTES_CAMPOS = [
+    'id',
+    'data_fechamento',
+    'vendedor__username',
+    'responsavel_fechamento__username',
+    'periodo_inicio',
+    'periodo_fim',
+    'total_comissoes',
+    'total_pago_efetivamente',
+    'status',
+]
+
+_STATUS_LOTE = dict(LotePagamentoComissao.STATUS_CHOICES)
+
+
+def _linhas_brutas(lotes):
+    """ Tuplas (values_list) dos lotes, lidas do banco em blocos. """
+    return lotes.values_list(*LOTES_CAMPOS).iterator(chunk_size=EXPORTACAO_CHUNK_SIZE)
+
+
+def linhas_lotes_csv(lotes):
+    for (lote_id, data_fechamento, vendedor, responsavel, periodo_inicio, periodo_fim,
+         total_comissoes, total_pago, status) in _linhas_brutas(lotes):
+        yield [
+            lote_id,
+            data_fechamento.strftime('%Y-%m-%d %H:%M'),
+            vendedor,
+            responsavel,
+            periodo_inicio,
+            periodo_fim,
+            total_comissoes,
+            total_pago,
+            _STATUS_LOTE.get(status, status),
+        ]
+
+
+def linhas_lotes_xlsx(lotes):
+    for (lote_id, data_fechamento, vendedor, responsavel, periodo_inicio, periodo_fim,
+         total_comissoes, total_pago, status) in _linhas_brutas(lotes):
+        yield [
+            lote_id,
+            data_fechamento.replace(tzinfo=None),
+            vendedor,
+            responsavel,
+            periodo_inicio,
+            periodo_fim,
+            float(total_comissoes or 0),
+            float(total_pago or 0),
+            _STATUS_LOTE.get(status, status),
+        ]
+
+
+registar_exportacao(DefinicaoExportacao(
+    tipo='lotes',
+    filtrar=filtrar_lotes,
+    campos_filtro=FILTROS_LOTES,
+    nome_ficheiro='relatorio_lotes_comissao',
+    cabecalho_csv=LOTES_CABECALHO_CSV,
+    linhas_csv=linhas_lotes_csv,
+    titulo_xlsx="Lotes de Comissão",
+    cabecalho_xlsx=LOTES_CABECALHO_XLSX,
+    linhas_xlsx=linhas_lotes_xlsx,
+    largura_colunas=22,
+))
@@ -0,0 +1,89 @@
+# Em: comissoes/fechamento.py
+#
+# Fecho de comissões em conjunto: em vez de 3 queries por vendedor, as
+# vendas a pagar são bloqueadas e lidas numa única query, os lotes são
+# criados com um bulk_create e as vendas são ligadas aos lotes com um
+# UPDATE ... SET lote_pagamento_id = CASE vendedor_id ... por bloco de ids.
+
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+
+from vendas.models import Venda
+from vendas.resumo import inicio_do_dia
+from .models import LotePagamentoComissao
+
+TAMANHO_BLOCO_UPDATE = 1000
+
+
+def _limite(valor):
+    """ Uma data conta a partir do início do dia local (datetime 'aware'). """
+    if isinstance(valor, date) and not isinstance(valor, datetime):
+        return inicio_do_dia(valor)
+    return valor
+
+
+def vendas_por_fechar(data_inicio, data_fim_exclusiva, vendedor_id=None):
+    """ Vendas aprovadas ainda sem lote no período [data_inicio, data_fim_exclusiva). """
+    vendas = Venda.objects.filter(
+        status_pagamento='aprovado',
+        lote_pagamento__isnull=True,
+        data_venda__gte=_limite(data_inicio),
+        data_venda__lt=_limite(data_fim_exclusiva),
+    )
+    if vendedor_id:
+        vendas = vendas.filter(vendedor_id=vendedor_id)
+    return vendas
+
+
+@transaction.atomic
+def fechar_comissoes(responsavel, data_inicio, data_fim, data_fim_exclusiva, vendedor_id=None):
+    """
+    Cria um lote por vendedor com comissões a pagar no período e liga-lhe as vendas.
+
+    As vendas são bloqueadas com SELECT ... FOR UPDATE SKIP LOCKED: se outro
+    utilizador estiver a fechar ao mesmo tempo, as vendas que ele bloqueou
+    são ignoradas aqui (e, depois do commit dele, já têm lote), por isso
+    nenhuma venda fica em dois lotes. Retorna a lista de lotes criados.
+    """
+    linhas = (
+        vendas_por_fechar(data_inicio, data_fim_exclusiva, vendedor_id)
+        .select_for_update(skip_locked=True)
+        .order_by()
+        .values_list('id', 'vendedor_id', 'comissao_calculada_final')
+    )
+
+    ids_por_vendedor = defaultdict(list)
+    total_por_vendedor = defaultdict(Decimal)
+    for venda_id, venda_vendedor_id, comissao in linhas:
+        ids_por_vendedor[venda_vendedor_id].append(venda_id)
+        total_por_vendedor[venda_vendedor_id] += comissao or Decimal(0)
+
+    vendedores = sorted(v for v, total in total_por_vendedor.items() if total > 0)
+    if not vendedores:
+        return []
+
+    lotes = LotePagamentoComissao.objects.bulk_create([
+        LotePagamentoComissao(
+            vendedor_id=vendedor,
+            periodo_inicio=data_inicio,
+            periodo_fim=data_fim,
+            responsavel_fechamento=responsavel,
+            status='pendente',
+            total_comissoes=total_por_vendedor[vendedor],
+        )
+        for vendedor in vendedores
+    ])
+    lote_por_vendedor = {lote.vendedor_id: lote.id for lote in lotes}
+
+    ids = [venda_id for vendedor in vendedores for venda_id in ids_por_vendedor[vendedor]]
+    atribuicao = Case(
+        *[When(vendedor_id=vendedor, then=Value(lote_id)) for vendedor, lote_id in lote_por_vendedor.items()],
+        output_field=IntegerField(),
+    )
+    for i in range(0, len(ids), TAMANHO_BLOCO_UPDATE):
+        Venda.objects.filter(id__in=ids[i:i + TAMANHO_BLOCO_UPDATE]).update(lote_pagamento_id=atribuicao)
+    return lotes
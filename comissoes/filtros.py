@@ -0,0 +1,48 @@
+# Em: comissoes/filtros.py
+
+from datetime import datetime, timedelta
+
+from common.permissions import get_permissoes
+
+from .models import LotePagamentoComissao
+
+# Parâmetros (GET) aceites pelos filtros do histórico de lotes
+FILTROS_LOTES = ('vendedor', 'status', 'data_inicio', 'data_fim')
+
+
+def filtrar_lotes(user, params):
+    """
+    Retorna o queryset de Lotes filtrado pelos parâmetros ('params' é um
+    QueryDict ou dicionário com as chaves de FILTROS_LOTES) e com as
+    permissões corretas para o utilizador.
+    """
+    perms = get_permissoes(user)
+
+    # 1. Queryset Base
+    if perms.is_vendedor and not perms.pode_gerir_comissoes:
+        lotes_qs = LotePagamentoComissao.objects.filter(vendedor=user)
+    else:
+        lotes_qs = LotePagamentoComissao.objects.all()
+
+    # 2. Captura dos Parâmetros de Filtro
+    query_vendedor = params.get('vendedor', '')
+    query_status = params.get('status', '')
+    query_data_inicio = params.get('data_inicio', '')
+    query_data_fim = params.get('data_fim', '')
+
+    # 3. Aplicação dos Filtros
+    if perms.pode_gerir_comissoes and query_vendedor:
+        lotes_qs = lotes_qs.filter(vendedor_id=query_vendedor)
+    if query_status:
+        lotes_qs = lotes_qs.filter(status=query_status)
+    if query_data_inicio:
+        lotes_qs = lotes_qs.filter(data_fechamento__gte=query_data_inicio)
+    if query_data_fim:
+        try:
+            data_fim_dt = datetime.strptime(query_data_fim, '%Y-%m-%d').date() + timedelta(days=1)
+            lotes_qs = lotes_qs.filter(data_fechamento__lt=data_fim_dt)
+        except (ValueError, TypeError):
+            pass
+
+    # 4. Otimiza a query e retorna
+    return lotes_qs.select_related('vendedor', 'responsavel_fechamento').order_by('-data_fechamento')
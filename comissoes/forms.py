@@ -13,9 +13,12 @@ class TransacaoPagamentoForm(forms.ModelForm):
     
     anexo_comprovativo_pagamento = forms.FileField(
         label="Anexar Comprovativo (do Pagamento)",
-        required=True, 
-        widget=forms.FileInput(attrs={'class': 'form-control'})
+        required=False,
+        widget=forms.FileInput(attrs={'class': 'form-control', 'required': True})
     )
+    # (Upload direto: o browser envia o comprovativo ao S3 e manda só o token,
+    # confirmado na view; ver 'common/uploads_diretos.py')
+    comprovativo_token = forms.CharField(required=False, widget=forms.HiddenInput)
     
     class Meta:
         model = TransacaoPagamentoComissao
@@ -36,6 +39,12 @@ class TransacaoPagamentoForm(forms.ModelForm):
                     f"O valor pago (R$ {valor_pago}) é maior que o saldo devedor (R$ {saldo_devedor})."
                 )
         return valor_pago
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('anexo_comprovativo_pagamento') and not cleaned_data.get('comprovativo_token'):
+            self.add_error('anexo_comprovativo_pagamento', "Este campo é obrigatório.")
+        return cleaned_data
     
 class AnexoLoteForm(forms.ModelForm):
     """
@@ -51,6 +60,25 @@ class AnexoLoteForm(forms.ModelForm):
         model = AnexoLoteComissao
         fields = ['anexo_nf_vendedor']
 
+class PagamentosEmMassaForm(forms.Form):
+    """ Ficheiro (CSV ou XLSX) com as colunas lote_id e valor_pago. """
+    ficheiro = forms.FileField(
+        label="Ficheiro de Pagamentos (.csv ou .xlsx)",
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'})
+    )
+    descricao = forms.CharField(
+        label="Descrição (opcional)",
+        required=False,
+        max_length=255,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ex: Folha de Outubro'})
+    )
+
+    def clean_ficheiro(self):
+        ficheiro = self.cleaned_data.get('ficheiro')
+        if ficheiro and not ficheiro.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Envie um ficheiro .csv ou .xlsx.")
+        return ficheiro
+
 class MetaVendaForm(forms.ModelForm):
     """ Formulário para Admin/Gestor criar ou editar metas no front-end. """
     
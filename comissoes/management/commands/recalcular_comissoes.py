@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from vendas.models import Venda
+from comissoes.calculo import recalcular_comissoes
+
+
+class Command(BaseCommand):
+    help = "Recalcula as comissões das vendas aprovadas com as regras atuais (produtos e exceções por vendedor)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Apenas mostra as diferenças, sem gravar.",
+        )
+        parser.add_argument(
+            '--incluir-lotes', action='store_true',
+            help="Inclui vendas que já estão num lote de pagamento (os totais dos lotes são atualizados).",
+        )
+        parser.add_argument('--vendedor', type=int, help="Só as vendas deste vendedor (id).")
+        parser.add_argument('--produto', type=int, help="Só as vendas deste produto (id).")
+
+    def handle(self, *args, **options):
+        vendas = Venda.objects.all()
+        if options['vendedor']:
+            vendas = vendas.filter(vendedor_id=options['vendedor'])
+        if options['produto']:
+            vendas = vendas.filter(produto_id=options['produto'])
+
+        diferencas = recalcular_comissoes(
+            vendas, incluir_lotes=options['incluir_lotes'], dry_run=options['dry_run']
+        )
+
+        for d in diferencas:
+            lote = f" (lote #{d.lote_id})" if d.lote_id else ""
+            self.stdout.write(f"Venda #{d.venda_id}{lote}: {d.anterior} -> {d.nova}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"[dry-run] {len(diferencas)} comissão(ões) seriam alteradas."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(diferencas)} comissão(ões) recalculada(s)."))
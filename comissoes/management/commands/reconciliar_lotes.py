@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from comissoes.pagamentos import reconciliar_totais_pagos
+
+
+class Command(BaseCommand):
+    help = "Confere o total pago de todos os lotes de comissão com a soma das suas transações."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corrigir', action='store_true',
+            help="Grava os totais (e status) corretos nos lotes divergentes.",
+        )
+
+    def handle(self, *args, **options):
+        divergencias = reconciliar_totais_pagos(corrigir=options['corrigir'])
+
+        for d in divergencias:
+            self.stdout.write(f"Lote #{d.lote_id}: gravado {d.gravado}, transações {d.transacoes}")
+
+        if not divergencias:
+            self.stdout.write(self.style.SUCCESS("Todos os lotes estão conciliados."))
+        elif options['corrigir']:
+            self.stdout.write(self.style.SUCCESS(f"{len(divergencias)} lote(s) corrigido(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{len(divergencias)} lote(s) divergente(s). Use --corrigir para os atualizar."
+            ))
@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from comissoes.pagamentos import ler_pagamentos, registar_pagamentos_em_massa
+
+
+class Command(BaseCommand):
+    help = "Regista os pagamentos de vários lotes a partir de um CSV/XLSX com as colunas lote_id e valor_pago."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ficheiro', help="Caminho do ficheiro .csv ou .xlsx.")
+        parser.add_argument(
+            '--responsavel', required=True,
+            help="Username do utilizador responsável pelos pagamentos.",
+        )
+        parser.add_argument('--descricao', help="Descrição gravada em cada transação.")
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Apenas valida o ficheiro, sem gravar.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            responsavel = User.objects.get(username=options['responsavel'])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilizador '{options['responsavel']}' não encontrado.")
+
+        caminho = options['ficheiro']
+        try:
+            with open(caminho, 'rb') as ficheiro:
+                linhas, erros = ler_pagamentos(ficheiro, caminho)
+        except OSError as exc:
+            raise CommandError(f"Não foi possível ler o ficheiro: {exc}")
+
+        if not erros:
+            descricao = options['descricao'] or f"Pagamento em massa ({caminho.rsplit('/', 1)[-1]})"
+            transacoes, erros = registar_pagamentos_em_massa(
+                linhas, responsavel, descricao, dry_run=options['dry_run']
+            )
+
+        if erros:
+            for erro in erros:
+                self.stderr.write(erro)
+            raise CommandError(f"{len(erros)} erro(s) no ficheiro. Nenhum pagamento foi registado.")
+
+        lotes = len({linha.lote_id for linha in linhas})
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"[dry-run] {len(linhas)} pagamento(s) válidos em {lotes} lote(s)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(transacoes)} pagamento(s) registado(s) em {lotes} lote(s)."))
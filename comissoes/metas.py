@@ -0,0 +1,100 @@
+# Em: comissoes/metas.py
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db.models import Q, Sum
+
+from vendas.models import Venda
+from vendas.resumo import inicio_do_dia
+from .models import MetaVenda
+
+
+def _filtro_vendas_da_meta(meta):
+    """
+    Condição (Q) das vendas que contam para a meta.
+    Metas de equipa usam uma subquery aos membros do grupo, em vez de um
+    JOIN por 'vendedor__groups' que duplicaria linhas nas outras somas.
+    """
+    data_fim_para_query = inicio_do_dia(meta.data_fim + timedelta(days=1))
+    filtro = Q(data_venda__gte=inicio_do_dia(meta.data_inicio), data_venda__lt=data_fim_para_query)
+    if meta.vendedor_id:
+        filtro &= Q(vendedor_id=meta.vendedor_id)
+    elif meta.grupo_id:
+        membros = User.groups.through.objects.filter(group_id=meta.grupo_id).values('user_id')
+        filtro &= Q(vendedor_id__in=membros)
+    return filtro
+
+
+def _titulo_meta(meta):
+    if meta.vendedor:
+        vendedor_nome = meta.vendedor.get_full_name() or meta.vendedor.username
+        return f"Meta Individual ({vendedor_nome})"
+    if meta.grupo:
+        return f"Meta Equipa ({meta.grupo.name})"
+    return "Meta Geral da Empresa"
+
+
+def calcular_progresso_metas(metas):
+    """
+    Calcula o progresso (soma de 'valor_entrada' das vendas aprovadas) de
+    várias metas numa única query, com uma agregação condicional por meta:
+
+        SELECT SUM(valor_entrada) FILTER (WHERE <meta 1>), ... FROM venda
+        WHERE status_pagamento = 'aprovado' AND data_venda no intervalo total
+
+    Retorna um dicionário {meta.id: Decimal}.
+    """
+    metas = list(metas)
+    if not metas:
+        return {}
+
+    inicio = min(meta.data_inicio for meta in metas)
+    fim = max(meta.data_fim for meta in metas) + timedelta(days=1)
+    agregacoes = {
+        f"meta_{meta.id}": Sum('valor_entrada', filter=_filtro_vendas_da_meta(meta))
+        for meta in metas
+    }
+    totais = Venda.objects.filter(
+        status_pagamento='aprovado',
+        data_venda__gte=inicio_do_dia(inicio),
+        data_venda__lt=inicio_do_dia(fim),
+    ).aggregate(**agregacoes)
+    return {meta.id: totais[f"meta_{meta.id}"] or Decimal(0) for meta in metas}
+
+
+def get_progresso_metas(metas):
+    """
+    Lista de dicionários prontos para os templates / API, na ordem das metas.
+    (As metas devem vir com select_related('vendedor', 'grupo'))
+    """
+    metas = list(metas)
+    progressos = calcular_progresso_metas(metas)
+    meta_data_list = []
+    for meta in metas:
+        progresso = progressos[meta.id]
+        percentual = int((progresso / meta.valor_meta) * 100) if meta.valor_meta > 0 else 0
+        meta_data_list.append({
+            'meta': meta,
+            'meta_titulo': _titulo_meta(meta),
+            'meta_periodo': f"{meta.data_inicio.strftime('%d/%m')} - {meta.data_fim.strftime('%d/%m')}",
+            'meta_valor': meta.valor_meta,
+            'meta_progresso': progresso,
+            'meta_percentual': percentual,
+        })
+    return meta_data_list
+
+
+def get_metas_ativas_visiveis(user, perms, data):
+    """
+    Metas ativas na data indicada que o utilizador pode ver:
+    Admin/Gestor/Financeiro/Advogado veem todas; o Vendedor vê as suas,
+    as Gerais e as das suas Equipas.
+    """
+    metas = MetaVenda.objects.filter(data_inicio__lte=data, data_fim__gte=data)
+    if not perms.ve_todas_as_vendas:
+        metas = metas.filter(
+            Q(vendedor=user) | Q(vendedor__isnull=True, grupo__isnull=True) | Q(grupo__in=user.groups.all())
+        )
+    return metas.select_related('vendedor', 'grupo').order_by('grupo', 'vendedor')
@@ -2,9 +2,7 @@
 
 import os
 import uuid 
-from django.db import models
-from decimal import Decimal
-from django.db.models import Sum
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
@@ -103,23 +101,15 @@ class TransacaoPagamentoComissao(models.Model):
     class Meta:
         db_table = 'vendas_transacaopagamentocomissao' # <-- Tabela antiga
 
+    def save(self, *args, **kwargs):
+        # (Os sinais leem a transação antiga com a linha bloqueada e ajustam o
+        #  total do lote: tudo numa só transação, ver 'comissoes/signals.py')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Pagamento de R$ {self.valor_pago} para Lote #{self.lote.id}"
 
-    def save(self, *args, **kwargs):
-        """ Gatilho para atualizar o Lote """
-        super().save(*args, **kwargs)
-        lote = self.lote
-        novo_total_pago = lote.transacoes_pagamento.aggregate(soma=Sum('valor_pago'))['soma'] or Decimal(0)
-        lote.total_pago_efetivamente = novo_total_pago
-        if novo_total_pago == 0:
-            lote.status = 'pendente'
-        elif novo_total_pago < lote.total_comissoes:
-            lote.status = 'pago_parcialmente'
-        else:
-            lote.status = 'pago_integralmente'
-        lote.save()
-
 class AnexoLoteComissao(models.Model):
     lote = models.ForeignKey(LotePagamentoComissao, on_delete=models.CASCADE, 
                              related_name="anexos_lote")
@@ -129,6 +119,8 @@ class AnexoLoteComissao(models.Model):
         null=True, blank=True
     )
     descricao = models.CharField(max_length=255, blank=True, null=True, verbose_name="Nome Original/Descrição")
+    # (Ficheiros guardados por conteúdo, ver 'common/armazenamento.py')
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True, editable=False, verbose_name="SHA-256")
     data_upload = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -0,0 +1,240 @@
+# Em: comissoes/pagamentos.py
+#
+# Totais pagos dos lotes de comissão. O 'total_pago_efetivamente' é mantido
+# de forma incremental (UPDATE ... SET total = total + delta) com o lote
+# bloqueado, em vez de reagregar todas as transações a cada pagamento.
+# 'reconciliar_totais_pagos' confere (e corrige) todos os lotes de uma vez.
+# 'registar_pagamentos_em_massa' regista o pagamento de muitos lotes
+# (folha de pagamento) a partir de um CSV/XLSX com (lote_id, valor_pago).
+
+import csv
+import io
+import zipfile
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from xml.etree.ElementTree import ParseError
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import LotePagamentoComissao, TransacaoPagamentoComissao
+
+# Margem aceite acima do saldo devedor (arredondamentos)
+TOLERANCIA_SALDO = Decimal('0.01')
+CENTAVOS = Decimal('0.01')
+
+# Status do lote a partir dos totais já gravados (usar num UPDATE)
+STATUS_DO_LOTE = Case(
+    When(total_pago_efetivamente__lte=0, then=Value('pendente')),
+    When(total_pago_efetivamente__lt=F('total_comissoes'), then=Value('pago_parcialmente')),
+    default=Value('pago_integralmente'),
+)
+
+
+def atualizar_status_lotes(lotes):
+    """ Recalcula o status de um queryset de lotes num único UPDATE. """
+    return lotes.update(status=STATUS_DO_LOTE)
+
+
+@transaction.atomic
+def ajustar_total_pago(lote_id, delta):
+    """ Soma 'delta' ao total pago do lote (com o lote bloqueado) e atualiza o status. """
+    if not delta:
+        return
+    lote = LotePagamentoComissao.objects.filter(pk=lote_id)
+    # (SELECT ... FOR UPDATE: pagamentos simultâneos no mesmo lote esperam um pelo outro)
+    list(lote.select_for_update().values_list('pk', flat=True))
+    lote.update(total_pago_efetivamente=F('total_pago_efetivamente') + delta)
+    atualizar_status_lotes(lote)
+
+
+@dataclass
+class DivergenciaLote:
+    lote_id: int
+    gravado: Decimal
+    transacoes: Decimal
+
+
+def reconciliar_totais_pagos(corrigir=False):
+    """
+    Compara o 'total_pago_efetivamente' de todos os lotes com a soma das
+    suas transações (uma única query). Com corrigir=True grava os totais
+    certos e o status. Retorna a lista de DivergenciaLote.
+    """
+    soma_transacoes = Subquery(
+        TransacaoPagamentoComissao.objects.filter(lote=OuterRef('pk'))
+        .order_by().values('lote').annotate(soma=Sum('valor_pago')).values('soma')
+    )
+    lotes = LotePagamentoComissao.objects.annotate(
+        soma_transacoes=Coalesce(soma_transacoes, Value(Decimal(0)))
+    ).exclude(total_pago_efetivamente=F('soma_transacoes'))
+
+    divergencias = [
+        DivergenciaLote(lote_id, gravado, soma)
+        for lote_id, gravado, soma in lotes.order_by('pk').values_list('pk', 'total_pago_efetivamente', 'soma_transacoes')
+    ]
+    if corrigir and divergencias:
+        with transaction.atomic():
+            LotePagamentoComissao.objects.bulk_update(
+                [LotePagamentoComissao(pk=d.lote_id, total_pago_efetivamente=d.transacoes) for d in divergencias],
+                ['total_pago_efetivamente'],
+                batch_size=1000,
+            )
+            atualizar_status_lotes(LotePagamentoComissao.objects.filter(pk__in=[d.lote_id for d in divergencias]))
+    return divergencias
+
+
+# --- Pagamentos em massa ---
+
+@dataclass
+class LinhaPagamento:
+    linha: int
+    lote_id: int
+    valor_pago: Decimal
+
+
+class FicheiroIlegivel(Exception):
+    """ O ficheiro de pagamentos não é um CSV/XLSX válido. """
+
+
+def _converter_valor(bruto):
+    """ Aceita 1234.56, 1234,56 e 1.234,56 (e números vindos do XLSX). """
+    if isinstance(bruto, float):
+        # (Números do XLSX: arredonda os erros de vírgula flutuante, ex. 0.30000000000000004)
+        return Decimal(str(bruto)).quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+    if isinstance(bruto, (int, Decimal)):
+        valor = Decimal(bruto)
+    else:
+        texto = str(bruto).strip().replace('R$', '').replace(' ', '')
+        if ',' in texto:
+            texto = texto.replace('.', '').replace(',', '.')
+        valor = Decimal(texto)
+    if not valor.is_finite():
+        raise InvalidOperation(bruto)
+    return valor
+
+
+def _vazia(celula):
+    return celula is None or str(celula).strip() == ''
+
+
+def _linhas_do_ficheiro(ficheiro, nome):
+    """ Linhas (tuplos de células) de um CSV (',' ou ';') ou XLSX. """
+    if nome.lower().endswith('.xlsx'):
+        # (Import local: o openpyxl só é necessário para este formato)
+        import openpyxl
+        from openpyxl.utils.exceptions import InvalidFileException
+        try:
+            workbook = openpyxl.load_workbook(ficheiro, read_only=True, data_only=True)
+            yield from workbook.active.iter_rows(values_only=True)
+            workbook.close()
+        except (zipfile.BadZipFile, InvalidFileException, KeyError, ParseError, EOFError) as exc:
+            raise FicheiroIlegivel("O ficheiro .xlsx está corrompido ou não é uma folha de cálculo.") from exc
+        return
+    dados = ficheiro.read()
+    try:
+        texto = dados.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        # (CSV gravado pelo Excel em português: Windows-1252)
+        texto = dados.decode('cp1252', errors='replace')
+    amostra = texto[:2048]
+    delimitador = ';' if amostra.count(';') > amostra.count(',') else ','
+    try:
+        yield from csv.reader(io.StringIO(texto, newline=''), delimiter=delimitador)
+    except csv.Error as exc:
+        raise FicheiroIlegivel(f"O ficheiro .csv não pôde ser lido ({exc}).") from exc
+
+
+def ler_pagamentos(ficheiro, nome):
+    """
+    Lê um ficheiro com as colunas (lote_id, valor_pago); um cabeçalho na
+    primeira linha é ignorado. Retorna (linhas, erros).
+    """
+    linhas, erros = [], []
+    try:
+        for numero, celulas in enumerate(_linhas_do_ficheiro(ficheiro, nome), start=1):
+            # (As colunas são lidas pela posição: uma célula vazia não desloca as seguintes)
+            celulas = list(celulas or ())
+            if all(_vazia(c) for c in celulas):
+                continue
+            bruto_lote, bruto_valor = (celulas + [None, None])[:2]
+            if _vazia(bruto_lote) or _vazia(bruto_valor):
+                erros.append(f"Linha {numero}: esperadas as colunas lote_id e valor_pago.")
+                continue
+            try:
+                lote_id = int(str(bruto_lote).strip().lstrip('#'))
+                valor = _converter_valor(bruto_valor)
+            except (ValueError, InvalidOperation):
+                if numero == 1:
+                    # (Cabeçalho)
+                    continue
+                erros.append(f"Linha {numero}: lote ou valor inválido ({bruto_lote!r}, {bruto_valor!r}).")
+                continue
+            if valor <= 0:
+                erros.append(f"Linha {numero}: o valor pago deve ser positivo.")
+                continue
+            if valor.normalize().as_tuple().exponent < -2:
+                erros.append(f"Linha {numero}: o valor pago ({bruto_valor}) tem mais de duas casas decimais.")
+                continue
+            linhas.append(LinhaPagamento(numero, lote_id, valor))
+    except FicheiroIlegivel as exc:
+        return [], [str(exc)]
+    return linhas, erros
+
+
+@transaction.atomic
+def registar_pagamentos_em_massa(linhas, responsavel, descricao=None, dry_run=False):
+    """
+    Valida todas as linhas contra o saldo dos lotes (uma query, com os lotes
+    bloqueados), insere as transações com bulk_create e atualiza os totais
+    e o status dos lotes afetados com um UPDATE agrupado.
+
+    É tudo ou nada: se alguma linha for inválida nada é gravado.
+    Retorna (transacoes_criadas, erros).
+    """
+    total_por_lote = defaultdict(Decimal)
+    for linha in linhas:
+        total_por_lote[linha.lote_id] += linha.valor_pago
+    if not total_por_lote:
+        return [], ["Nenhum pagamento encontrado no ficheiro."]
+
+    # (Bloqueados por ordem de pk: duas folhas com os mesmos lotes não entram em deadlock)
+    saldos = {
+        lote_id: total_comissoes - total_pago
+        for lote_id, total_comissoes, total_pago in LotePagamentoComissao.objects.filter(
+            pk__in=total_por_lote
+        ).select_for_update().order_by('pk').values_list('pk', 'total_comissoes', 'total_pago_efetivamente')
+    }
+
+    erros = []
+    for linha in linhas:
+        if linha.lote_id not in saldos:
+            erros.append(f"Linha {linha.linha}: o lote #{linha.lote_id} não existe.")
+    for lote_id, total in sorted(total_por_lote.items()):
+        if lote_id in saldos and total > saldos[lote_id] + TOLERANCIA_SALDO:
+            erros.append(
+                f"Lote #{lote_id}: o valor pago (R$ {total}) é maior que o saldo devedor (R$ {saldos[lote_id]})."
+            )
+    if erros or dry_run:
+        return [], erros
+
+    # ('bulk_create' não dispara os sinais: os totais são atualizados abaixo)
+    transacoes = TransacaoPagamentoComissao.objects.bulk_create([
+        TransacaoPagamentoComissao(
+            lote_id=linha.lote_id,
+            responsavel_pagamento=responsavel,
+            valor_pago=linha.valor_pago,
+            descricao=descricao,
+        )
+        for linha in linhas
+    ], batch_size=1000)
+
+    lotes = LotePagamentoComissao.objects.filter(pk__in=total_por_lote)
+    lotes.update(total_pago_efetivamente=F('total_pago_efetivamente') + Case(
+        *[When(pk=lote_id, then=Value(total)) for lote_id, total in total_por_lote.items()],
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    ))
+    atualizar_status_lotes(lotes)
+    return transacoes, []
@@ -0,0 +1,47 @@
+# Em: comissoes/signals.py
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from common.remocoes import apagar_ficheiros_ao_remover
+
+from .models import AnexoLoteComissao, TransacaoPagamentoComissao
+from .pagamentos import ajustar_total_pago
+
+
+@receiver(pre_save, sender=TransacaoPagamentoComissao)
+def guardar_pagamento_anterior(sender, instance, raw=False, **kwargs):
+    """
+    Guarda o lote e o valor antigos (uma edição pode mudar os dois).
+    A linha fica bloqueada até ao fim da transação aberta em
+    'TransacaoPagamentoComissao.save', que também cobre o post_save:
+    duas edições simultâneas não aplicam o mesmo delta duas vezes.
+    """
+    instance._pagamento_anterior = None
+    if raw or instance._state.adding:
+        return
+    instance._pagamento_anterior = TransacaoPagamentoComissao.objects.select_for_update().filter(
+        pk=instance.pk
+    ).values_list('lote_id', 'valor_pago').first()
+
+
+@receiver(post_save, sender=TransacaoPagamentoComissao)
+def somar_pagamento_ao_lote(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_pagamento_anterior', None)
+    if anterior and anterior[0] != instance.lote_id:
+        ajustar_total_pago(anterior[0], -anterior[1])
+        anterior = None
+    delta = instance.valor_pago - (anterior[1] if anterior else 0)
+    ajustar_total_pago(instance.lote_id, delta)
+
+
+@receiver(post_delete, sender=TransacaoPagamentoComissao)
+def retirar_pagamento_do_lote(sender, instance, **kwargs):
+    ajustar_total_pago(instance.lote_id, -instance.valor_pago)
+
+
+# Os ficheiros dos anexos (também na cascata de um Lote) vão para a fila de remoções
+apagar_ficheiros_ao_remover(TransacaoPagamentoComissao)
+apagar_ficheiros_ao_remover(AnexoLoteComissao)
@@ -1,3 +1,356 @@
+import csv
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from common.testing import criar_base, criar_lote, criar_utilizador, criar_venda
+from common.uploads_diretos import ErroUploadDireto
+from vendas.models import Venda, VendaResumoDiario
+
+from .calculo import recalcular_comissoes
+from .exportacao import LOTES_CABECALHO_CSV
+from .fechamento import fechar_comissoes
+from .metas import get_progresso_metas
+from .models import LotePagamentoComissao, MetaVenda, RegraComissaoVendedor, TransacaoPagamentoComissao
+from .pagamentos import ler_pagamentos, registar_pagamentos_em_massa
+from .views import METAS_POR_PAGINA
+
+
+class LerPagamentosTests(TestCase):
+
+    def ler(self, conteudo, nome='pagamentos.csv'):
+        return ler_pagamentos(io.BytesIO(conteudo), nome)
+
+    def test_csv_do_excel_em_cp1252(self):
+        linhas, erros = self.ler("lote_id;valor_pago;observação\n7;1.234,56;comissão\n".encode('cp1252'))
+        self.assertEqual(erros, [])
+        self.assertEqual([(l.lote_id, l.valor_pago) for l in linhas], [(7, Decimal('1234.56'))])
+
+    def test_xlsx_corrompido_devolve_erro(self):
+        linhas, erros = self.ler(b'PK\x03\x04 isto nao e um xlsx', 'pagamentos.xlsx')
+        self.assertEqual(linhas, [])
+        self.assertEqual(len(erros), 1)
+        self.assertIn('corrompido', erros[0])
+
+    def test_valor_com_mais_de_duas_casas_decimais(self):
+        linhas, erros = self.ler(b"lote_id;valor_pago\n7;10,005\n")
+        self.assertEqual(linhas, [])
+        self.assertIn('duas casas decimais', erros[0])
+
+    def test_celula_vazia_nao_desloca_as_colunas(self):
+        linhas, erros = self.ler(b"lote_id,valor_pago\n,50.00\n8,20.00\n")
+        self.assertEqual([l.lote_id for l in linhas], [8])
+        self.assertEqual(erros, ["Linha 2: esperadas as colunas lote_id e valor_pago."])
+
+    def test_xlsx_com_numeros(self):
+        import openpyxl
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['lote_id', 'valor_pago'])
+        workbook.active.append([7, 0.1 + 0.2])
+        saida = io.BytesIO()
+        workbook.save(saida)
+        linhas, erros = self.ler(saida.getvalue(), 'pagamentos.xlsx')
+        self.assertEqual(erros, [])
+        self.assertEqual(linhas[0].valor_pago, Decimal('0.30'))
+
+
+class PagamentosEmMassaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.financeiro = criar_utilizador('financeiro', 'Financeiro')
+        cls.vendedor = criar_utilizador('vendedor')
+        cls.lote = criar_lote(cls.vendedor, cls.financeiro)
+
+    def enviar(self, nome, conteudo):
+        self.client.force_login(self.financeiro)
+        return self.client.post(reverse('comissoes_pagamentos_em_massa'), {
+            'ficheiro': SimpleUploadedFile(nome, conteudo),
+        })
+
+    def test_ficheiros_invalidos_nao_dao_erro_500(self):
+        for nome, conteudo in (
+            ('pagamentos.xlsx', b'nao e um zip'),
+            ('pagamentos.csv', f"lote_id;valor_pago\n{self.lote.pk};10,00;ação\n".encode('cp1252')),
+            ('pagamentos.csv', f"lote_id;valor_pago\n{self.lote.pk};NaN\n".encode()),
+        ):
+            with self.subTest(nome=nome, conteudo=conteudo):
+                resposta = self.enviar(nome, conteudo)
+                self.assertIn(resposta.status_code, (200, 302))
+
+    def test_total_do_lote_igual_a_soma_das_transacoes(self):
+        linhas, erros = ler_pagamentos(io.BytesIO(
+            f"lote_id;valor_pago\n{self.lote.pk};10,01\n{self.lote.pk};0,1\n".encode()
+        ), 'pagamentos.csv')
+        self.assertEqual(erros, [])
+        registar_pagamentos_em_massa(linhas, self.financeiro)
+        self.lote.refresh_from_db()
+        soma = sum(TransacaoPagamentoComissao.objects.filter(lote=self.lote).values_list('valor_pago', flat=True))
+        self.assertEqual(self.lote.total_pago_efetivamente, soma)
+        self.assertEqual(soma, Decimal('10.11'))
+
+
+class TotalPagoTransacoesTests(TestCase):
+    """ 'total_pago_efetivamente' e status do lote ao criar, editar e apagar transações (sinais). """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.financeiro = criar_utilizador('financeiro', 'Financeiro')
+        vendedor = criar_utilizador('vendedor')
+        cls.lote = criar_lote(vendedor, cls.financeiro)
+        cls.outro_lote = criar_lote(vendedor, cls.financeiro)
+
+    def assertLote(self, lote, total, status):
+        lote.refresh_from_db()
+        self.assertEqual((lote.total_pago_efetivamente, lote.status), (Decimal(total), status))
+
+    def test_criar_editar_e_apagar(self):
+        transacao = TransacaoPagamentoComissao.objects.create(
+            lote=self.lote, responsavel_pagamento=self.financeiro, valor_pago=Decimal('40.00'),
+        )
+        self.assertLote(self.lote, '40.00', 'pago_parcialmente')
+
+        transacao.valor_pago = Decimal('100.00')
+        transacao.save()
+        self.assertLote(self.lote, '100.00', 'pago_integralmente')
+
+        # (Mudar de lote: sai do antigo e entra no novo, com o valor novo)
+        transacao.lote = self.outro_lote
+        transacao.valor_pago = Decimal('30.00')
+        transacao.save()
+        self.assertLote(self.lote, '0.00', 'pendente')
+        self.assertLote(self.outro_lote, '30.00', 'pago_parcialmente')
+
+        transacao.delete()
+        self.assertLote(self.outro_lote, '0.00', 'pendente')
+
+    def test_apagar_o_lote_com_transacoes(self):
+        TransacaoPagamentoComissao.objects.create(
+            lote=self.lote, responsavel_pagamento=self.financeiro, valor_pago=Decimal('10.00'),
+        )
+        self.lote.delete()
+        self.assertFalse(TransacaoPagamentoComissao.objects.exists())
+        self.assertLote(self.outro_lote, '0.00', 'pendente')
+
+
+class LoteDetalheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.financeiro = criar_utilizador('financeiro', 'Financeiro')
+        cls.vendedor, produto, cliente = criar_base()
+        cls.lotes = {}
+        for quantidade in (5, 200):
+            lote = criar_lote(cls.vendedor, cls.financeiro)
+            Venda.objects.bulk_create([
+                Venda(
+                    vendedor=cls.vendedor, produto=produto, cliente=cliente, honorarios=Decimal('100.00'),
+                    status_pagamento='aprovado', comissao_calculada_final=Decimal('10.00'), lote_pagamento=lote,
+                )
+                for _ in range(quantidade)
+            ])
+            cls.lotes[quantidade] = lote
+
+    def detalhe(self, quantidade):
+        resposta = self.client.get(reverse('comissoes_lote_detalhe', args=[self.lotes[quantidade].pk]))
+        self.assertEqual(resposta.status_code, 200)
+        return resposta
+
+    def registar_pagamento(self, **dados):
+        self.client.force_login(self.financeiro)
+        return self.client.post(
+            reverse('comissoes_lote_detalhe', args=[self.lotes[5].pk]), {'acao': 'add_transacao', **dados},
+        )
+
+    def test_pagamento_com_comprovativo_enviado_diretamente(self):
+        confirmado = [(f'comissoes/lote_{self.lotes[5].pk}/recibo.pdf', 'recibo.pdf', '')]
+        with mock.patch('comissoes.views.confirmar_uploads', return_value=confirmado) as confirmar:
+            resposta = self.registar_pagamento(valor_pago='10.00', comprovativo_token='token')
+        self.assertEqual(resposta.status_code, 302)
+        confirmar.assert_called_once_with(['token'], destino=f"lote:{self.lotes[5].pk}:comprovativo")
+        transacao = TransacaoPagamentoComissao.objects.get()
+        self.assertEqual(
+            (transacao.anexo_comprovativo_pagamento.name, transacao.descricao, transacao.valor_pago),
+            (confirmado[0][0], 'recibo.pdf', Decimal('10.00')),
+        )
+
+    def test_pagamento_sem_comprovativo_ou_com_token_invalido(self):
+        resposta = self.registar_pagamento(valor_pago='10.00')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('anexo_comprovativo_pagamento', resposta.context['transacao_form'].errors)
+
+        with mock.patch('comissoes.views.confirmar_uploads', side_effect=ErroUploadDireto("Upload expirado.")):
+            resposta = self.registar_pagamento(valor_pago='10.00', comprovativo_token='token')
+        self.assertEqual(
+            resposta.context['transacao_form'].errors['anexo_comprovativo_pagamento'], ["Upload expirado."],
+        )
+        self.assertFalse(TransacaoPagamentoComissao.objects.exists())
+
+    def test_numero_de_queries_nao_depende_do_numero_de_vendas(self):
+        self.client.force_login(self.financeiro)
+        # (O primeiro pedido preenche a cache de permissões)
+        self.detalhe(5)
+        with CaptureQueriesContext(connection) as poucas:
+            self.detalhe(5)
+        with self.assertNumQueries(len(poucas)):
+            resposta = self.detalhe(200)
+        self.assertEqual(len(resposta.context['vendas_no_lote']), 200)
+
+
+
+class ExportacaoLotesCsvTests(TestCase):
+
+    def test_csv_em_streaming(self):
+        responsavel = criar_utilizador('financeiro', 'Financeiro')
+        vendedor, _, _ = criar_base()
+        lote = criar_lote(vendedor, responsavel, total=Decimal('42.50'))
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+
+        resposta = self.client.get(reverse('export_lotes_csv'))
+        self.assertTrue(resposta.streaming)
+        self.assertEqual(resposta['Content-Disposition'], 'attachment; filename="relatorio_lotes_comissao.csv"')
+        linhas = list(csv.reader(io.StringIO(b''.join(resposta.streaming_content).decode()), delimiter=';'))
+        self.assertEqual(linhas, [LOTES_CABECALHO_CSV, [
+            str(lote.pk), lote.data_fechamento.strftime('%Y-%m-%d %H:%M'), 'vendedor', 'financeiro',
+            '2025-01-01', '2025-01-31', '42.50', '0.00', lote.get_status_display(),
+        ]])
+
+
+class FechoComissoesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.financeiro = criar_utilizador('financeiro', 'Financeiro')
+        cls.vendedor, produto, cliente = criar_base()
+        cls.outro = criar_utilizador('outro')
+        cls.sem_comissao = criar_utilizador('sem_comissao')
+        for vendedor, comissoes in (
+            (cls.vendedor, ['10.00', '15.50']), (cls.outro, ['7.25']), (cls.sem_comissao, ['0.00', None]),
+        ):
+            for comissao in comissoes:
+                criar_venda(
+                    vendedor, produto, cliente, status_pagamento='aprovado',
+                    comissao_calculada_final=comissao and Decimal(comissao),
+                )
+        # (Por aprovar: não entra no fecho)
+        cls.pendente = criar_venda(cls.vendedor, produto, cliente, comissao_calculada_final=Decimal('99.00'))
+
+    def fechar(self, vendedor_id=None):
+        hoje = timezone.localdate()
+        return fechar_comissoes(self.financeiro, hoje, hoje, hoje + timedelta(days=1), vendedor_id)
+
+    def test_um_lote_por_vendedor_com_o_total_das_comissoes(self):
+        lotes = self.fechar()
+        self.assertEqual(
+            {lote.vendedor_id: lote.total_comissoes for lote in lotes},
+            {self.vendedor.pk: Decimal('25.50'), self.outro.pk: Decimal('7.25')},
+        )
+        for lote in lotes:
+            with self.subTest(vendedor=lote.vendedor_id):
+                self.assertEqual(
+                    set(Venda.objects.filter(lote_pagamento=lote).values_list('vendedor_id', flat=True)),
+                    {lote.vendedor_id},
+                )
+        # (Sem comissão a pagar não há lote, e as vendas ficam por fechar)
+        self.assertFalse(Venda.objects.filter(vendedor=self.sem_comissao, lote_pagamento__isnull=False).exists())
+        self.pendente.refresh_from_db()
+        self.assertIsNone(self.pendente.lote_pagamento_id)
+
+    def test_segundo_fecho_nao_apanha_vendas(self):
+        self.assertEqual(len(self.fechar()), 2)
+        ligadas = dict(Venda.objects.values_list('id', 'lote_pagamento_id'))
+        self.assertEqual(self.fechar(), [])
+        self.assertEqual(LotePagamentoComissao.objects.count(), 2)
+        self.assertEqual(dict(Venda.objects.values_list('id', 'lote_pagamento_id')), ligadas)
+
+    def test_so_o_vendedor_filtrado(self):
+        lote, = self.fechar(vendedor_id=self.outro.pk)
+        self.assertEqual((lote.vendedor_id, lote.total_comissoes), (self.outro.pk, Decimal('7.25')))
+        self.assertFalse(Venda.objects.filter(vendedor=self.vendedor, lote_pagamento__isnull=False).exists())
+        # (O fecho seguinte, sem filtro, apanha o resto)
+        self.assertEqual([lote.vendedor_id for lote in self.fechar()], [self.vendedor.pk])
+
+
+
+class RecalculoComissoesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor, cls.produto, cliente = criar_base()
+        cls.financeiro = criar_utilizador('financeiro', 'Financeiro')
+        RegraComissaoVendedor.objects.create(
+            vendedor=criar_utilizador('excecao'), produto=cls.produto, tipo_comissao='F', valor_comissao=25,
+        )
+        cls.lote = criar_lote(cls.vendedor, cls.financeiro, total=Decimal('0.00'))
+
+        def venda(vendedor=cls.vendedor, **campos):
+            return criar_venda(vendedor, cls.produto, cliente, status_pagamento='aprovado', **campos).pk
+        # (Padrão do produto: 10% de 100.00; exceção: 25 fixo; personalizada: 7.77)
+        cls.padrao = venda()
+        cls.excecao = venda(User.objects.get(username='excecao'))
+        cls.personalizada = venda(comissao_personalizada_valor=Decimal('7.77'))
+        cls.no_lote = venda(lote_pagamento=cls.lote)
+        cls.pendente = criar_venda(cls.vendedor, cls.produto, cliente).pk
+        Venda.objects.update(comissao_calculada_final=Decimal('0.00'))
+
+    def comissoes(self):
+        return dict(Venda.objects.values_list('pk', 'comissao_calculada_final'))
+
+    def test_dry_run_nao_grava(self):
+        diferencas = recalcular_comissoes(dry_run=True)
+        self.assertEqual(
+            {d.venda_id: d.nova for d in diferencas},
+            {self.padrao: Decimal('10.00'), self.excecao: Decimal('25.00'), self.personalizada: Decimal('7.77')},
+        )
+        self.assertEqual(set(self.comissoes().values()), {Decimal('0.00')})
+
+    def test_recalcula_so_as_vendas_fora_de_lotes(self):
+        recalcular_comissoes()
+        comissoes = self.comissoes()
+        self.assertEqual(
+            [comissoes[pk] for pk in (self.padrao, self.excecao, self.personalizada, self.no_lote, self.pendente)],
+            [Decimal('10.00'), Decimal('25.00'), Decimal('7.77'), Decimal('0.00'), Decimal('0.00')],
+        )
+        # (O resumo diário acompanha o bulk_update)
+        self.assertEqual(
+            VendaResumoDiario.objects.aggregate(total=Sum('total_comissao'))['total'], Decimal('42.77'),
+        )
+        self.assertEqual(recalcular_comissoes(), [])
+
+    def test_incluir_lotes_atualiza_o_total_do_lote(self):
+        recalcular_comissoes(Venda.objects.filter(pk=self.no_lote), incluir_lotes=True)
+        self.assertEqual(self.comissoes()[self.no_lote], Decimal('10.00'))
+        self.lote.refresh_from_db()
+        self.assertEqual(self.lote.total_comissoes, Decimal('10.00'))
+
+
+class ListaMetasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='x')
+        MetaVenda.objects.bulk_create([
+            MetaVenda(data_inicio=date(2025, 1, 1) + timedelta(days=i), data_fim=date(2025, 12, 31), valor_meta=1000)
+            for i in range(METAS_POR_PAGINA + 5)
+        ])
+
+    def test_progresso_so_das_metas_da_pagina(self):
+        self.client.force_login(self.admin)
+        with mock.patch('comissoes.views.get_progresso_metas', wraps=get_progresso_metas) as progresso:
+            resposta = self.client.get(reverse('lista_metas'))
+        metas, = progresso.call_args.args
+        self.assertEqual(len(metas), METAS_POR_PAGINA)
+        self.assertEqual(len(resposta.context['metas_progresso']), METAS_POR_PAGINA)
 
-# Create your tests here.
+        resposta = self.client.get(reverse('lista_metas'), {'pagina': 2})
+        self.assertEqual(len(resposta.context['metas_progresso']), 5)
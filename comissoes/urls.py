@@ -9,6 +9,9 @@ urlpatterns = [
     # Fluxo de Pagamento de Lotes
     path('comissoes/fechamento/', views.comissoes_fechamento, name='comissoes_fechamento'),
     path('comissoes/lote/<int:lote_id>/', views.comissoes_lote_detalhe, name='comissoes_lote_detalhe'),
+    path('comissoes/lote/<int:lote_id>/anexos/upload/preparar/', views.lote_anexo_upload_preparar, name='lote_anexo_upload_preparar'),
+    path('comissoes/lote/<int:lote_id>/anexos/upload/confirmar/', views.lote_anexo_upload_confirmar, name='lote_anexo_upload_confirmar'),
+    path('comissoes/pagamentos/', views.comissoes_pagamentos_em_massa, name='comissoes_pagamentos_em_massa'),
 
     # Exports de Lotes
     path('comissoes/export/csv/', views.export_lotes_csv, name='export_lotes_csv'),
@@ -19,4 +22,7 @@ urlpatterns = [
     path('metas/nova/', views.criar_meta, name='criar_meta'),
     path('metas/<int:meta_id>/editar/', views.editar_meta, name='editar_meta'),
     path('metas/<int:meta_id>/apagar/', views.apagar_meta, name='apagar_meta'),
+
+    # API de Metas
+    path('api/metas/progresso/', views.metas_progresso_api, name='metas_progresso_api'),
 ]
\ No newline at end of file
@@ -3,32 +3,43 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages 
 from django.db import transaction 
 from django.http import JsonResponse, HttpResponseForbidden, HttpResponse
+from django.views.decorators.http import require_POST
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
 from django.db.models import Q, Sum, Avg, Count
 from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from django.contrib.auth.models import User
-import json, csv, openpyxl
-from openpyxl.utils import get_column_letter
+import json
 from datetime import datetime, timedelta
 from decimal import Decimal
-from functools import wraps
 
 # Imports dos nossos modelos e forms refatorados
 from .models import (
-    LotePagamentoComissao, MetaVenda
+    LotePagamentoComissao, AnexoLoteComissao, MetaVenda, get_anexo_transacao_path
 )
 from .forms import (
-    TransacaoPagamentoForm, AnexoLoteForm, MetaVendaForm
+    TransacaoPagamentoForm, AnexoLoteForm, MetaVendaForm, PagamentosEmMassaForm
 )
 # Imports das apps 'vendas' e 'common' (das quais dependemos)
 from vendas.models import Venda
+from vendas.resumo import get_resumo_filtrado
 from common.models import Produto
 
-# ---
-# VISTO QUE ESTA APP DEPENDE DAS VIEWS DE 'VENDAS', IMPORTAMOS AS SUAS FUNÇÕES HELPER
-# (Isto é uma dependência, mas é aceitável na arquitetura do Django)
-# ---
-from vendas.views import _get_user_permissions, _get_vendas_filtradas, gestor_ou_admin_required
+from vendas.filtros import filtrar_vendas
+# (Os helpers partilhados vêm de módulos leves, e não de 'vendas.views')
+from common.permissions import get_permissoes, gestor_ou_admin_required
+from .metas import get_metas_ativas_visiveis, get_progresso_metas
+from .filtros import filtrar_lotes
+from .fechamento import fechar_comissoes, vendas_por_fechar
+from .pagamentos import ler_pagamentos, registar_pagamentos_em_massa
+from .exportacao import LOTES_CABECALHO_CSV, LOTES_CABECALHO_XLSX, linhas_lotes_csv, linhas_lotes_xlsx
+from common.exportacao import resposta_csv_streaming, resposta_xlsx_streaming
+from common.exportacao_tarefas import pedido_assincrono, resposta_exportacao_assincrona
+from common.armazenamento import ErroArmazenamento, apagar_novos, guardar_por_conteudo
+from common.uploads_diretos import (
+    ErroUploadDireto, confirmar_uploads, ler_pedido_json, preparar_uploads, suporta_upload_direto
+)
 
 # ---
 # FUNÇÃO HELPER DESTA APP
@@ -38,37 +49,9 @@ def _get_lotes_filtrados(request):
     """
     Função auxiliar que lê os filtros do request (GET) e retorna
     o queryset de Lotes já filtrado e com as permissões corretas.
+    (A lógica está em 'comissoes/filtros.py', para ser usada também fora de um request)
     """
-    perms = _get_user_permissions(request.user)
-    
-    # 1. Queryset Base
-    if perms['is_vendedor'] and not (perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro']):
-        lotes_qs = LotePagamentoComissao.objects.filter(vendedor=request.user)
-    else:
-        lotes_qs = LotePagamentoComissao.objects.all()
-
-    # 2. Captura dos Parâmetros de Filtro
-    query_vendedor = request.GET.get('vendedor', '')
-    query_status = request.GET.get('status', '')
-    query_data_inicio = request.GET.get('data_inicio', '')
-    query_data_fim = request.GET.get('data_fim', '')
-
-    # 3. Aplicação dos Filtros
-    if (perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro']) and query_vendedor:
-        lotes_qs = lotes_qs.filter(vendedor_id=query_vendedor)
-    if query_status:
-        lotes_qs = lotes_qs.filter(status=query_status)
-    if query_data_inicio:
-        lotes_qs = lotes_qs.filter(data_fechamento__gte=query_data_inicio)
-    if query_data_fim:
-        try:
-            data_fim_dt = datetime.strptime(query_data_fim, '%Y-%m-%d').date() + timedelta(days=1)
-            lotes_qs = lotes_qs.filter(data_fechamento__lt=data_fim_dt)
-        except (ValueError, TypeError):
-            pass
-            
-    # 4. Otimiza a query e retorna
-    return lotes_qs.select_related('vendedor', 'responsavel_fechamento').order_by('-data_fechamento')
+    return filtrar_lotes(request.user, request.GET)
 
 # ---
 # VIEWS DO MÓDULO DE COMISSÕES (Movidas de vendas/views.py)
@@ -77,34 +60,50 @@ def _get_lotes_filtrados(request):
 @login_required
 def comissoes_dashboard_graficos(request):
     """ Dashboard Gráfico de Comissões """
-    perms = _get_user_permissions(request.user)
+    perms = get_permissoes(request.user)
     if not (perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro'] or perms['is_vendedor']):
         messages.error(request, "Você não tem permissão para aceder a esta página.")
         return redirect('dashboard')
 
-    # 1. Reusa a lógica de filtros de Vendas (importada de vendas.views)
-    vendas_filtradas = _get_vendas_filtradas(request)
+    # 1. Usa o resumo diário sempre que os filtros ativos o permitem (ver 'vendas/resumo.py')
+    resumo = get_resumo_filtrado(request, perms)
+    if resumo is not None:
+        comissoes_filtradas = resumo.filter(status_pagamento='aprovado')
+        kpis = comissoes_filtradas.aggregate(
+            total_comissoes=Sum('total_comissao'),
+            contagem_comissao=Sum('contagem_comissao'),
+            contagem_vendas_comissionadas=Sum('contagem')
+        )
+        if kpis['contagem_comissao']:
+            kpis['ticket_medio_comissao'] = kpis['total_comissoes'] / kpis['contagem_comissao']
+        campo_comissao = 'total_comissao'
+        campo_mes = 'dia'
+    else:
+        # Reusa a lógica de filtros de Vendas (importada de vendas.views)
+        vendas_filtradas = filtrar_vendas(request.user, request.GET)
 
-    # 2. Filtro ADICIONAL
-    comissoes_filtradas = vendas_filtradas.filter(status_pagamento='aprovado')
+        # Filtro ADICIONAL
+        comissoes_filtradas = vendas_filtradas.filter(status_pagamento='aprovado')
 
-    # 3. Cálculo de KPIs de Comissão
-    kpis = comissoes_filtradas.aggregate(
-        total_comissoes=Sum('comissao_calculada_final'),
-        ticket_medio_comissao=Avg('comissao_calculada_final'),
-        contagem_vendas_comissionadas=Count('id')
-    )
+        # Cálculo de KPIs de Comissão
+        kpis = comissoes_filtradas.aggregate(
+            total_comissoes=Sum('comissao_calculada_final'),
+            ticket_medio_comissao=Avg('comissao_calculada_final'),
+            contagem_vendas_comissionadas=Count('id')
+        )
+        campo_comissao = 'comissao_calculada_final'
+        campo_mes = 'data_venda'
 
-    # 4. Dados para Gráficos
-    comissoes_por_vendedor = comissoes_filtradas.values('vendedor__username').annotate(total=Sum('comissao_calculada_final')).order_by('-total')
+    # 2. Dados para Gráficos
+    comissoes_por_vendedor = comissoes_filtradas.values('vendedor__username').annotate(total=Sum(campo_comissao)).order_by('-total')
     comissoes_por_vendedor_payload = [{'vendedor__username': c['vendedor__username'], 'total': float(c['total'] or 0)} for c in comissoes_por_vendedor]
-    comissoes_por_produto = comissoes_filtradas.values('produto__nome').annotate(total=Sum('comissao_calculada_final')).order_by('-total')
+    comissoes_por_produto = comissoes_filtradas.values('produto__nome').annotate(total=Sum(campo_comissao)).order_by('-total')
     comissoes_por_produto_payload = [{'produto__nome': p['produto__nome'], 'total': float(p['total'] or 0)} for p in comissoes_por_produto]
-    comissoes_por_mes = comissoes_filtradas.annotate(mes=TruncMonth('data_venda')).values('mes').annotate(total=Sum('comissao_calculada_final')).order_by('mes')
+    comissoes_por_mes = comissoes_filtradas.annotate(mes=TruncMonth(campo_mes)).values('mes').annotate(total=Sum(campo_comissao)).order_by('mes')
     labels_linha = [c['mes'].strftime('%b/%Y') for c in comissoes_por_mes]
     data_linha = [float(c['total'] or 0) for c in comissoes_por_mes]
 
-    # 5. Contexto para Filtros
+    # 3. Contexto para Filtros
     todos_vendedores = User.objects.filter(is_superuser=False, is_active=True).order_by('username')
     todos_produtos = Produto.objects.all().order_by('nome')
     today_dt = datetime.now().date()
@@ -131,7 +130,7 @@ def comissoes_dashboard_graficos(request):
 @login_required
 def comissoes_historico_lotes(request):
     """ Histórico de Lotes com Filtros """
-    perms = _get_user_permissions(request.user)
+    perms = get_permissoes(request.user)
     if not (perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro'] or perms['is_vendedor']):
          messages.error(request, "Você não tem permissão para aceder a esta página.")
          return redirect('dashboard')
@@ -157,7 +156,7 @@ def comissoes_historico_lotes(request):
 @transaction.atomic
 def comissoes_fechamento(request):
     """ Página 'Pagar Comissões' (Fecho Manual por Período/Vendedor) """
-    perms = _get_user_permissions(request.user)
+    perms = get_permissoes(request.user)
     if not (perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro']):
         messages.error(request, "Você não tem permissão para aceder a esta página.")
         return redirect('dashboard')
@@ -184,15 +183,7 @@ def comissoes_fechamento(request):
             except (ValueError, TypeError):
                 data_fim_dt = datetime.now().date() + timedelta(days=1)
 
-            vendas_para_pagar = Venda.objects.filter(
-                status_pagamento='aprovado',
-                lote_pagamento__isnull=True,
-                data_venda__gte=data_inicio,
-                data_venda__lt=data_fim_dt 
-            )
-            
-            if query_vendedor:
-                vendas_para_pagar = vendas_para_pagar.filter(vendedor_id=query_vendedor)
+            vendas_para_pagar = vendas_por_fechar(data_inicio, data_fim_dt, query_vendedor)
             
             resumo_por_vendedor = vendas_para_pagar.values('vendedor__username') \
                                               .annotate(total_comissao=Sum('comissao_calculada_final'),
@@ -201,7 +192,7 @@ def comissoes_fechamento(request):
             total_geral_comissao = resumo_por_vendedor.aggregate(total_geral=Sum('total_comissao'))['total_geral'] or 0
 
     elif request.method == 'POST':
-        # ... (Lógica POST permanece a mesma, usando o modelo LotePagamentoComissao local) ...
+        # (Cria os lotes de todos os vendedores de uma vez, ver 'comissoes/fechamento.py')
         data_inicio = request.POST.get('data_inicio')
         data_fim = request.POST.get('data_fim')
         query_vendedor = request.POST.get('vendedor', '')
@@ -211,40 +202,11 @@ def comissoes_fechamento(request):
         except (ValueError, TypeError):
             data_fim_dt = datetime.now().date() + timedelta(days=1)
 
-        vendas_para_pagar = Venda.objects.filter(
-            status_pagamento='aprovado',
-            lote_pagamento__isnull=True,
-            data_venda__gte=data_inicio,
-            data_venda__lt=data_fim_dt
-        )
-        
-        vendedores_a_processar_ids = []
-        if query_vendedor:
-            vendedores_a_processar_ids = [query_vendedor]
-            vendas_para_pagar = vendas_para_pagar.filter(vendedor_id=query_vendedor)
-        else:
-            vendedores_a_processar_ids = vendas_para_pagar.values_list('vendedor_id', flat=True).distinct()
-
-        if not vendas_para_pagar.exists():
+        if not vendas_por_fechar(data_inicio, data_fim_dt, query_vendedor).exists():
             messages.error(request, "Nenhuma venda encontrada para fechar no período selecionado.")
             return redirect('comissoes_fechamento')
 
-        lotes_criados_count = 0
-        for vendor_id in vendedores_a_processar_ids:
-            vendas_do_vendedor = vendas_para_pagar.filter(vendedor_id=vendor_id)
-            total_do_vendedor = vendas_do_vendedor.aggregate(total=Sum('comissao_calculada_final'))['total'] or 0
-            
-            if total_do_vendedor > 0:
-                novo_lote = LotePagamentoComissao.objects.create(
-                    vendedor_id=vendor_id, 
-                    periodo_inicio=data_inicio,
-                    periodo_fim=data_fim,
-                    responsavel_fechamento=request.user,
-                    status='pendente',
-                    total_comissoes=total_do_vendedor
-                )
-                vendas_do_vendedor.update(lote_pagamento=novo_lote)
-                lotes_criados_count += 1
+        lotes_criados_count = len(fechar_comissoes(request.user, data_inicio, data_fim, data_fim_dt, query_vendedor))
         
         if lotes_criados_count > 0:
             messages.success(request, f"{lotes_criados_count} lote(s) de pagamento criado(s) com sucesso.")
@@ -265,11 +227,17 @@ def comissoes_fechamento(request):
 @transaction.atomic
 def comissoes_lote_detalhe(request, lote_id):
     """ Página de Detalhe do Lote """
-    perms = _get_user_permissions(request.user)
-    lote = get_object_or_404(LotePagamentoComissao, id=lote_id)
+    perms = get_permissoes(request.user)
+    lote = get_object_or_404(
+        LotePagamentoComissao.objects.select_related('vendedor').annotate(
+            num_vendas=Count('vendas'),
+            soma_comissoes_vendas=Sum('vendas__comissao_calculada_final'),
+        ),
+        id=lote_id
+    )
 
     if perms['is_vendedor'] and not (perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro']):
-        if lote.vendedor != request.user:
+        if lote.vendedor_id != request.user.id:
              messages.error(request, "Você não tem permissão para visualizar este lote.")
              return redirect('comissoes_historico')
              
@@ -285,11 +253,22 @@ def comissoes_lote_detalhe(request, lote_id):
 
         if acao == 'add_transacao':
             transacao_form = TransacaoPagamentoForm(request.POST, request.FILES, lote=lote)
+            confirmado = None
+            if transacao_form.is_valid() and transacao_form.cleaned_data['comprovativo_token']:
+                # (Comprovativo enviado diretamente ao S3 pelo browser)
+                try:
+                    confirmado, = confirmar_uploads(
+                        [transacao_form.cleaned_data['comprovativo_token']], destino=f"lote:{lote.id}:comprovativo",
+                    )
+                except ErroUploadDireto as exc:
+                    transacao_form.add_error('anexo_comprovativo_pagamento', str(exc))
             if transacao_form.is_valid():
                 transacao = transacao_form.save(commit=False)
                 transacao.lote = lote
                 transacao.responsavel_pagamento = request.user
-                if 'anexo_comprovativo_pagamento' in request.FILES:
+                if confirmado:
+                    transacao.anexo_comprovativo_pagamento, transacao.descricao, _ = confirmado
+                elif 'anexo_comprovativo_pagamento' in request.FILES:
                     transacao.descricao = request.FILES['anexo_comprovativo_pagamento'].name
                 transacao.save()
                 messages.success(request, "Pagamento registado com sucesso.")
@@ -298,16 +277,26 @@ def comissoes_lote_detalhe(request, lote_id):
         elif acao == 'add_anexo_nf':
             anexo_lote_form = AnexoLoteForm(request.POST, request.FILES)
             if anexo_lote_form.is_valid():
-                anexo = anexo_lote_form.save(commit=False)
-                anexo.lote = lote
-                if 'anexo_nf_vendedor' in request.FILES:
-                    anexo.descricao = request.FILES['anexo_nf_vendedor'].name
-                anexo.save()
+                # (Guardado por conteúdo, ver 'common/armazenamento.py')
+                try:
+                    guardado, = guardar_por_conteudo([anexo_lote_form.cleaned_data['anexo_nf_vendedor']])
+                except ErroArmazenamento as exc:
+                    messages.error(request, f"Não foi possível enviar o ficheiro. {exc}")
+                    return redirect('comissoes_lote_detalhe', lote_id=lote.id)
+                try:
+                    AnexoLoteComissao.objects.create(
+                        lote=lote, anexo_nf_vendedor=guardado.nome,
+                        sha256=guardado.sha256, descricao=guardado.descricao,
+                    )
+                except Exception:
+                    apagar_novos([guardado])
+                    raise
                 messages.success(request, "Nota Fiscal do Vendedor anexada com sucesso.")
                 return redirect('comissoes_lote_detalhe', lote_id=lote.id)
 
-    vendas_no_lote = lote.vendas.all().order_by('data_venda')
-    transacoes_do_lote = lote.transacoes_pagamento.all().order_by('data_pagamento')
+    # (Uma query para as vendas, com os JOINs que o template usa)
+    vendas_no_lote = lote.vendas.select_related('vendedor', 'cliente', 'produto').order_by('data_venda')
+    transacoes_do_lote = lote.transacoes_pagamento.select_related('responsavel_pagamento').order_by('data_pagamento')
     anexos_do_lote = lote.anexos_lote.all().order_by('data_upload')
 
     context = {
@@ -317,88 +306,155 @@ def comissoes_lote_detalhe(request, lote_id):
         'anexos_do_lote': anexos_do_lote, 
         'transacao_form': transacao_form, 
         'anexo_lote_form': anexo_lote_form,
+        'upload_direto': suporta_upload_direto(),
         'perms': perms,
     }
     return render(request, 'comissoes/comissoes_lote_detalhe.html', context)
 
 
+# Uploads diretos do lote: NFs do vendedor (confirmadas em
+# 'lote_anexo_upload_confirmar') e comprovativos de pagamento (confirmados
+# ao registar a transação, em 'comissoes_lote_detalhe')
+TIPOS_UPLOAD_LOTE = ('nf', 'comprovativo')
+
+def _lote_para_upload(request, lote_id):
+    perms = get_permissoes(request.user)
+    if not (perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro']):
+        raise PermissionDenied
+    return get_object_or_404(LotePagamentoComissao, id=lote_id)
+
+@login_required
+@require_POST
+def lote_anexo_upload_preparar(request, lote_id):
+    """ API: políticas de upload direto (S3) para as NFs e comprovativos do lote, ver 'common/uploads_diretos.py' """
+    lote = _lote_para_upload(request, lote_id)
+    try:
+        if not suporta_upload_direto():
+            raise ErroUploadDireto("Upload direto indisponível neste ambiente.")
+        dados = ler_pedido_json(request)
+        tipo = dados.get('tipo') or 'nf'
+        if tipo not in TIPOS_UPLOAD_LOTE:
+            raise ErroUploadDireto("Tipo de anexo inválido.")
+        uploads = preparar_uploads(
+            dados.get('ficheiros'),
+            lambda nome: get_anexo_transacao_path(AnexoLoteComissao(lote=lote), nome),
+            destino=f"lote:{lote.id}:{tipo}",
+        )
+    except ErroUploadDireto as exc:
+        return JsonResponse({'erro': str(exc)}, status=400)
+    return JsonResponse({'uploads': uploads})
+
+@login_required
+@require_POST
+@transaction.atomic
+def lote_anexo_upload_confirmar(request, lote_id):
+    """ API: cria os AnexoLoteComissao dos ficheiros enviados diretamente ao S3 """
+    lote = _lote_para_upload(request, lote_id)
+    try:
+        confirmados = confirmar_uploads(ler_pedido_json(request).get('tokens'), destino=f"lote:{lote.id}:nf")
+    except ErroUploadDireto as exc:
+        return JsonResponse({'erro': str(exc)}, status=400)
+    AnexoLoteComissao.objects.bulk_create([
+        AnexoLoteComissao(lote=lote, anexo_nf_vendedor=chave, descricao=nome, sha256=sha256)
+        for chave, nome, sha256 in confirmados
+    ])
+    messages.success(request, "Nota Fiscal do Vendedor anexada com sucesso.")
+    return JsonResponse({'criados': len(confirmados)})
+
+@login_required
+def comissoes_pagamentos_em_massa(request):
+    """ Registo de pagamentos de muitos lotes de uma vez (ficheiro com lote_id, valor_pago) """
+    perms = get_permissoes(request.user)
+    if not (perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro']):
+        messages.error(request, "Você não tem permissão para aceder a esta página.")
+        return redirect('dashboard')
+
+    form = PagamentosEmMassaForm()
+    erros = []
+    if request.method == 'POST':
+        form = PagamentosEmMassaForm(request.POST, request.FILES)
+        if form.is_valid():
+            ficheiro = form.cleaned_data['ficheiro']
+            linhas, erros = ler_pagamentos(ficheiro.file, ficheiro.name)
+            if not erros:
+                descricao = form.cleaned_data['descricao'] or f"Pagamento em massa ({ficheiro.name})"
+                transacoes, erros = registar_pagamentos_em_massa(linhas, request.user, descricao)
+            if not erros:
+                lotes = len({linha.lote_id for linha in linhas})
+                messages.success(request, f"{len(transacoes)} pagamento(s) registado(s) em {lotes} lote(s).")
+                return redirect('comissoes_historico')
+            messages.error(request, "Nenhum pagamento foi registado. Corrija o ficheiro e envie novamente.")
+
+    context = {
+        'form': form,
+        'erros': erros,
+        'perms': perms,
+    }
+    return render(request, 'comissoes/pagamentos_em_massa.html', context)
+
 # ---
 # VIEWS DE EXPORTAÇÃO (Movidas de vendas/views.py)
 # ---
 
 @login_required
 def export_lotes_csv(request):
+    """ Exportação de Lotes em CSV (streaming, ver 'comissoes/exportacao.py') """
+    if pedido_assincrono(request):
+        return resposta_exportacao_assincrona(request, 'lotes', 'csv')
     lotes = _get_lotes_filtrados(request)
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="relatorio_lotes_comissao.csv"'
-    writer = csv.writer(response, delimiter=';')
-    
-    headers = ['Lote ID', 'Data Fechamento', 'Vendedor', 'Responsável (Fechou)', 
-               'Período Início', 'Período Fim', 
-               'Total Devido', 'Total Pago', 'Status']
-    writer.writerow(headers)
-    
-    for lote in lotes:
-        writer.writerow([
-            lote.id, 
-            lote.data_fechamento.strftime('%Y-%m-%d %H:%M'), 
-            lote.vendedor.username, 
-            lote.responsavel_fechamento.username,
-            lote.periodo_inicio,
-            lote.periodo_fim,
-            lote.total_comissoes,
-            lote.total_pago_efetivamente,
-            lote.get_status_display()
-        ])
-    return response
+    return resposta_csv_streaming(LOTES_CABECALHO_CSV, linhas_lotes_csv(lotes), 'relatorio_lotes_comissao.csv')
 
 @login_required
 def export_lotes_xlsx(request):
+    """ Exportação de Lotes em XLSX (write-only, ver 'common/exportacao.py') """
+    if pedido_assincrono(request):
+        return resposta_exportacao_assincrona(request, 'lotes', 'xlsx')
     lotes = _get_lotes_filtrados(request)
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Lotes de Comissão"
-    
-    headers = ['Lote ID', 'Data Fechamento', 'Vendedor', 'Responsável (Fechou)', 
-               'Período Início', 'Período Fim', 
-               'Total Devido (R$)', 'Total Pago (R$)', 'Status']
-    ws.append(headers)
-    
-    for lote in lotes:
-        ws.append([
-            lote.id, 
-            lote.data_fechamento.replace(tzinfo=None), 
-            lote.vendedor.username, 
-            lote.responsavel_fechamento.username,
-            lote.periodo_inicio,
-            lote.periodo_fim,
-            float(lote.total_comissoes or 0),
-            float(lote.total_pago_efetivamente or 0),
-            lote.get_status_display()
-        ])
-        
-    for col_num, header in enumerate(headers, 1): 
-        ws.column_dimensions[get_column_letter(col_num)].width = 22
-        
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="relatorio_lotes_comissao.xlsx"'
-    wb.save(response)
-    return response
+    return resposta_xlsx_streaming(
+        "Lotes de Comissão", LOTES_CABECALHO_XLSX, linhas_lotes_xlsx(lotes),
+        'relatorio_lotes_comissao.xlsx', largura_colunas=22
+    )
 
 # ---
 # VIEWS DE GESTÃO DE METAS (Movidas de vendas/views.py)
 # ---
 
+METAS_POR_PAGINA = 25
+
 @login_required
 @gestor_ou_admin_required
 def lista_metas(request):
-    """ (R)ead: Lista todas as metas (passadas, presentes, futuras) """
-    metas = MetaVenda.objects.all().select_related('vendedor', 'grupo').order_by('-data_inicio')
+    """ (R)ead: Lista todas as metas (passadas, presentes, futuras), paginada """
+    metas = MetaVenda.objects.all().select_related('vendedor', 'grupo').order_by('-data_inicio', '-id')
+    pagina = Paginator(metas, METAS_POR_PAGINA).get_page(request.GET.get('pagina'))
     context = {
-        'metas': metas
+        # (Progresso só das metas desta página, numa única query)
+        'metas_progresso': get_progresso_metas(pagina.object_list),
+        'pagina': pagina,
     }
     return render(request, 'metas/lista_metas.html', context)
 
+@login_required
+def metas_progresso_api(request):
+    """ API (JSON): Progresso das metas ativas visíveis ao utilizador (?data=AAAA-MM-DD, padrão hoje) """
+    perms = get_permissoes(request.user)
+    try:
+        data_ref = datetime.strptime(request.GET.get('data', ''), '%Y-%m-%d').date()
+    except ValueError:
+        data_ref = timezone.localdate()
+
+    metas = get_metas_ativas_visiveis(request.user, perms, data_ref)
+    payload = [{
+        'id': item['meta'].id,
+        'titulo': item['meta_titulo'],
+        'data_inicio': item['meta'].data_inicio.isoformat(),
+        'data_fim': item['meta'].data_fim.isoformat(),
+        'valor_meta': float(item['meta_valor']),
+        'progresso': float(item['meta_progresso']),
+        'percentual': item['meta_percentual'],
+    } for item in get_progresso_metas(metas)]
+    return JsonResponse({'data': data_ref.isoformat(), 'metas': payload})
+
 @login_required
 @gestor_ou_admin_required
 def criar_meta(request):
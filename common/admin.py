@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Produto, Cliente, FormaPagamento
+from .models import Produto, Cliente, FormaPagamento, TarefaExportacao, RemocaoPendente
 
 @admin.register(Produto)
 class ProdutoAdmin(admin.ModelAdmin):
@@ -15,4 +15,16 @@ class ClienteAdmin(admin.ModelAdmin):
 @admin.register(FormaPagamento)
 class FormaPagamentoAdmin(admin.ModelAdmin):
     list_display = ('nome',)
-    search_fields = ('nome',)
\ No newline at end of file
+    search_fields = ('nome',)
+
+@admin.register(TarefaExportacao)
+class TarefaExportacaoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'utilizador', 'tipo', 'formato', 'status', 'linhas_processadas', 'total_linhas', 'tentativas', 'data_criacao')
+    list_filter = ('status', 'tipo', 'formato')
+    readonly_fields = ('assinatura', 'data_criacao', 'data_atualizacao', 'data_conclusao')
+
+@admin.register(RemocaoPendente)
+class RemocaoPendenteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'chave', 'tentativas', 'data_criacao')
+    search_fields = ('chave',)
+    readonly_fields = ('data_criacao',)
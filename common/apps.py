@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 class CommonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'common'
\ No newline at end of file
+    name = 'common'
+
+    def ready(self):
+        # Regista os sinais de invalidação da cache de permissões
+        from . import signals  # noqa: F401
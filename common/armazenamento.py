@@ -0,0 +1,187 @@
+# Em: common/armazenamento.py
+#
+# Envio de vários ficheiros para o storage em paralelo. Com o S3 cada
+# 'save' é um PUT bloqueante; com um pool de threads limitado, o tempo
+# total de N ficheiros fica próximo do upload mais lento.
+# (O S3Boto3Storage usa uma ligação boto3 por thread, por isso é seguro.)
+#
+# Os anexos (vendas e lotes) são guardados por conteúdo: o nome no storage
+# é o SHA-256 do ficheiro ('anexos/ab/<sha256>.<ext>'). O mesmo comprovante
+# enviado várias vezes fica guardado uma só vez e é partilhado pelas
+# linhas; a fila de remoções ('common/remocoes.py') só o apaga quando
+# nenhuma linha o referencia. Com o Pillow instalado, as fotografias
+# grandes são reduzidas e recodificadas em JPEG antes de guardar.
+
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .remocoes import PREFIXO_CONTEUDO, chaves_referenciadas
+
+logger = logging.getLogger(__name__)
+
+NUM_THREADS_UPLOAD = getattr(settings, 'UPLOADS_THREADS', 4)
+
+RECOMPRIMIR_IMAGENS = getattr(settings, 'UPLOADS_RECOMPRIMIR_IMAGENS', True)
+IMAGEM_TAMANHO_MINIMO = 1024 * 1024  # só imagens acima de 1 MB são recomprimidas
+IMAGEM_LADO_MAXIMO = 2400
+QUALIDADE_JPEG = 85
+
+
+class ErroArmazenamento(Exception):
+    """ Falha ao enviar um ou mais ficheiros (os já enviados foram apagados). """
+
+
+def guardar_em_paralelo(ficheiros, storage=None):
+    """
+    'ficheiros': lista de (nome_pretendido, ficheiro).
+    Retorna os nomes finais no storage, pela mesma ordem. Se algum envio
+    falhar, apaga os que chegaram ao storage e levanta ErroArmazenamento.
+    """
+    storage = storage or default_storage
+    if not ficheiros:
+        return []
+    if len(ficheiros) == 1:
+        nome, ficheiro = ficheiros[0]
+        try:
+            return [storage.save(nome, ficheiro)]
+        except Exception as exc:
+            raise ErroArmazenamento(f"Falha ao enviar '{nome}': {exc}") from exc
+
+    with ThreadPoolExecutor(max_workers=min(NUM_THREADS_UPLOAD, len(ficheiros))) as executor:
+        futuros = [executor.submit(storage.save, nome, ficheiro) for nome, ficheiro in ficheiros]
+
+    guardados, falhas = [], []
+    for (nome, _), futuro in zip(ficheiros, futuros):
+        if futuro.exception() is None:
+            guardados.append(futuro.result())
+        else:
+            falhas.append((nome, futuro.exception()))
+
+    if falhas:
+        for nome in guardados:
+            try:
+                storage.delete(nome)
+            except Exception:
+                logger.exception("Não foi possível apagar '%s' após uma falha de upload", nome)
+        nome, exc = falhas[0]
+        raise ErroArmazenamento(f"Falha ao enviar '{nome}': {exc}") from exc
+    return guardados
+
+
+# ---
+# Armazenamento por conteúdo (SHA-256)
+# ---
+
+@dataclass
+class FicheiroGuardado:
+    nome: str       # chave no storage
+    sha256: str
+    descricao: str  # nome original do ficheiro enviado
+    novo: bool      # False se o conteúdo já existia no storage
+
+
+def chave_por_conteudo(sha256, nome_original):
+    ext = os.path.splitext(nome_original)[1].lower()[:10]
+    return f"{PREFIXO_CONTEUDO}{sha256[:2]}/{sha256}{ext}"
+
+
+def calcular_sha256(ficheiro):
+    """ SHA-256 lido em blocos (não carrega o ficheiro todo em memória). """
+    digest = hashlib.sha256()
+    for bloco in ficheiro.chunks():
+        digest.update(bloco)
+    ficheiro.seek(0)
+    return digest.hexdigest()
+
+
+def recomprimir_imagem(ficheiro):
+    """
+    Reduz fotografias grandes (JPEG, ou PNG sem transparência) para no
+    máximo IMAGEM_LADO_MAXIMO px e recodifica em JPEG. Retorna o ficheiro
+    original se não for uma imagem, se não ficar menor ou sem Pillow.
+    """
+    if not RECOMPRIMIR_IMAGENS or ficheiro.size < IMAGEM_TAMANHO_MINIMO:
+        return ficheiro
+    if os.path.splitext(ficheiro.name)[1].lower() not in ('.jpg', '.jpeg', '.png'):
+        return ficheiro
+    try:
+        # (Import local: o Pillow é opcional e pesado para o arranque do processo)
+        from PIL import Image, ImageOps
+    except ImportError:
+        return ficheiro
+    try:
+        imagem = Image.open(ficheiro)
+        if imagem.format == 'PNG' and ('A' in imagem.getbands() or 'transparency' in imagem.info):
+            return ficheiro
+        imagem = ImageOps.exif_transpose(imagem)
+        imagem.thumbnail((IMAGEM_LADO_MAXIMO, IMAGEM_LADO_MAXIMO))
+        saida = io.BytesIO()
+        imagem.convert('RGB').save(saida, 'JPEG', quality=QUALIDADE_JPEG, optimize=True, progressive=True)
+    except Exception:
+        logger.warning("Não foi possível recomprimir '%s'; guardado como veio", ficheiro.name, exc_info=True)
+        return ficheiro
+    finally:
+        ficheiro.seek(0)
+
+    if saida.tell() >= ficheiro.size:
+        return ficheiro
+    nome = os.path.splitext(ficheiro.name)[0] + '.jpg'
+    return ContentFile(saida.getvalue(), name=nome)
+
+
+def _preparar(ficheiro):
+    final = recomprimir_imagem(ficheiro)
+    return final, calcular_sha256(final)
+
+
+def guardar_por_conteudo(ficheiros, storage=None):
+    """
+    Guarda os ficheiros com o nome do seu SHA-256 (recomprimindo as
+    imagens grandes). Só envia para o storage o conteúdo que nenhuma
+    linha referencia ainda, em paralelo. Retorna [FicheiroGuardado],
+    pela mesma ordem; em caso de falha nada fica guardado.
+    """
+    storage = storage or default_storage
+    if not ficheiros:
+        return []
+    if len(ficheiros) == 1:
+        preparados = [_preparar(ficheiros[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(NUM_THREADS_UPLOAD, len(ficheiros))) as executor:
+            preparados = list(executor.map(_preparar, ficheiros))
+
+    chaves = [chave_por_conteudo(sha256, final.name) for final, sha256 in preparados]
+    existentes = chaves_referenciadas(chaves)
+
+    # (Cada conteúdo novo é enviado uma só vez, mesmo repetido no mesmo pedido)
+    a_enviar = {}
+    for chave, (final, _) in zip(chaves, preparados):
+        if chave not in existentes:
+            a_enviar.setdefault(chave, final)
+    enviados = dict(zip(a_enviar, guardar_em_paralelo(list(a_enviar.items()), storage)))
+
+    return [
+        FicheiroGuardado(
+            nome=enviados.get(chave, chave), sha256=sha256,
+            descricao=original.name, novo=chave in enviados,
+        )
+        for chave, (_, sha256), original in zip(chaves, preparados, ficheiros)
+    ]
+
+
+def apagar_novos(guardados, storage=None):
+    """ Desfaz 'guardar_por_conteudo' (só apaga o que foi enviado agora). """
+    storage = storage or default_storage
+    for nome in {g.nome for g in guardados if g.novo}:
+        try:
+            storage.delete(nome)
+        except Exception:
+            logger.exception("Não foi possível apagar '%s'", nome)
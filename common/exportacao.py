@@ -0,0 +1,114 @@
+# Em: common/exportacao.py
+#
+# Motor partilhado das exportações (relatórios) de Vendas e Lotes.
+
+import csv
+import tempfile
+from dataclasses import dataclass
+from typing import Callable
+
+from django.http import FileResponse, StreamingHttpResponse
+
+# Nº de linhas lidas do banco de cada vez nas exportações
+EXPORTACAO_CHUNK_SIZE = 2000
+
+# Tamanho dos blocos enviados ao cliente ao transmitir um ficheiro gerado
+EXPORTACAO_BLOCO_RESPOSTA = 64 * 1024
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+@dataclass(frozen=True)
+class DefinicaoExportacao:
+    """
+    Descreve um relatório exportável, para que possa ser gerado fora do
+    request (exportações em segundo plano). Cada app regista as suas em
+    '<app>/exportacao.py' com 'registar_exportacao'.
+    """
+    tipo: str
+    filtrar: Callable            # filtrar(user, params) -> queryset
+    campos_filtro: tuple         # parâmetros GET aceites pelo filtro
+    nome_ficheiro: str           # sem extensão
+    cabecalho_csv: list
+    linhas_csv: Callable         # linhas_csv(queryset) -> iterável de listas
+    titulo_xlsx: str
+    cabecalho_xlsx: list
+    linhas_xlsx: Callable
+    largura_colunas: int = 20
+
+
+EXPORTACOES = {}
+
+
+def registar_exportacao(definicao):
+    EXPORTACOES[definicao.tipo] = definicao
+    return definicao
+
+
+class _Eco:
+    """ Pseudo-ficheiro para o csv.writer: devolve a linha em vez de a guardar. """
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_linhas_csv(cabecalho, linhas, delimiter=';'):
+    """ Gerador das linhas CSV (texto), a começar pelo cabeçalho. """
+    writer = csv.writer(_Eco(), delimiter=delimiter)
+    yield writer.writerow(cabecalho)
+    for linha in linhas:
+        yield writer.writerow(linha)
+
+
+def resposta_csv_streaming(cabecalho, linhas, nome_ficheiro):
+    """
+    Resposta CSV em streaming: as linhas são geradas e enviadas à medida
+    que são lidas do banco, por isso a memória não cresce com o nº de linhas.
+    """
+    response = StreamingHttpResponse(gerar_linhas_csv(cabecalho, linhas), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{nome_ficheiro}"'
+    return response
+
+
+def gerar_xlsx(ficheiro, titulo, cabecalho, linhas, largura_colunas=20):
+    """
+    Escreve um XLSX em 'ficheiro' (caminho ou objeto de ficheiro) com um
+    Workbook em modo write-only: as linhas vão diretamente para disco e
+    a memória não cresce com o nº de linhas.
+    """
+    # (openpyxl só é importado quando há de facto uma exportação XLSX)
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(titulo)
+
+    # Larguras e estilo do cabeçalho calculados uma única vez
+    for col_num in range(1, len(cabecalho) + 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = largura_colunas
+    fonte_cabecalho = Font(bold=True)
+    celulas_cabecalho = []
+    for texto in cabecalho:
+        celula = WriteOnlyCell(ws, value=texto)
+        celula.font = fonte_cabecalho
+        celulas_cabecalho.append(celula)
+
+    ws.append(celulas_cabecalho)
+    for linha in linhas:
+        ws.append(linha)
+    wb.save(ficheiro)
+
+
+def resposta_xlsx_streaming(titulo, cabecalho, linhas, nome_ficheiro, largura_colunas=20):
+    """
+    Gera o XLSX num ficheiro temporário (em disco) e devolve-o em blocos
+    com um FileResponse, que fecha (e apaga) o temporário no fim.
+    """
+    temporario = tempfile.TemporaryFile()
+    gerar_xlsx(temporario, titulo, cabecalho, linhas, largura_colunas)
+    temporario.seek(0)
+    response = FileResponse(temporario, as_attachment=True, filename=nome_ficheiro, content_type=XLSX_CONTENT_TYPE)
+    response.block_size = EXPORTACAO_BLOCO_RESPOSTA
+    return response
@@ -0,0 +1,280 @@
+# Em: common/exportacao_tarefas.py
+#
+# Exportações em segundo plano: o pedido só regista uma TarefaExportacao
+# com os filtros serializados; o ficheiro é gerado por um worker (thread
+# do próprio processo ou 'manage.py processar_exportacoes') e guardado no
+# default_storage. A interface consulta o progresso e depois descarrega.
+# O worker grava um sinal de vida (data_atualizacao) com o progresso; uma
+# tarefa 'processando' sem sinal há mais de TEMPO_SEM_SINAL (o processo
+# morreu) volta à fila ou, esgotadas as tentativas, fica com erro. As
+# tarefas terminadas há mais de RETENCAO são apagadas, e os ficheiros vão
+# para a fila de remoções (ver 'common/remocoes.py').
+
+import hashlib
+import json
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+
+from .exportacao import EXPORTACOES, gerar_linhas_csv, gerar_xlsx
+from .models import TarefaExportacao
+from .remocoes import agendar_remocao
+
+logger = logging.getLogger(__name__)
+
+# Pedidos iguais (mesmo utilizador, relatório, formato e filtros) dentro
+# desta janela reutilizam a mesma tarefa / ficheiro.
+JANELA_REUTILIZACAO = timedelta(seconds=getattr(settings, 'EXPORTACOES_JANELA_REUTILIZACAO', 600))
+
+# 'thread': gera no próprio processo (pool de threads);
+# 'comando': apenas regista, e o 'manage.py processar_exportacoes' gera.
+MODO_EXECUCAO = getattr(settings, 'EXPORTACOES_MODO', 'thread')
+NUM_THREADS = getattr(settings, 'EXPORTACOES_THREADS', 2)
+
+# De quantas em quantas linhas o progresso é gravado no banco
+INTERVALO_PROGRESSO = 5000
+
+# Sem progresso gravado durante este tempo, a tarefa foi interrompida
+TEMPO_SEM_SINAL = timedelta(seconds=getattr(settings, 'EXPORTACOES_TEMPO_SEM_SINAL', 300))
+MAXIMO_TENTATIVAS = 3
+
+# Tarefas concluídas / com erro (e os ficheiros) são apagadas ao fim deste tempo
+RETENCAO = timedelta(hours=getattr(settings, 'EXPORTACOES_RETENCAO_HORAS', 24))
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=NUM_THREADS, thread_name_prefix='exportacao')
+    return _executor
+
+
+def pedido_assincrono(request):
+    """ Os botões de exportação da interface pedem a versão em segundo plano via fetch(). """
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+
+def _serializar_filtros(definicao, params):
+    return {campo: params.get(campo) for campo in definicao.campos_filtro if params.get(campo)}
+
+
+def _assinatura(tipo, formato, parametros):
+    bruto = json.dumps({'tipo': tipo, 'formato': formato, 'parametros': parametros}, sort_keys=True)
+    return hashlib.sha256(bruto.encode()).hexdigest()
+
+
+def solicitar_exportacao(user, tipo, formato, params):
+    """
+    Regista (ou reutiliza) uma tarefa de exportação. Retorna (tarefa, criada).
+    Uma tarefa igual pendente, em processamento ou concluída dentro da
+    janela de reutilização é devolvida em vez de gerar outro ficheiro.
+    """
+    definicao = EXPORTACOES[tipo]
+    parametros = _serializar_filtros(definicao, params)
+    assinatura = _assinatura(tipo, formato, parametros)
+
+    # (Uma tarefa interrompida não pode ser reutilizada como se estivesse a andar)
+    retomar_interrompidas()
+    existente = TarefaExportacao.objects.filter(
+        utilizador=user,
+        assinatura=assinatura,
+        status__in=['pendente', 'processando', 'concluida'],
+        data_criacao__gte=timezone.now() - JANELA_REUTILIZACAO,
+    ).first()
+    if existente:
+        return existente, False
+
+    tarefa = TarefaExportacao.objects.create(
+        utilizador=user, tipo=tipo, formato=formato,
+        parametros=parametros, assinatura=assinatura,
+    )
+    if MODO_EXECUCAO == 'thread':
+        transaction.on_commit(lambda: _get_executor().submit(_executar_em_thread, tarefa.id))
+    return tarefa, True
+
+
+def _executar_em_thread(tarefa_id):
+    try:
+        executar_tarefa(tarefa_id)
+        limpar_expiradas()
+    except Exception:
+        logger.exception("Erro no worker de exportações")
+    finally:
+        # (A thread tem a sua própria ligação ao banco)
+        close_old_connections()
+
+
+class TarefaInterrompida(Exception):
+    """ A tarefa foi devolvida à fila (ou dada como falhada) enquanto este worker a gerava. """
+
+
+def _atualizar(tarefa, **campos):
+    """
+    Grava o progresso e o sinal de vida. Só enquanto a tarefa for deste
+    worker: as tentativas servem de testemunho, se a tarefa foi retomada
+    por outro worker o UPDATE não encontra a linha.
+    """
+    atualizadas = TarefaExportacao.objects.filter(
+        pk=tarefa.pk, status='processando', tentativas=tarefa.tentativas,
+    ).update(data_atualizacao=timezone.now(), **campos)
+    if not atualizadas:
+        raise TarefaInterrompida(tarefa.pk)
+
+
+def _contar_progresso(tarefa, linhas):
+    """ Repassa as linhas e grava o progresso a cada INTERVALO_PROGRESSO linhas. """
+    processadas = 0
+    for linha in linhas:
+        yield linha
+        processadas += 1
+        if processadas % INTERVALO_PROGRESSO == 0:
+            _atualizar(tarefa, linhas_processadas=processadas)
+    _atualizar(tarefa, linhas_processadas=processadas)
+
+
+def executar_tarefa(tarefa_id):
+    """
+    Gera o ficheiro de uma tarefa pendente. A tarefa é "reclamada" com um
+    UPDATE condicional, por isso dois workers nunca geram a mesma.
+    Retorna True se a tarefa foi processada por este worker.
+    """
+    reclamada = TarefaExportacao.objects.filter(pk=tarefa_id, status='pendente').update(
+        status='processando', tentativas=F('tentativas') + 1, data_atualizacao=timezone.now(),
+    )
+    if not reclamada:
+        return False
+
+    tarefa = TarefaExportacao.objects.select_related('utilizador').get(pk=tarefa_id)
+    definicao = EXPORTACOES[tarefa.tipo]
+    try:
+        queryset = definicao.filtrar(tarefa.utilizador, tarefa.parametros)
+        tarefa.total_linhas = queryset.count()
+        _atualizar(tarefa, total_linhas=tarefa.total_linhas)
+
+        with tempfile.TemporaryFile() as temporario:
+            if tarefa.formato == 'csv':
+                linhas = _contar_progresso(tarefa, definicao.linhas_csv(queryset))
+                for texto in gerar_linhas_csv(definicao.cabecalho_csv, linhas):
+                    temporario.write(texto.encode('utf-8'))
+            else:
+                linhas = _contar_progresso(tarefa, definicao.linhas_xlsx(queryset))
+                gerar_xlsx(temporario, definicao.titulo_xlsx, definicao.cabecalho_xlsx, linhas, definicao.largura_colunas)
+            temporario.seek(0)
+            tarefa.arquivo.save(f"{definicao.nome_ficheiro}.{tarefa.formato}", File(temporario), save=False)
+
+        try:
+            _atualizar(
+                tarefa, arquivo=tarefa.arquivo.name, status='concluida',
+                linhas_processadas=tarefa.total_linhas, data_conclusao=timezone.now(),
+            )
+        except TarefaInterrompida:
+            agendar_remocao([tarefa.arquivo.name])
+            raise
+    except TarefaInterrompida:
+        logger.warning("A exportação #%s foi retomada por outro worker; resultado descartado", tarefa_id)
+    except Exception as exc:
+        logger.exception("Erro ao gerar a exportação #%s", tarefa_id)
+        TarefaExportacao.objects.filter(pk=tarefa_id, status='processando', tentativas=tarefa.tentativas).update(
+            status='erro', erro=str(exc), data_conclusao=timezone.now(), data_atualizacao=timezone.now(),
+        )
+    return True
+
+
+def recuperar_interrompidas():
+    """
+    Tarefas 'processando' sem sinal há mais de TEMPO_SEM_SINAL voltam a
+    'pendente' (ou ficam com erro, esgotadas as tentativas). Retorna
+    quantas voltaram à fila.
+    """
+    agora = timezone.now()
+    interrompidas = TarefaExportacao.objects.filter(
+        status='processando', data_atualizacao__lt=agora - TEMPO_SEM_SINAL,
+    )
+    interrompidas.filter(tentativas__gte=MAXIMO_TENTATIVAS).update(
+        status='erro', erro="A exportação foi interrompida várias vezes.",
+        data_conclusao=agora, data_atualizacao=agora,
+    )
+    # (O sinal antigo fica: em modo 'thread' é por ele que se sabe que ninguém a vai gerar)
+    return interrompidas.update(status='pendente')
+
+
+def retomar_interrompidas():
+    """
+    Recupera as tarefas interrompidas e, em modo 'thread', volta a
+    submeter as pendentes que ficaram sem worker (o processo morreu antes
+    ou durante a geração).
+    """
+    recuperar_interrompidas()
+    if MODO_EXECUCAO != 'thread':
+        return
+    orfas = list(TarefaExportacao.objects.filter(
+        status='pendente', data_atualizacao__lt=timezone.now() - TEMPO_SEM_SINAL,
+    ).values_list('id', flat=True))
+    for tarefa_id in orfas:
+        transaction.on_commit(lambda tarefa_id=tarefa_id: _get_executor().submit(_executar_em_thread, tarefa_id))
+
+
+def limpar_expiradas():
+    """
+    Apaga as tarefas terminadas há mais de RETENCAO. Os ficheiros vão para
+    a fila de remoções pelo post_delete. Retorna quantas apagou.
+    """
+    with transaction.atomic():
+        _, apagadas = TarefaExportacao.objects.filter(
+            status__in=['concluida', 'erro'], data_conclusao__lt=timezone.now() - RETENCAO,
+        ).delete()
+    return apagadas.get(TarefaExportacao._meta.label, 0)
+
+
+def processar_pendentes(limite=None):
+    """ Processa as tarefas pendentes (mais antigas primeiro). Retorna quantas processou. """
+    recuperar_interrompidas()
+    limpar_expiradas()
+    ids = TarefaExportacao.objects.filter(status='pendente').order_by('data_criacao').values_list('id', flat=True)
+    if limite:
+        ids = ids[:limite]
+    return sum(1 for tarefa_id in list(ids) if executar_tarefa(tarefa_id))
+
+
+def interrompida(tarefa):
+    """ A tarefa está por terminar e não dá sinal há mais de TEMPO_SEM_SINAL. """
+    return (
+        tarefa.status in ('pendente', 'processando')
+        and tarefa.data_atualizacao < timezone.now() - TEMPO_SEM_SINAL
+    )
+
+
+def tarefa_para_json(tarefa):
+    dados = {
+        'id': tarefa.id,
+        'status': tarefa.status,
+        'status_display': tarefa.get_status_display(),
+        'percentual': tarefa.percentual,
+        'linhas_processadas': tarefa.linhas_processadas,
+        'total_linhas': tarefa.total_linhas,
+        'status_url': reverse('exportacao_status', args=[tarefa.id]),
+        'download_url': None,
+        'erro': tarefa.erro,
+    }
+    if tarefa.status == 'concluida':
+        dados['download_url'] = reverse('exportacao_download', args=[tarefa.id])
+    return dados
+
+
+def resposta_exportacao_assincrona(request, tipo, formato):
+    """ Resposta JSON (202) das views de exportação quando o pedido é assíncrono. """
+    tarefa, criada = solicitar_exportacao(request.user, tipo, formato, request.GET)
+    dados = tarefa_para_json(tarefa)
+    dados['reutilizada'] = not criada
+    return JsonResponse(dados, status=202)
@@ -0,0 +1,129 @@
+import importlib.util
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from common.models import Cliente, Produto
+
+MODOS = ('sem_persistencia', 'persistente', 'pool')
+
+
+def _configuracao(base, modo, threads):
+    """ Cópia das settings da base de dados 'default' para o modo pedido. """
+    config = {**base, 'OPTIONS': {k: v for k, v in base['OPTIONS'].items() if k != 'pool'}}
+    if modo == 'sem_persistencia':
+        config.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+    elif modo == 'persistente':
+        config.update(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+    else:
+        config.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=True)
+        config['OPTIONS']['pool'] = {'min_size': threads, 'max_size': threads}
+    return config
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a latência por pedido das consultas de 'get_produto_data' e "
+        "'check_cliente' com cada modo de ligação à base de dados: sem "
+        "persistência, ligações persistentes e pool (PostgreSQL + psycopg 3)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pedidos', type=int, default=200,
+            help="Pedidos simulados por modo (padrão: 200).",
+        )
+        parser.add_argument(
+            '--threads', type=int, default=1,
+            help="Threads em simultâneo, como as threads de um worker gthread (padrão: 1).",
+        )
+        parser.add_argument(
+            '--modo', choices=MODOS, action='append', dest='modos',
+            help="Modo a medir (pode repetir; padrão: todos os disponíveis).",
+        )
+
+    def handle(self, *args, **options):
+        base = connections[DEFAULT_DB_ALIAS].settings_dict
+        threads = max(1, options['threads'])
+        pedidos = max(threads, options['pedidos'])
+
+        self.produto_id = Produto.objects.values_list('id', flat=True).first() or 0
+        self.cpf_cnpj = Cliente.objects.values_list('cpf_cnpj', flat=True).first() or '00000000000'
+        connections[DEFAULT_DB_ALIAS].close()
+
+        self.stdout.write(
+            f"Base de dados: {base['ENGINE'].rsplit('.', 1)[-1]} em {base['HOST'] or base['NAME']}; "
+            f"{pedidos} pedidos por modo, {threads} thread(s)."
+        )
+        self.stdout.write(f"{'modo':<18} {'média':>9} {'p50':>9} {'p95':>9} {'máx':>9} {'pedidos/s':>10}")
+
+        for modo in options['modos'] or MODOS:
+            motivo = self._indisponivel(modo, base)
+            if motivo:
+                self.stdout.write(self.style.WARNING(f"{modo:<18} ignorado: {motivo}"))
+                continue
+            latencias, duracao = self._medir(modo, _configuracao(base, modo, threads), pedidos, threads)
+            self.stdout.write(
+                f"{modo:<18} {statistics.mean(latencias):7.2f}ms {_percentil(latencias, 0.5):7.2f}ms "
+                f"{_percentil(latencias, 0.95):7.2f}ms {max(latencias):7.2f}ms {len(latencias) / duracao:10.0f}"
+            )
+
+    def _indisponivel(self, modo, base):
+        if modo != 'pool':
+            return None
+        if base['ENGINE'] != 'django.db.backends.postgresql':
+            return "só existe no PostgreSQL."
+        if importlib.util.find_spec('psycopg') is None or importlib.util.find_spec('psycopg_pool') is None:
+            return "requer 'psycopg[binary,pool]' instalado."
+        return None
+
+    def _pedido(self, alias):
+        """ Um pedido como o do Django: verificação das ligações no início e no fim (request_started/finished). """
+        conexao = connections[alias]
+        inicio = time.perf_counter()
+        conexao.close_if_unusable_or_obsolete()
+        Produto.objects.using(alias).filter(id=self.produto_id).first()
+        Cliente.objects.using(alias).filter(cpf_cnpj=self.cpf_cnpj).first()
+        conexao.close_if_unusable_or_obsolete()
+        return (time.perf_counter() - inicio) * 1000
+
+    def _medir(self, modo, config, pedidos, threads):
+        alias = f'benchmark_{modo}'
+        connections.settings[alias] = config
+        latencias = []
+        erros = []
+
+        def executar(quantidade):
+            try:
+                # (O primeiro pedido abre a ligação/pool e não conta)
+                self._pedido(alias)
+                for _ in range(quantidade):
+                    latencias.append(self._pedido(alias))
+            except Exception as exc:
+                erros.append(exc)
+            finally:
+                connections[alias].close()
+
+        por_thread = [pedidos // threads + (1 if i < pedidos % threads else 0) for i in range(threads)]
+        trabalhadores = [threading.Thread(target=executar, args=(n,)) for n in por_thread]
+        inicio = time.perf_counter()
+        for trabalhador in trabalhadores:
+            trabalhador.start()
+        for trabalhador in trabalhadores:
+            trabalhador.join()
+        duracao = time.perf_counter() - inicio
+
+        if config['OPTIONS'].get('pool'):
+            connections[alias].close_pool()
+        del connections.settings[alias]
+        if erros:
+            raise CommandError(f"O modo '{modo}' falhou: {erros[0]}")
+        return latencias, duracao
@@ -0,0 +1,40 @@
+from django.contrib.staticfiles.management.commands.collectstatic import Command as CollectstaticCommand
+
+
+class Command(CollectstaticCommand):
+    help = (
+        "Copia os estáticos para o STATIC_ROOT/storage. Com o storage do S3 "
+        "(core.storages.StaticStorage) só envia os ficheiros cujo conteúdo "
+        "mudou, comparando com o ETag dos objetos, e envia-os em paralelo."
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--paralelo', type=int,
+            help="Número de envios simultâneos para o S3 (padrão: o do storage).",
+        )
+
+    def set_options(self, **options):
+        super().set_options(**options)
+        self.paralelo = options['paralelo']
+
+    def collect(self):
+        if not hasattr(self.storage, 'envio_em_lote'):
+            return super().collect()
+        with self.storage.envio_em_lote(self.paralelo):
+            return super().collect()
+
+    def delete_file(self, path, prefixed_path, source_storage):
+        # (A data de modificação não serve para comparar: cada build do
+        # container tem datas novas; o conteúdo decide)
+        if not hasattr(self.storage, 'inalterado'):
+            return super().delete_file(path, prefixed_path, source_storage)
+        with source_storage.open(path) as ficheiro:
+            if self.storage.inalterado(prefixed_path, ficheiro):
+                if prefixed_path not in self.unmodified_files:
+                    self.unmodified_files.append(prefixed_path)
+                self.log("Skipping '%s' (not modified)" % path)
+                return False
+        # (O storage sobrescreve: não é preciso apagar antes de enviar)
+        return True
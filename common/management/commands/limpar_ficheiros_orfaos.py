@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from common.remocoes import PREFIXOS, agendar_remocao, ficheiros_orfaos
+
+
+class Command(BaseCommand):
+    help = "Procura no storage ficheiros que nenhuma linha referencia e envia-os para a fila de remoções."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prefixo', action='append', dest='prefixos',
+            help=f"Pasta a percorrer (pode repetir). Padrão: {', '.join(PREFIXOS)}",
+        )
+        parser.add_argument(
+            '--idade-minima-horas', type=float, default=24,
+            help="Ignora ficheiros mais recentes (uploads em curso). Padrão: 24.",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Apenas lista os ficheiros órfãos, sem os apagar.",
+        )
+
+    def handle(self, *args, **options):
+        orfaos = list(ficheiros_orfaos(
+            prefixos=options['prefixos'] or PREFIXOS,
+            idade_minima=timedelta(hours=options['idade_minima_horas']),
+        ))
+        for nome in orfaos:
+            self.stdout.write(nome, style_func=None)
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"[dry-run] {len(orfaos)} ficheiro(s) órfão(s)."))
+            return
+        with transaction.atomic():
+            agendar_remocao(orfaos)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(orfaos)} ficheiro(s) órfão(s) enviados para a fila de remoções."
+        ))
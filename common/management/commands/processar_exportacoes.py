@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from common.exportacao_tarefas import processar_pendentes
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera os ficheiros das exportações pendentes (usar com EXPORTACOES_MODO = 'comando'), "
+        "retoma as interrompidas e apaga as que passaram o prazo de retenção."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help="Fica em execução e verifica novas tarefas a cada --intervalo segundos.",
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help="Segundos entre verificações no modo contínuo (padrão: 2).",
+        )
+
+    def handle(self, *args, **options):
+        if not options['continuo']:
+            total = processar_pendentes()
+            self.stdout.write(self.style.SUCCESS(f"{total} exportação(ões) processada(s)."))
+            return
+
+        self.stdout.write("A aguardar exportações pendentes (Ctrl+C para terminar)...")
+        try:
+            while True:
+                total = processar_pendentes()
+                if total:
+                    self.stdout.write(f"{total} exportação(ões) processada(s).")
+                else:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from common.remocoes import processar_remocoes
+
+
+class Command(BaseCommand):
+    help = "Apaga do storage os ficheiros da fila de remoções (usar com REMOCOES_MODO = 'comando')."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help="Fica em execução e verifica a fila a cada --intervalo segundos.",
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=10.0,
+            help="Segundos entre verificações no modo contínuo (padrão: 10).",
+        )
+
+    def handle(self, *args, **options):
+        if not options['continuo']:
+            total = processar_remocoes()
+            self.stdout.write(self.style.SUCCESS(f"{total} remoção(ões) processada(s)."))
+            return
+
+        self.stdout.write("A aguardar remoções pendentes (Ctrl+C para terminar)...")
+        try:
+            while True:
+                total = processar_remocoes()
+                if total:
+                    self.stdout.write(f"{total} remoção(ões) processada(s).")
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,120 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.finders import get_finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.recorder import MigrationRecorder
+
+# App -> tabela principal (se a tabela não existir, o histórico da app é
+# limpo para o 'migrate' a recriar; antes era o 'fix_db.py' do Dockerfile)
+TABELAS_PRINCIPAIS = {
+    'common': 'vendas_cliente',
+    'comissoes': 'vendas_lotepagamentocomissao',
+    'vendas': 'vendas_venda',
+}
+
+# Ficheiro (no storage dos estáticos) com o hash do último collectstatic
+MARCADOR_ESTATICOS = 'staticfiles.sha256'
+
+
+class Command(BaseCommand):
+    help = (
+        "Fase de release, num só processo: corrige o histórico de migrações, "
+        "aplica as migrações pendentes, cria o superuser e faz o collectstatic "
+        "só quando os estáticos mudaram."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--forcar-collectstatic', action='store_true',
+            help="Faz o collectstatic mesmo que o hash dos estáticos não tenha mudado.",
+        )
+        parser.add_argument(
+            '--sem-collectstatic', action='store_true',
+            help="Não verifica nem envia os estáticos.",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        connection = connections[DEFAULT_DB_ALIAS]
+
+        self._corrigir_historico(connection)
+        self._migrar(connection)
+        self._criar_superuser()
+        if not options['sem_collectstatic']:
+            self._collectstatic(forcar=options['forcar_collectstatic'])
+        self.stdout.write(self.style.SUCCESS("Release concluída."))
+
+    def _corrigir_historico(self, connection):
+        tabelas = set(connection.introspection.table_names())
+        recorder = MigrationRecorder(connection)
+        if not recorder.has_table():
+            return
+        for app, tabela in TABELAS_PRINCIPAIS.items():
+            if tabela not in tabelas:
+                apagadas, _ = recorder.migration_qs.filter(app=app).delete()
+                if apagadas:
+                    self.stdout.write(self.style.WARNING(
+                        f"Tabela {tabela} não existe: histórico de migrações de '{app}' limpo para a recriar."
+                    ))
+
+    def _migrar(self, connection):
+        executor = MigrationExecutor(connection)
+        pendentes = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if not pendentes:
+            self.stdout.write("Migrações: nada pendente.")
+            return
+        self.stdout.write(f"Migrações: {len(pendentes)} pendente(s).")
+        call_command('migrate', interactive=False, verbosity=self.verbosity)
+
+    def _criar_superuser(self):
+        username = os.environ.get('DJANGO_SUPERUSER_USERNAME')
+        email = os.environ.get('DJANGO_SUPERUSER_EMAIL')
+        password = os.environ.get('DJANGO_SUPERUSER_PASSWORD')
+        if not (username and email and password):
+            return
+        User = get_user_model()
+        if User.objects.filter(username=username).exists():
+            return
+        User.objects.create_superuser(username=username, email=email, password=password)
+        self.stdout.write(f"Superuser '{username}' criado.")
+
+    def _hash_estaticos(self):
+        """ Hash dos caminhos e conteúdos de todos os ficheiros encontrados pelos finders. """
+        digest = hashlib.sha256()
+        # (Mudar de storage, p.ex. local -> S3, também obriga a novo collectstatic)
+        digest.update(f"{settings.STORAGES['staticfiles']['BACKEND']}|{settings.STATIC_URL}".encode())
+        encontrados = {}
+        for finder in get_finders():
+            for caminho, storage in finder.list(['CVS', '.*', '*~']):
+                # (Como no collectstatic, o primeiro finder a encontrar o caminho ganha)
+                encontrados.setdefault(caminho, storage)
+        for caminho in sorted(encontrados):
+            digest.update(caminho.encode())
+            with encontrados[caminho].open(caminho) as ficheiro:
+                for bloco in ficheiro.chunks():
+                    digest.update(bloco)
+        return digest.hexdigest()
+
+    def _collectstatic(self, forcar):
+        atual = self._hash_estaticos()
+        anterior = None
+        if not forcar and staticfiles_storage.exists(MARCADOR_ESTATICOS):
+            with staticfiles_storage.open(MARCADOR_ESTATICOS) as ficheiro:
+                anterior = ficheiro.read().decode().strip()
+        if anterior == atual:
+            self.stdout.write("Estáticos: sem alterações, collectstatic ignorado.")
+            return
+
+        self.stdout.write("Estáticos: alterados, a executar o collectstatic.")
+        call_command('collectstatic', interactive=False, verbosity=self.verbosity)
+        if staticfiles_storage.exists(MARCADOR_ESTATICOS):
+            staticfiles_storage.delete(MARCADOR_ESTATICOS)
+        staticfiles_storage.save(MARCADOR_ESTATICOS, ContentFile(atual.encode()))
@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Dependências que não devem ser importadas no arranque (só nas exportações,
+# leitura de ficheiros de pagamentos, miniaturas...)
+MODULOS_PESADOS = ('openpyxl', 'pandas', 'numpy', 'PIL', 'pymupdf', 'fitz')
+
+
+def _ler_importtime(stderr):
+    """ Converte a saída de '-X importtime' em [(modulo, self_us, cumulativo_us)]. """
+    registos = []
+    for linha in stderr.splitlines():
+        if not linha.startswith('import time:') or 'imported package' in linha:
+            continue
+        try:
+            proprio, cumulativo, modulo = linha[len('import time:'):].split('|', 2)
+            registos.append((modulo.strip(), int(proprio), int(cumulativo)))
+        except ValueError:
+            continue
+    return registos
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o custo de importação de cada módulo no arranque de um processo "
+        "(python -X importtime), como num cold start do App Runner."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modulo', default='core.wsgi',
+            help="Módulo importado no arranque (padrão: core.wsgi).",
+        )
+        parser.add_argument(
+            '--sem-urls', action='store_true',
+            help="Não importa o ROOT_URLCONF (por padrão é incluído: o primeiro pedido carrega-o).",
+        )
+        parser.add_argument(
+            '--top', type=int, default=25,
+            help="Quantos módulos mostrar, pelo tempo cumulativo (padrão: 25).",
+        )
+        parser.add_argument(
+            '--orcamento-ms', type=float,
+            help="Falha (código de saída 1) se o tempo total de importação passar deste valor.",
+        )
+        parser.add_argument(
+            '--estrito', action='store_true',
+            help=f"Falha se algum módulo pesado for importado no arranque ({', '.join(MODULOS_PESADOS)}).",
+        )
+
+    def handle(self, *args, **options):
+        codigo = f"import {options['modulo']}"
+        if not options['sem_urls']:
+            codigo += f"; import {settings.ROOT_URLCONF}"
+
+        ambiente = os.environ.copy()
+        ambiente.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+        inicio = time.perf_counter()
+        processo = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', codigo],
+            cwd=settings.BASE_DIR, env=ambiente, capture_output=True, text=True,
+        )
+        wall_ms = (time.perf_counter() - inicio) * 1000
+        if processo.returncode != 0:
+            raise CommandError(f"O arranque falhou:\n{processo.stderr[-2000:]}")
+
+        registos = _ler_importtime(processo.stderr)
+        total_ms = sum(proprio for _, proprio, _ in registos) / 1000
+
+        self.stdout.write(f"Arranque: '{codigo}'")
+        self.stdout.write(f"{len(registos)} módulos, {total_ms:.0f} ms em importações, {wall_ms:.0f} ms de processo.\n")
+
+        self.stdout.write(f"{'cumulativo':>11} {'próprio':>9}  módulo")
+        for modulo, proprio, cumulativo in sorted(registos, key=lambda r: -r[2])[:options['top']]:
+            self.stdout.write(f"{cumulativo / 1000:9.1f}ms {proprio / 1000:7.1f}ms  {modulo}")
+
+        por_pacote = defaultdict(int)
+        for modulo, proprio, _ in registos:
+            por_pacote[modulo.split('.')[0]] += proprio
+        self.stdout.write("\nPor pacote (tempo próprio):")
+        for pacote, proprio in sorted(por_pacote.items(), key=lambda p: -p[1])[:10]:
+            self.stdout.write(f"{proprio / 1000:9.1f}ms  {pacote}")
+
+        carregados = {modulo for modulo, _, _ in registos}
+        pesados = [modulo for modulo in MODULOS_PESADOS if modulo in carregados]
+        erros = []
+        if pesados:
+            aviso = f"Módulos pesados importados no arranque: {', '.join(pesados)}"
+            if options['estrito']:
+                erros.append(aviso)
+            else:
+                self.stdout.write(self.style.WARNING(aviso))
+        orcamento = options['orcamento_ms']
+        if orcamento is not None and total_ms > orcamento:
+            erros.append(f"Importações em {total_ms:.0f} ms, acima do orçamento de {orcamento:.0f} ms.")
+        if erros:
+            raise CommandError(' '.join(erros))
+        if orcamento is not None:
+            self.stdout.write(self.style.SUCCESS(f"Dentro do orçamento ({total_ms:.0f} / {orcamento:.0f} ms)."))
@@ -0,0 +1,37 @@
+# Índice trigram (pg_trgm) para a pesquisa de clientes por nome.
+#
+# O filtro 'cliente__nome_completo__icontains' é traduzido no PostgreSQL para
+# UPPER("nome_completo"::text) LIKE UPPER('%...%'); o índice é criado sobre a
+# mesma expressão para poder ser usado pelo planner. Noutros bancos (SQLite em
+# desenvolvimento) a migração não faz nada.
+
+from django.db import migrations
+
+NOME_INDICE = 'cliente_nome_trgm_idx'
+
+
+def criar_indice_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {NOME_INDICE} ON vendas_cliente '
+        f'USING gin ((UPPER(nome_completo::text)) gin_trgm_ops)'
+    )
+
+
+def remover_indice_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {NOME_INDICE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice_trigram, remover_indice_trigram),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:07
+
+import common.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0002_cliente_nome_trigram'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaExportacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=30, verbose_name='Relatório')),
+                ('formato', models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'XLSX')], max_length=4)),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Filtros')),
+                ('assinatura', models.CharField(db_index=True, max_length=64, verbose_name='Assinatura (tipo + formato + filtros)')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Em Processamento'), ('concluida', 'Concluída'), ('erro', 'Erro')], default='pendente', max_length=20)),
+                ('linhas_processadas', models.PositiveIntegerField(default=0)),
+                ('total_linhas', models.PositiveIntegerField(blank=True, null=True)),
+                ('arquivo', models.FileField(blank=True, null=True, upload_to=common.models.get_exportacao_path, verbose_name='Ficheiro Gerado')),
+                ('erro', models.TextField(blank=True, null=True)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True)),
+                ('utilizador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exportacoes', to=settings.AUTH_USER_MODEL, verbose_name='Utilizador')),
+            ],
+            options={
+                'verbose_name': 'Tarefa de Exportação',
+                'verbose_name_plural': 'Tarefas de Exportação',
+                'ordering': ['-data_criacao'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0003_tarefa_exportacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemocaoPendente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=500, verbose_name='Ficheiro (chave no storage)')),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('erro', models.TextField(blank=True, null=True)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Remoção Pendente',
+                'verbose_name_plural': 'Remoções Pendentes',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0004_remocao_pendente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefaexportacao',
+            name='data_atualizacao',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Último sinal do worker'),
+        ),
+        migrations.AddField(
+            model_name='tarefaexportacao',
+            name='tentativas',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
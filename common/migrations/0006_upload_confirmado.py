@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0005_tarefa_exportacao_sinal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadConfirmado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token_id', models.CharField(max_length=32, unique=True)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Upload Confirmado',
+                'verbose_name_plural': 'Uploads Confirmados',
+            },
+        ),
+    ]
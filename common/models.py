@@ -1,6 +1,9 @@
 # Em: common/models.py
 
+import os
+import uuid
 from django.db import models
+from django.utils import timezone
 
 # (Nota: Não precisamos de 'User' aqui, pois estes modelos são "passivos")
 
@@ -58,4 +61,79 @@ class FormaPagamento(models.Model):
         verbose_name_plural = "Formas de Pagamento"
     
     def __str__(self): 
-        return self.nome
\ No newline at end of file
+        return self.nome
+
+def get_exportacao_path(instance, filename):
+    """
+    Caminho dos ficheiros gerados pelas exportações em segundo plano:
+    media/exportacoes/utilizador_<id>/<uuid>.<ext>
+    """
+    ext = os.path.splitext(filename)[1]
+    return os.path.join('exportacoes', f'utilizador_{instance.utilizador_id}', f"{uuid.uuid4()}{ext}")
+
+class TarefaExportacao(models.Model):
+    """ Exportação (CSV/XLSX) gerada em segundo plano, ver 'common/exportacao_tarefas.py'. """
+    FORMATO_CHOICES = (('csv', 'CSV'), ('xlsx', 'XLSX'))
+    STATUS_CHOICES = (
+        ('pendente', 'Pendente'),
+        ('processando', 'Em Processamento'),
+        ('concluida', 'Concluída'),
+        ('erro', 'Erro'),
+    )
+    utilizador = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name="exportacoes", verbose_name="Utilizador")
+    tipo = models.CharField(max_length=30, verbose_name="Relatório")
+    formato = models.CharField(max_length=4, choices=FORMATO_CHOICES)
+    parametros = models.JSONField(default=dict, blank=True, verbose_name="Filtros")
+    assinatura = models.CharField(max_length=64, db_index=True, verbose_name="Assinatura (tipo + formato + filtros)")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    linhas_processadas = models.PositiveIntegerField(default=0)
+    total_linhas = models.PositiveIntegerField(null=True, blank=True)
+    arquivo = models.FileField(upload_to=get_exportacao_path, null=True, blank=True, verbose_name="Ficheiro Gerado")
+    erro = models.TextField(blank=True, null=True)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    data_atualizacao = models.DateTimeField(default=timezone.now, verbose_name="Último sinal do worker")
+    data_conclusao = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tarefa de Exportação"
+        verbose_name_plural = "Tarefas de Exportação"
+        ordering = ['-data_criacao']
+
+    def __str__(self):
+        return f"Exportação #{self.id} ({self.tipo}.{self.formato}) - {self.get_status_display()}"
+
+    @property
+    def percentual(self):
+        if self.status == 'concluida':
+            return 100
+        if not self.total_linhas:
+            return 0
+        return min(99, int(self.linhas_processadas * 100 / self.total_linhas))
+
+class RemocaoPendente(models.Model):
+    """ Ficheiro a apagar do storage (outbox), ver 'common/remocoes.py'. """
+    chave = models.CharField(max_length=500, verbose_name="Ficheiro (chave no storage)")
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    erro = models.TextField(blank=True, null=True)
+    data_criacao = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Remoção Pendente"
+        verbose_name_plural = "Remoções Pendentes"
+        ordering = ['id']
+
+    def __str__(self):
+        return self.chave
+
+class UploadConfirmado(models.Model):
+    """ Token de upload direto já usado (cada token só cria linhas uma vez), ver 'common/uploads_diretos.py'. """
+    token_id = models.CharField(max_length=32, unique=True)
+    data_criacao = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Upload Confirmado"
+        verbose_name_plural = "Uploads Confirmados"
+
+    def __str__(self):
+        return self.token_id
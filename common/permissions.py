@@ -0,0 +1,117 @@
+# Em: common/permissions.py
+
+from dataclasses import dataclass
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.shortcuts import redirect
+
+# Grupos que definem os perfis da aplicação
+GRUPOS_PERFIS = ('Gestor', 'Financeiro', 'Advogado', 'Vendedor')
+
+# Os grupos de um utilizador ficam na cache 'permissoes' durante
+# PERMISSOES_CACHE_TTL segundos. A cache é limpa pelos sinais em
+# 'common/signals.py' quando os grupos mudam; com a cache em memória
+# (por processo) a limpeza só chega ao worker que fez a alteração e os
+# outros demoram até PERMISSOES_CACHE_TTL a ver os grupos novos (ver
+# CACHES em 'core/settings.py').
+PERMISSOES_CACHE_ALIAS = 'permissoes'
+PERMISSOES_CACHE_TTL = getattr(settings, 'PERMISSOES_CACHE_TTL', 10)
+
+# Atributo onde as permissões ficam guardadas no objeto User (dura o request)
+_ATRIBUTO_USER = '_permissoes_meekah'
+
+
+def _cache_key(user_id):
+    return f"permissoes:grupos:{user_id}"
+
+
+@dataclass(frozen=True)
+class Permissoes:
+    """
+    Flags de perfil do utilizador (imutáveis).
+    Suporta acesso por chave (perms['is_admin']) para manter compatível
+    o código e os templates que usavam o antigo dicionário.
+    """
+    is_admin: bool = False
+    is_gestor: bool = False
+    is_financeiro: bool = False
+    is_advogado: bool = False
+    is_vendedor: bool = False
+
+    def __getitem__(self, chave):
+        try:
+            return getattr(self, chave)
+        except AttributeError:
+            raise KeyError(chave)
+
+    @property
+    def ve_todas_as_vendas(self):
+        """ Admin, Gestor, Financeiro e Advogado veem as vendas de todos. """
+        return self.is_admin or self.is_gestor or self.is_financeiro or self.is_advogado
+
+    @property
+    def pode_criar_vendas(self):
+        return self.is_admin or self.is_gestor or self.is_vendedor
+
+    @property
+    def pode_gerir_comissoes(self):
+        return self.is_admin or self.is_gestor or self.is_financeiro
+
+    @property
+    def pode_gerir_metas(self):
+        return self.is_admin or self.is_gestor
+
+
+SEM_PERMISSOES = Permissoes()
+
+
+def get_grupos_utilizador(user):
+    """ Nomes dos grupos do utilizador (cache por user id, no máximo 1 query). """
+    cache = caches[PERMISSOES_CACHE_ALIAS]
+    chave = _cache_key(user.pk)
+    grupos = cache.get(chave)
+    if grupos is None:
+        grupos = frozenset(user.groups.values_list('name', flat=True))
+        cache.set(chave, grupos, PERMISSOES_CACHE_TTL)
+    return grupos
+
+
+def limpar_cache_permissoes(*user_ids):
+    """ Invalida a cache de grupos dos utilizadores indicados. """
+    caches[PERMISSOES_CACHE_ALIAS].delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+def get_permissoes(user):
+    """
+    Resolve as permissões do utilizador uma única vez por request.
+    O resultado fica guardado no próprio objeto User (request.user),
+    por isso views, decorators e template tags partilham o mesmo valor.
+    """
+    if not getattr(user, 'is_authenticated', False):
+        return SEM_PERMISSOES
+    permissoes = getattr(user, _ATRIBUTO_USER, None)
+    if permissoes is None:
+        grupos = get_grupos_utilizador(user)
+        permissoes = Permissoes(
+            is_admin=user.is_superuser,
+            is_gestor='Gestor' in grupos,
+            is_financeiro='Financeiro' in grupos,
+            is_advogado='Advogado' in grupos,
+            is_vendedor='Vendedor' in grupos,
+        )
+        setattr(user, _ATRIBUTO_USER, permissoes)
+    return permissoes
+
+
+def gestor_ou_admin_required(view_func):
+    """ Decorator para as views de Gestão de Metas (só Admin e Gestor). """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if not get_permissoes(request.user).pode_gerir_metas:
+            messages.error(request, "Você não tem permissão para aceder a esta página.")
+            return redirect('dashboard')
+        return view_func(request, *args, **kwargs)
+    return _wrapped_view
@@ -0,0 +1,229 @@
+# Em: common/remocoes.py
+#
+# Remoção de ficheiros do storage em segundo plano (outbox).
+# Apagar uma linha com ficheiro (AnexoVenda, anexos dos lotes, exportações,
+# também por cascata de Venda/Lote) só regista a chave numa RemocaoPendente,
+# na mesma transação; o pedido não espera pelo S3 e um rollback não apaga
+# nada. Um worker (thread do próprio processo ou 'manage.py
+# processar_remocoes') apaga as chaves em blocos com 'DeleteObjects'.
+# O 'manage.py limpar_ficheiros_orfaos' encontra ficheiros que nenhuma
+# linha referencia (restos de versões antigas, uploads diretos não
+# confirmados) e envia-os para a mesma fila.
+# Os ficheiros guardados por conteúdo (PREFIXO_CONTEUDO, ver
+# 'common/armazenamento.py') podem ser partilhados por várias linhas: o
+# worker só os apaga quando nenhuma linha os referencia.
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, models, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from .models import RemocaoPendente
+
+logger = logging.getLogger(__name__)
+
+# 'thread': apaga no próprio processo logo após o commit;
+# 'comando': apenas regista, e o 'manage.py processar_remocoes' apaga.
+MODO_EXECUCAO = getattr(settings, 'REMOCOES_MODO', 'thread')
+
+# Chaves por ciclo do worker (o S3 aceita até 1000 por 'DeleteObjects')
+TAMANHO_BLOCO = 1000
+MAXIMO_TENTATIVAS = 5
+
+# Ficheiros partilhados (nome = SHA-256 do conteúdo). Só são apagados
+# depois deste atraso: um upload direto pode estar a reutilizá-los e só é
+# confirmado (e passa a ser referenciado) até VALIDADE_TOKEN depois de
+# preparado (ver 'common/uploads_diretos.py'; não importado aqui porque
+# esse módulo depende deste). Tem de ser >= VALIDADE_TOKEN.
+PREFIXO_CONTEUDO = 'anexos/'
+ATRASO_CONTEUDO = timedelta(minutes=70)
+
+# Pastas do storage com ficheiros das linhas registadas
+PREFIXOS = ('vendas/', 'comissoes/', 'exportacoes/', PREFIXO_CONTEUDO)
+
+# Modelo -> nomes dos FileFields (preenchido por 'apagar_ficheiros_ao_remover')
+_MODELOS = {}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='remocoes')
+    return _executor
+
+
+def agendar_remocao(chaves):
+    """ Regista as chaves na fila (dentro da transação atual). """
+    chaves = [chave for chave in chaves if chave]
+    if not chaves:
+        return
+    RemocaoPendente.objects.bulk_create([RemocaoPendente(chave=chave) for chave in chaves])
+    if MODO_EXECUCAO == 'thread':
+        transaction.on_commit(lambda: _get_executor().submit(_processar_em_thread))
+
+
+def _agendar_ficheiros_da_instancia(sender, instance, **kwargs):
+    agendar_remocao([getattr(instance, campo).name for campo in _MODELOS[sender]])
+
+
+def apagar_ficheiros_ao_remover(modelo):
+    """
+    Liga o post_delete do modelo à fila de remoções (chamado nos
+    'signals.py' das apps). Com o receiver ligado, as cascatas também
+    passam pelo post_delete de cada linha.
+    """
+    _MODELOS[modelo] = [
+        campo.name for campo in modelo._meta.get_fields() if isinstance(campo, models.FileField)
+    ]
+    post_delete.connect(
+        _agendar_ficheiros_da_instancia, sender=modelo,
+        dispatch_uid=f'remocoes:{modelo._meta.label}',
+    )
+
+
+def chaves_referenciadas(chaves):
+    """ Das chaves indicadas, as que ainda estão gravadas em alguma linha. """
+    chaves = list(chaves)
+    referenciadas = set()
+    for modelo, campos in _MODELOS.items():
+        for campo in campos:
+            referenciadas.update(
+                modelo.objects.filter(**{f'{campo}__in': chaves}).values_list(campo, flat=True)
+            )
+    return referenciadas
+
+
+def _apagar_do_storage(storage, chaves):
+    """ Retorna {chave: erro} das que não foi possível apagar. """
+    if hasattr(storage, 'delete_many'):
+        try:
+            return storage.delete_many(chaves)
+        except Exception as exc:
+            return {chave: str(exc) for chave in chaves}
+
+    erros = {}
+    for chave in chaves:
+        try:
+            storage.delete(chave)
+        except Exception as exc:
+            erros[chave] = str(exc)
+    return erros
+
+
+def processar_bloco(storage=None):
+    """ Apaga um bloco de chaves pendentes. Retorna quantas foram tratadas. """
+    storage = storage or default_storage
+    with transaction.atomic():
+        pendentes = list(
+            RemocaoPendente.objects.select_for_update(skip_locked=True)
+            .filter(tentativas__lt=MAXIMO_TENTATIVAS)
+            .filter(
+                ~Q(chave__startswith=PREFIXO_CONTEUDO) |
+                Q(data_criacao__lt=timezone.now() - ATRASO_CONTEUDO)
+            )
+            .order_by('id')[:TAMANHO_BLOCO]
+        )
+        if not pendentes:
+            return 0
+
+        # (Ficheiros partilhados que outra linha ainda usa saem da fila sem apagar)
+        chaves = {p.chave for p in pendentes}
+        chaves -= chaves_referenciadas(chaves)
+        erros = _apagar_do_storage(storage, sorted(chaves)) if chaves else {}
+        RemocaoPendente.objects.filter(
+            id__in=[p.id for p in pendentes if p.chave not in erros]
+        ).delete()
+        for pendente in pendentes:
+            if pendente.chave in erros:
+                logger.warning("Falha ao apagar '%s': %s", pendente.chave, erros[pendente.chave])
+                RemocaoPendente.objects.filter(id=pendente.id).update(
+                    tentativas=F('tentativas') + 1, erro=erros[pendente.chave][:2000],
+                )
+    return len(pendentes)
+
+
+def processar_remocoes(storage=None):
+    """ Esvazia a fila (as chaves com erro ficam para o próximo ciclo). """
+    total = 0
+    while True:
+        tratadas = processar_bloco(storage)
+        total += tratadas
+        if tratadas < TAMANHO_BLOCO:
+            return total
+
+
+def _processar_em_thread():
+    close_old_connections()
+    try:
+        processar_remocoes()
+    except Exception:
+        logger.exception("Erro ao processar a fila de remoções")
+    finally:
+        close_old_connections()
+
+
+# ---
+# Ficheiros órfãos
+# ---
+
+def ficheiros_referenciados():
+    """ Nomes de todos os ficheiros guardados nas linhas registadas. """
+    referenciados = set()
+    for modelo, campos in _MODELOS.items():
+        for campo in campos:
+            referenciados.update(
+                modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                .values_list(campo, flat=True).iterator(chunk_size=5000)
+            )
+    return referenciados
+
+
+def listar_ficheiros(prefixo, storage=None):
+    """ Gera (nome, data_modificacao) de todos os ficheiros sob o prefixo. """
+    storage = storage or default_storage
+    if hasattr(storage, 'bucket'):
+        # (S3: uma listagem paginada em vez de um 'listdir' por pasta)
+        raiz = storage._normalize_name(prefixo)
+        location = storage._normalize_name('')
+        for objeto in storage.bucket.objects.filter(Prefix=raiz):
+            yield objeto.key[len(location):].lstrip('/'), objeto.last_modified
+        return
+
+    pastas, ficheiros = storage.listdir(prefixo)
+    for ficheiro in ficheiros:
+        nome = os.path.join(prefixo, ficheiro)
+        yield nome, storage.get_modified_time(nome)
+    for pasta in pastas:
+        yield from listar_ficheiros(os.path.join(prefixo, pasta), storage)
+
+
+def ficheiros_orfaos(prefixos=PREFIXOS, idade_minima=timedelta(hours=24), storage=None):
+    """
+    Ficheiros sob os prefixos que nenhuma linha referencia, nem estão já
+    na fila. Só conta os mais antigos que 'idade_minima' (um upload pode
+    estar a meio, ex.: upload direto ainda por confirmar).
+    """
+    storage = storage or default_storage
+    referenciados = ficheiros_referenciados()
+    referenciados.update(RemocaoPendente.objects.values_list('chave', flat=True))
+    limite = timezone.now() - idade_minima
+
+    for prefixo in prefixos:
+        if not hasattr(storage, 'bucket') and not storage.exists(prefixo):
+            continue
+        for nome, modificado in listar_ficheiros(prefixo, storage):
+            if nome in referenciados:
+                continue
+            if timezone.is_naive(modificado):
+                modificado = timezone.make_aware(modificado)
+            if modificado < limite:
+                yield nome
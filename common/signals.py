@@ -0,0 +1,53 @@
+# Em: common/signals.py
+
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import TarefaExportacao
+from .permissions import limpar_cache_permissoes
+from .remocoes import apagar_ficheiros_ao_remover
+
+
+def _limpar_depois_do_commit(user_ids):
+    """
+    Limpa a cache só depois do commit: antes disso, um pedido concorrente
+    ainda leria os grupos antigos da base de dados e voltaria a pô-los em cache.
+    """
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: limpar_cache_permissoes(*user_ids))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidar_permissoes_grupos(sender, instance, action, reverse, pk_set, **kwargs):
+    """ Limpa a cache de permissões quando os grupos de um utilizador mudam. """
+    if action == 'pre_clear' and reverse:
+        # group.user_set.clear(): os membros só são conhecidos antes de limpar
+        instance._membros_a_limpar = list(instance.user_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        # user.groups.add/remove/clear(...)
+        _limpar_depois_do_commit([instance.pk])
+    elif action == 'post_clear':
+        _limpar_depois_do_commit(instance.__dict__.pop('_membros_a_limpar', ()))
+    elif pk_set:
+        # group.user_set.add/remove(...)
+        _limpar_depois_do_commit(pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidar_permissoes_membros(sender, instance, **kwargs):
+    """ Renomear ou apagar um grupo altera as permissões de todos os membros. """
+    if kwargs.get('created'):
+        return
+    # (No pre_delete os membros ainda existem; a cache só é limpa depois do commit)
+    _limpar_depois_do_commit(instance.user_set.values_list('pk', flat=True))
+
+
+# Ficheiros das exportações apagadas (ex.: cascata de um utilizador)
+apagar_ficheiros_ao_remover(TarefaExportacao)
@@ -0,0 +1,47 @@
+# Em: common/testing.py
+#
+# Fábricas partilhadas pelos testes das apps (vendas, comissoes, ...).
+# Só é importado pelos testes, nunca pelo código da aplicação.
+
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import Group, User
+
+from comissoes.models import LotePagamentoComissao
+from vendas.models import Venda
+
+from .models import Cliente, Produto
+
+
+def criar_utilizador(username, grupo=None, **campos):
+    """ Utilizador com password 'x', opcionalmente num grupo (criado se não existir). """
+    user = User.objects.create_user(username, password='x', **campos)
+    if grupo:
+        user.groups.add(Group.objects.get_or_create(name=grupo)[0])
+    return user
+
+
+def criar_base(username='vendedor'):
+    """ Vendedor, produto e cliente para as vendas dos testes. """
+    vendedor = criar_utilizador(username)
+    produto = Produto.objects.create(nome='Produto', valor=1000, tipo_comissao='P', valor_comissao=10)
+    cliente = Cliente.objects.create(nome_completo='Cliente', email='cliente@exemplo.com', cpf_cnpj='00000000000')
+    return vendedor, produto, cliente
+
+
+def criar_venda(vendedor, produto, cliente, honorarios=Decimal('100.00'), **campos):
+    return Venda.objects.create(
+        vendedor=vendedor, produto=produto, cliente=cliente,
+        honorarios=honorarios, valor_entrada=Decimal('10.00'), **campos
+    )
+
+
+def criar_lote(vendedor, responsavel, total=Decimal('100.00')):
+    return LotePagamentoComissao.objects.create(
+        vendedor=vendedor,
+        periodo_inicio=date(2025, 1, 1),
+        periodo_fim=date(2025, 1, 31),
+        responsavel_fechamento=responsavel,
+        total_comissoes=total,
+    )
@@ -1,3 +1,563 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from dataclasses import replace
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from vendas.models import AnexoVenda
+
+from . import exportacao_tarefas, remocoes
+from .armazenamento import (
+    NUM_THREADS_UPLOAD, ErroArmazenamento, apagar_novos, chave_por_conteudo, guardar_em_paralelo, guardar_por_conteudo,
+)
+from .exportacao import DefinicaoExportacao, EXPORTACOES, registar_exportacao
+from .models import RemocaoPendente, TarefaExportacao, UploadConfirmado
+from .permissions import PERMISSOES_CACHE_ALIAS, get_grupos_utilizador
+from .testing import criar_base, criar_venda
+from .uploads_diretos import VALIDADE_TOKEN, ErroUploadDireto, confirmar_uploads, preparar_uploads
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+
+def _filtrar_utilizadores(user, params):
+    return User.objects.order_by('id')
+
+
+DEFINICAO_TESTE = DefinicaoExportacao(
+    tipo='teste_utilizadores',
+    filtrar=_filtrar_utilizadores,
+    campos_filtro=(),
+    nome_ficheiro='utilizadores',
+    cabecalho_csv=['ID', 'Utilizador'],
+    linhas_csv=lambda queryset: ([u.id, u.username] for u in queryset),
+    titulo_xlsx='Utilizadores',
+    cabecalho_xlsx=['ID', 'Utilizador'],
+    linhas_xlsx=lambda queryset: ([u.id, u.username] for u in queryset),
+)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TarefasExportacaoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('exportador', password='x')
+
+    def setUp(self):
+        registar_exportacao(DEFINICAO_TESTE)
+        self.addCleanup(EXPORTACOES.pop, DEFINICAO_TESTE.tipo)
+        self.antigo = timezone.now() - exportacao_tarefas.TEMPO_SEM_SINAL - timedelta(minutes=1)
+
+    def criar_tarefa(self, **campos):
+        return TarefaExportacao.objects.create(
+            utilizador=self.user, tipo=DEFINICAO_TESTE.tipo, formato='csv',
+            assinatura=exportacao_tarefas._assinatura(DEFINICAO_TESTE.tipo, 'csv', {}), **campos
+        )
+
+    def test_tarefa_sem_sinal_volta_a_fila(self):
+        tarefa = self.criar_tarefa(status='processando', tentativas=1, data_atualizacao=self.antigo)
+        self.assertEqual(exportacao_tarefas.processar_pendentes(), 1)
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.tentativas), ('concluida', 2))
+        self.assertTrue(tarefa.arquivo.name.endswith('.csv'))
+
+    def test_tarefa_com_sinal_recente_nao_e_retomada(self):
+        tarefa = self.criar_tarefa(status='processando', tentativas=1)
+        self.assertEqual(exportacao_tarefas.processar_pendentes(), 0)
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'processando')
+
+    def test_tentativas_esgotadas_ficam_com_erro_e_nao_sao_reutilizadas(self):
+        tarefa = self.criar_tarefa(
+            status='processando', tentativas=exportacao_tarefas.MAXIMO_TENTATIVAS, data_atualizacao=self.antigo,
+        )
+        nova, criada = exportacao_tarefas.solicitar_exportacao(self.user, DEFINICAO_TESTE.tipo, 'csv', {})
+        self.assertTrue(criada)
+        self.assertNotEqual(nova.pk, tarefa.pk)
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'erro')
+
+    def test_resultado_de_worker_ultrapassado_e_descartado(self):
+        tarefa = self.criar_tarefa()
+
+        def linhas_com_retoma(queryset):
+            # (Outro worker retoma a tarefa a meio da geração)
+            TarefaExportacao.objects.filter(pk=tarefa.pk).update(tentativas=5)
+            return ([u.id, u.username] for u in queryset)
+
+        EXPORTACOES[DEFINICAO_TESTE.tipo] = replace(DEFINICAO_TESTE, linhas_csv=linhas_com_retoma)
+        with self.assertLogs(exportacao_tarefas.logger, 'WARNING'):
+            self.assertTrue(exportacao_tarefas.executar_tarefa(tarefa.pk))
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.arquivo.name), ('processando', ''))
+
+    def test_limpar_expiradas_apaga_tarefas_e_agenda_ficheiros(self):
+        expirada = self.criar_tarefa(
+            status='concluida', data_conclusao=timezone.now() - exportacao_tarefas.RETENCAO - timedelta(hours=1),
+        )
+        expirada.arquivo.save('antigo.csv', ContentFile(b'ID;Utilizador\n'))
+        recente = self.criar_tarefa(status='concluida', data_conclusao=timezone.now())
+
+        self.assertEqual(exportacao_tarefas.limpar_expiradas(), 1)
+        self.assertEqual(list(TarefaExportacao.objects.values_list('pk', flat=True)), [recente.pk])
+        self.assertEqual(list(RemocaoPendente.objects.values_list('chave', flat=True)), [expirada.arquivo.name])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RemocoesTests(TestCase):
+    """ Fila de remoções (outbox) de 'common/remocoes.py'. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('remocoes', password='x')
+
+    def criar_tarefa(self, arquivo):
+        return TarefaExportacao.objects.create(
+            utilizador=self.user, tipo='teste', formato='csv', assinatura='x', arquivo=arquivo,
+        )
+
+    def gravar(self, nome):
+        return default_storage.save(nome, ContentFile(b'conteudo'))
+
+    def envelhecer_fila(self):
+        RemocaoPendente.objects.update(data_criacao=timezone.now() - remocoes.ATRASO_CONTEUDO - timedelta(minutes=1))
+
+    def test_rollback_nao_apaga_nada(self):
+        nome = self.gravar('exportacoes/rollback.csv')
+        tarefa = self.criar_tarefa(nome)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            tarefa.delete()
+            raise RuntimeError
+        self.assertFalse(RemocaoPendente.objects.exists())
+        self.assertEqual(remocoes.processar_bloco(), 0)
+        self.assertTrue(default_storage.exists(nome))
+
+        TarefaExportacao.objects.get().delete()
+        self.assertEqual(remocoes.processar_bloco(), 1)
+        self.assertFalse(default_storage.exists(nome))
+        self.assertFalse(RemocaoPendente.objects.exists())
+
+    def test_ficheiro_partilhado_so_sai_quando_ninguem_o_usa(self):
+        nome = self.gravar('anexos/ab/partilhado.pdf')
+        primeira, segunda = self.criar_tarefa(nome), self.criar_tarefa(nome)
+        primeira.delete()
+        # (Conteúdo partilhado: fica na fila durante ATRASO_CONTEUDO)
+        self.assertEqual(remocoes.processar_bloco(), 0)
+
+        self.envelhecer_fila()
+        self.assertEqual(remocoes.processar_bloco(), 1)
+        self.assertTrue(default_storage.exists(nome))
+        self.assertFalse(RemocaoPendente.objects.exists())
+
+        segunda.delete()
+        self.envelhecer_fila()
+        self.assertEqual(remocoes.processar_bloco(), 1)
+        self.assertFalse(default_storage.exists(nome))
+
+    def test_falhas_somam_tentativas(self):
+        remocoes.agendar_remocao(['exportacoes/a.csv'])
+        storage = mock.Mock(spec=['delete'])
+        storage.delete.side_effect = OSError("Sem permissão")
+        for tentativa in range(1, remocoes.MAXIMO_TENTATIVAS + 1):
+            with self.assertLogs(remocoes.logger, 'WARNING'):
+                self.assertEqual(remocoes.processar_bloco(storage), 1)
+            pendente = RemocaoPendente.objects.get()
+            self.assertEqual((pendente.tentativas, pendente.erro), (tentativa, "Sem permissão"))
+        # (Tentativas esgotadas: a chave fica na fila, para ver no admin, mas não volta a ser tentada)
+        self.assertEqual(remocoes.processar_bloco(storage), 0)
+
+    def test_atraso_do_conteudo_cobre_os_uploads_diretos(self):
+        self.assertGreaterEqual(remocoes.ATRASO_CONTEUDO, timedelta(seconds=VALIDADE_TOKEN))
+
+
+
+class StorageLento:
+    """ Storage em memória em que cada 'save' espera pelos outros (só passa em paralelo). """
+
+    def __init__(self, envios, falhar=()):
+        self.barreira = threading.Barrier(envios, timeout=5)
+        self.falhar = set(falhar)
+        self.guardados = set()
+
+    def save(self, nome, ficheiro):
+        self.barreira.wait()
+        if nome in self.falhar:
+            raise OSError("S3 indisponível")
+        self.guardados.add(nome)
+        return nome
+
+    def delete(self, nome):
+        self.guardados.discard(nome)
+
+
+class GuardarEmParaleloTests(SimpleTestCase):
+    """ 'guardar_em_paralelo' de 'common/armazenamento.py'. """
+
+    def ficheiros(self, quantidade):
+        return [(f'vendas/{i}.pdf', ContentFile(b'x')) for i in range(quantidade)]
+
+    def test_envios_em_paralelo_pela_mesma_ordem(self):
+        storage = StorageLento(NUM_THREADS_UPLOAD)
+        nomes = guardar_em_paralelo(self.ficheiros(NUM_THREADS_UPLOAD), storage)
+        self.assertEqual(nomes, [f'vendas/{i}.pdf' for i in range(NUM_THREADS_UPLOAD)])
+        self.assertEqual(storage.guardados, set(nomes))
+
+    def test_falha_apaga_os_ja_enviados(self):
+        storage = StorageLento(3, falhar={'vendas/1.pdf'})
+        with self.assertRaisesMessage(ErroArmazenamento, "Falha ao enviar 'vendas/1.pdf'"):
+            guardar_em_paralelo(self.ficheiros(3), storage)
+        self.assertEqual(storage.guardados, set())
+
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class GuardarPorConteudoTests(TestCase):
+    """ Armazenamento por conteúdo (SHA-256) de 'common/armazenamento.py'. """
+
+    def guardar(self, *conteudos):
+        ficheiros = [ContentFile(conteudo, name=f'Recibo {i}.PDF') for i, conteudo in enumerate(conteudos)]
+        with mock.patch.object(default_storage, 'save', wraps=default_storage.save) as save:
+            guardados = guardar_por_conteudo(ficheiros)
+        return guardados, save.call_count
+
+    def test_chave_pelo_sha256(self):
+        sha256 = hashlib.sha256(b'declaracao').hexdigest()
+        (guardado,), _ = self.guardar(b'declaracao')
+        self.assertEqual(guardado.nome, chave_por_conteudo(sha256, 'x.PDF'))
+        self.assertEqual(guardado.nome, f'anexos/{sha256[:2]}/{sha256}.pdf')
+        self.assertEqual((guardado.sha256, guardado.descricao, guardado.novo), (sha256, 'Recibo 0.PDF', True))
+        with default_storage.open(guardado.nome) as ficheiro:
+            self.assertEqual(ficheiro.read(), b'declaracao')
+
+    def test_conteudo_repetido_enviado_uma_vez(self):
+        guardados, envios = self.guardar(b'recibo', b'recibo', b'contrato')
+        self.assertEqual(envios, 2)
+        self.assertEqual(guardados[0].nome, guardados[1].nome)
+
+        # (Já referenciado por uma linha: não volta a ser enviado)
+        AnexoVenda.objects.create(venda=criar_venda(*criar_base()), arquivo=guardados[0].nome)
+        (repetido, novo), envios = self.guardar(b'recibo', b'outro')
+        self.assertEqual(envios, 1)
+        self.assertEqual((repetido.nome, repetido.novo, novo.novo), (guardados[0].nome, False, True))
+
+        apagar_novos([repetido, novo])
+        self.assertTrue(default_storage.exists(repetido.nome))
+        self.assertFalse(default_storage.exists(novo.nome))
+
+
+@unittest.skipIf(mock_aws is None, "Requer o moto.")
+class UploadsDiretosTests(TestCase):
+
+    def setUp(self):
+        credenciais = mock.patch.dict(os.environ, {
+            'AWS_ACCESS_KEY_ID': 'teste', 'AWS_SECRET_ACCESS_KEY': 'teste', 'AWS_DEFAULT_REGION': 'us-east-1',
+        })
+        credenciais.start()
+        self.addCleanup(credenciais.stop)
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+
+        from storages.backends.s3 import S3Storage
+        self.storage = S3Storage(bucket_name='uploads-teste', region_name='us-east-1', location='media')
+        self.storage.connection.create_bucket(Bucket='uploads-teste')
+
+    def preparar_e_enviar(self, destino='venda:1:contrato'):
+        upload, = preparar_uploads(
+            [{'nome': 'contrato.pdf', 'tamanho': 4}], lambda nome: f'vendas/1/{nome}', destino, storage=self.storage,
+        )
+        # (O browser enviaria o ficheiro com a política; aqui basta criar o objeto)
+        self.storage.save('vendas/1/contrato.pdf', ContentFile(b'%PDF'))
+        return upload['token']
+
+    def test_token_so_pode_ser_confirmado_uma_vez(self):
+        token = self.preparar_e_enviar()
+        self.assertEqual(
+            confirmar_uploads([token], 'venda:1:contrato', storage=self.storage),
+            [('vendas/1/contrato.pdf', 'contrato.pdf', '')],
+        )
+        with self.assertRaisesMessage(ErroUploadDireto, "já foi confirmado"):
+            confirmar_uploads([token], 'venda:1:contrato', storage=self.storage)
+        self.assertEqual(UploadConfirmado.objects.count(), 1)
+
+    def test_token_repetido_no_mesmo_pedido(self):
+        token = self.preparar_e_enviar()
+        with self.assertRaises(ErroUploadDireto):
+            confirmar_uploads([token, token], 'venda:1:contrato', storage=self.storage)
+        self.assertFalse(UploadConfirmado.objects.exists())
+
+    def test_destino_diferente_e_objeto_em_falta(self):
+        token = self.preparar_e_enviar()
+        with self.assertRaisesMessage(ErroUploadDireto, "não pertence"):
+            confirmar_uploads([token], 'venda:2:contrato', storage=self.storage)
+        self.storage.delete('vendas/1/contrato.pdf')
+        with self.assertRaisesMessage(ErroUploadDireto, "não chegou"):
+            confirmar_uploads([token], 'venda:1:contrato', storage=self.storage)
+
+    def test_payload_mal_formado(self):
+        for ficheiros in ({'nome': 'a.pdf'}, ['a.pdf'], 'a.pdf', [None]):
+            with self.subTest(ficheiros=ficheiros), self.assertRaises(ErroUploadDireto):
+                preparar_uploads(ficheiros, str, 'venda:1:contrato', storage=self.storage)
+        for tokens in ('token', [1], [None], {'a': 'b'}):
+            with self.subTest(tokens=tokens), self.assertRaises(ErroUploadDireto):
+                confirmar_uploads(tokens, 'venda:1:contrato', storage=self.storage)
+
+
+@unittest.skipIf(mock_aws is None, "Requer o moto.")
+class EnvioEstaticosTests(SimpleTestCase):
+    """ 'StaticStorage.envio_em_lote' (collectstatic) contra um bucket do moto. """
+
+    CSS = 'css/app.0123456789ab.css'
+
+    def setUp(self):
+        credenciais = mock.patch.dict(os.environ, {
+            'AWS_ACCESS_KEY_ID': 'teste', 'AWS_SECRET_ACCESS_KEY': 'teste', 'AWS_DEFAULT_REGION': 'us-east-1',
+        })
+        credenciais.start()
+        self.addCleanup(credenciais.stop)
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+
+        from core.storages import StaticStorage
+        self.storage = StaticStorage(bucket_name='estaticos-teste', region_name='us-east-1')
+        self.cliente = self.storage.connection.meta.client
+        self.cliente.create_bucket(Bucket='estaticos-teste')
+
+    def enviar(self, ficheiros, apagar=()):
+        """ Grava e apaga num envio em lote; retorna as chaves enviadas para o bucket. """
+        with mock.patch.object(self.storage, '_enviar', wraps=self.storage._enviar) as enviar:
+            with self.storage.envio_em_lote(paralelo=2):
+                for nome, conteudo in ficheiros.items():
+                    self.storage.save(nome, ContentFile(conteudo))
+                for nome in apagar:
+                    self.storage.delete(nome)
+        return sorted(chamada.args[0] for chamada in enviar.call_args_list)
+
+    def objeto(self, chave):
+        return self.cliente.get_object(Bucket='estaticos-teste', Key=f'static/{chave}')
+
+    def test_gzip_brotli_e_cache_control(self):
+        import gzip
+
+        import brotli
+
+        css = b'body { color: red; }' * 50
+        self.assertEqual(
+            self.enviar({self.CSS: css, 'robots.txt': b'User-agent: *'}),
+            [f'static/{self.CSS}', f'static/{self.CSS}.br', 'static/robots.txt'],
+        )
+        objeto = self.objeto(self.CSS)
+        self.assertEqual((objeto['ContentEncoding'], objeto['CacheControl']), ('gzip', self.storage.cache_imutavel))
+        self.assertEqual(gzip.decompress(objeto['Body'].read()), css)
+
+        objeto = self.objeto(f'{self.CSS}.br')
+        self.assertEqual(objeto['ContentEncoding'], 'br')
+        self.assertEqual(brotli.decompress(objeto['Body'].read()), css)
+
+        objeto = self.objeto('robots.txt')
+        self.assertNotIn('ContentEncoding', objeto)
+        self.assertEqual(objeto['CacheControl'], self.storage.cache_revalidar)
+
+    def test_inventario_por_etag_so_envia_o_que_mudou(self):
+        ficheiros = {self.CSS: b'body { color: red; }', 'robots.txt': b'User-agent: *'}
+        self.enviar(ficheiros)
+        # (Mesmo conteúdo: nada é enviado, nem o '.br')
+        self.assertEqual(self.enviar(ficheiros), [])
+        with self.storage.envio_em_lote():
+            self.assertTrue(self.storage.inalterado(self.CSS, ContentFile(ficheiros[self.CSS])))
+            self.assertFalse(self.storage.inalterado(self.CSS, ContentFile(b'body {}')))
+
+        self.assertEqual(
+            self.enviar({**ficheiros, 'robots.txt': b'User-agent: *\nDisallow: /'}, apagar=[self.CSS]),
+            ['static/robots.txt'],
+        )
+        self.assertFalse(self.storage.exists(self.CSS))
+        self.assertTrue(self.storage.exists(f'{self.CSS}.br'))
+
+
+
+@unittest.skipIf(mock_aws is None, "Requer o moto.")
+class UrlsAssinadasTests(SimpleTestCase):
+    """ Cache das URLs assinadas de 'MediaStorage.url' contra um bucket do moto. """
+
+    def setUp(self):
+        credenciais = mock.patch.dict(os.environ, {
+            'AWS_ACCESS_KEY_ID': 'teste', 'AWS_SECRET_ACCESS_KEY': 'teste', 'AWS_DEFAULT_REGION': 'us-east-1',
+        })
+        credenciais.start()
+        self.addCleanup(credenciais.stop)
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        caches['urls_assinadas'].clear()
+        self.addCleanup(caches['urls_assinadas'].clear)
+
+        from core.storages import MediaStorage
+        self.storage = MediaStorage(bucket_name='media-teste', region_name='us-east-1')
+        self.storage.connection.meta.client.create_bucket(Bucket='media-teste')
+        for nome in ('a.pdf', 'b.pdf'):
+            self.storage.save(nome, ContentFile(b'x'))
+
+    def assinar(self, *nomes, **kwargs):
+        """ (URLs, nº de assinaturas feitas) """
+        from storages.backends.s3boto3 import S3Boto3Storage
+
+        with mock.patch.object(S3Boto3Storage, 'url', autospec=True, side_effect=S3Boto3Storage.url) as url:
+            urls = [self.storage.url(nome, **kwargs) for nome in nomes]
+        return urls, url.call_count
+
+    def test_url_assinada_em_cache(self):
+        (primeira,), assinaturas = self.assinar('a.pdf')
+        self.assertEqual(assinaturas, 1)
+        self.assertIn('Signature', primeira)
+        self.assertEqual(self.assinar('a.pdf', 'a.pdf'), ([primeira, primeira], 0))
+        # (Parâmetros próprios: assina sempre)
+        self.assertEqual(self.assinar('a.pdf', expire=60)[1], 1)
+
+    def test_validade_da_cache_menor_que_a_da_assinatura(self):
+        with mock.patch.object(caches['urls_assinadas'], 'set') as guardar:
+            self.storage.url('a.pdf')
+        self.assertLessEqual(guardar.call_args.args[2], self.storage.querystring_expire - 300)
+
+    def test_apagar_limpa_a_cache(self):
+        self.assinar('a.pdf', 'b.pdf')
+        self.storage.delete('a.pdf')
+        self.assertEqual(self.assinar('a.pdf', 'b.pdf')[1], 1)
+
+        self.assinar('a.pdf')
+        self.assertEqual(self.storage.delete_many(['a.pdf', 'b.pdf']), {})
+        self.assertEqual(self.assinar('a.pdf', 'b.pdf')[1], 2)
+
+
+class ArranqueTests(SimpleTestCase):
+
+    def test_arranque_nao_importa_modulos_pesados(self):
+        """ 'core.wsgi' + URLs num processo novo, sem openpyxl, PIL, PyMuPDF... (ver 'startup_profile'). """
+        saida = io.StringIO()
+        try:
+            call_command('startup_profile', '--estrito', '--top', '0', stdout=saida)
+        except CommandError as exc:
+            self.fail(str(exc))
+
+
+@override_settings(
+    STATIC_ROOT=tempfile.mkdtemp(),
+    STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}},
+)
+class ReleaseTests(TestCase):
+
+    def release(self, *argumentos):
+        saida = io.StringIO()
+        with mock.patch('common.management.commands.release.call_command') as chamadas:
+            call_command('release', *argumentos, stdout=saida)
+        return saida.getvalue(), [chamada.args[0] for chamada in chamadas.call_args_list]
+
+    def test_sem_migracoes_pendentes_nao_chama_o_migrate(self):
+        saida, comandos = self.release('--sem-collectstatic')
+        self.assertIn("Migrações: nada pendente.", saida)
+        self.assertEqual(comandos, [])
+
+    def test_collectstatic_so_quando_os_estaticos_mudam(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        from .management.commands.release import MARCADOR_ESTATICOS
+
+        self.assertEqual(self.release()[1], ['collectstatic'])
+        self.assertTrue(staticfiles_storage.exists(MARCADOR_ESTATICOS))
+
+        saida, comandos = self.release()
+        self.assertIn("collectstatic ignorado", saida)
+        self.assertEqual(comandos, [])
+
+        # (Hash diferente: p.ex. um estático alterado desde o último deploy)
+        staticfiles_storage.delete(MARCADOR_ESTATICOS)
+        staticfiles_storage.save(MARCADOR_ESTATICOS, ContentFile(b'outro hash'))
+        self.assertEqual(self.release()[1], ['collectstatic'])
+        self.assertEqual(self.release('--forcar-collectstatic')[1], ['collectstatic'])
+
+
+class PermissoesCacheTests(TestCase):
+
+    def setUp(self):
+        caches[PERMISSOES_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user('utilizador', password='x')
+
+    def test_grupos_em_cache_e_limpos_quando_mudam(self):
+        self.assertEqual(get_grupos_utilizador(self.user), frozenset())
+        with self.assertNumQueries(0):
+            get_grupos_utilizador(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(Group.objects.create(name='Gestor'))
+        self.assertEqual(get_grupos_utilizador(self.user), {'Gestor'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Group.objects.filter(name='Gestor').get().user_set.clear()
+        self.assertEqual(get_grupos_utilizador(self.user), frozenset())
+
+    def test_cache_so_limpa_depois_do_commit(self):
+        grupo = Group.objects.create(name='Financeiro')
+        get_grupos_utilizador(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            grupo.user_set.add(self.user)
+            # (Ainda sem commit: outro pedido continuaria a ver os grupos antigos)
+            self.assertEqual(get_grupos_utilizador(self.user), frozenset())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_grupos_utilizador(self.user), {'Financeiro'})
+
+    def test_apagar_grupo_limpa_os_membros(self):
+        grupo = Group.objects.create(name='Advogado')
+        self.user.groups.add(grupo)
+        self.assertEqual(get_grupos_utilizador(self.user), {'Advogado'})
+        with self.captureOnCommitCallbacks(execute=True):
+            grupo.delete()
+        self.assertEqual(get_grupos_utilizador(self.user), frozenset())
+
+
+class ConfiguracaoBdTests(SimpleTestCase):
+    """ DATABASES construído pelas settings para cada DB_PROCESSO (num processo novo). """
+
+    def configuracao(self, **variaveis):
+        ambiente = {k: v for k, v in os.environ.items() if not k.startswith(('DB_', 'GUNICORN_'))}
+        ambiente.update(DATABASE_URL='postgres://app:segredo@bd:5432/app', **variaveis)
+        processo = subprocess.run(
+            [sys.executable, '-c', 'import json, core.settings as s; print(json.dumps(s.DATABASES["default"], default=str))'],
+            cwd=settings.BASE_DIR, env=ambiente, capture_output=True, text=True, check=True,
+        )
+        return json.loads(processo.stdout)
+
+    def test_pool_web_e_worker(self):
+        web = self.configuracao(DB_POOL='1', DB_PROCESSO='web', GUNICORN_THREADS='6')
+        self.assertEqual(web['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(web['CONN_MAX_AGE'], 0)
+        self.assertEqual(web['OPTIONS']['pool'], {'min_size': 2, 'max_size': 9, 'timeout': 10})
+
+        worker = self.configuracao(DB_POOL='1', DB_PROCESSO='worker')
+        self.assertEqual(worker['OPTIONS']['pool'], {'min_size': 1, 'max_size': 2, 'timeout': 10})
+
+    def test_sem_pool_usa_ligacoes_persistentes(self):
+        config = self.configuracao(DB_PROCESSO='worker')
+        self.assertNotIn('pool', config.get('OPTIONS', {}))
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (60, True))
@@ -0,0 +1,162 @@
+# Em: common/uploads_diretos.py
+#
+# Uploads diretos do browser para o S3 (presigned POST).
+# 1. 'preparar': o servidor escolhe a chave (com as mesmas funções de
+#    'upload_to' dos modelos) e devolve a política de upload assinada,
+#    mais um token que identifica a chave e o destino;
+# 2. o browser envia o ficheiro diretamente ao S3 (o worker não fica
+#    bloqueado durante o upload);
+# 3. 'confirmar': o servidor valida os tokens, confirma que os objetos
+#    existem no bucket e cria as linhas (AnexoVenda, AnexoLoteComissao...).
+#    Cada token só pode ser confirmado uma vez (UploadConfirmado, na
+#    transação da view): repetir o pedido não cria linhas duplicadas.
+# Com o armazenamento local (DEBUG) os formulários continuam a enviar os
+# ficheiros para o Django, como antes.
+# Quando o browser envia o SHA-256 do ficheiro, a chave é a do
+# armazenamento por conteúdo ('common/armazenamento.py') e a política
+# exige o mesmo checksum: o S3 recusa um conteúdo diferente do anunciado.
+
+import base64
+import json
+import re
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .armazenamento import chave_por_conteudo
+from .models import UploadConfirmado
+
+TAMANHO_MAXIMO = getattr(settings, 'UPLOAD_DIRETO_TAMANHO_MAXIMO', 25 * 1024 * 1024)
+VALIDADE_POLITICA = 10 * 60  # segundos para o browser iniciar o upload
+VALIDADE_TOKEN = 60 * 60  # segundos para confirmar o upload
+MAXIMO_FICHEIROS = 20
+
+_SALT = 'common.uploads_diretos'
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ErroUploadDireto(Exception):
+    """ Pedido de upload inválido (a view responde 400). """
+
+
+def suporta_upload_direto(storage=None):
+    """ Só os storages S3 (django-storages/boto3) aceitam presigned POST. """
+    storage = storage or default_storage
+    return hasattr(storage, 'bucket') and hasattr(storage, '_normalize_name')
+
+
+def ler_pedido_json(request):
+    try:
+        dados = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ErroUploadDireto("Pedido inválido (JSON).")
+    if not isinstance(dados, dict):
+        raise ErroUploadDireto("Pedido inválido (JSON).")
+    return dados
+
+
+def preparar_uploads(ficheiros, gerar_chave, destino, storage=None):
+    """
+    'ficheiros': lista de {'nome', 'tamanho', 'sha256' (opcional)}
+    enviada pelo browser.
+    'gerar_chave(nome)': retorna o nome do ficheiro no storage (upload_to).
+    'destino': texto que identifica onde a linha vai ser criada
+    (ex.: 'venda:12:contrato'); é conferido em 'confirmar_uploads'.
+    Retorna uma lista de {'nome', 'url', 'fields', 'token'}.
+    """
+    storage = storage or default_storage
+    if not ficheiros:
+        raise ErroUploadDireto("Nenhum ficheiro indicado.")
+    if not isinstance(ficheiros, list) or not all(isinstance(ficheiro, dict) for ficheiro in ficheiros):
+        raise ErroUploadDireto("Pedido inválido (ficheiros).")
+    if len(ficheiros) > MAXIMO_FICHEIROS:
+        raise ErroUploadDireto(f"No máximo {MAXIMO_FICHEIROS} ficheiros por envio.")
+
+    cliente = storage.bucket.meta.client
+    uploads = []
+    for ficheiro in ficheiros:
+        nome = str(ficheiro.get('nome') or '').strip()[:255]
+        if not nome:
+            raise ErroUploadDireto("Ficheiro sem nome.")
+        try:
+            tamanho = int(ficheiro.get('tamanho') or 0)
+        except (TypeError, ValueError):
+            tamanho = 0
+        if tamanho > TAMANHO_MAXIMO:
+            raise ErroUploadDireto(f"O ficheiro '{nome}' excede o tamanho máximo permitido.")
+
+        sha256 = str(ficheiro.get('sha256') or '').lower()
+        campos, condicoes = {}, [['content-length-range', 1, TAMANHO_MAXIMO]]
+        if _SHA256.match(sha256):
+            chave = chave_por_conteudo(sha256, nome)
+            checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+            campos['x-amz-checksum-sha256'] = checksum
+            condicoes.append({'x-amz-checksum-sha256': checksum})
+        else:
+            sha256 = ''
+            chave = gerar_chave(nome)
+        politica = cliente.generate_presigned_post(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(chave),
+            Fields=campos,
+            Conditions=condicoes,
+            ExpiresIn=VALIDADE_POLITICA,
+        )
+        uploads.append({
+            'nome': nome,
+            'url': politica['url'],
+            'fields': politica['fields'],
+            'token': signing.dumps(
+                {'id': uuid.uuid4().hex, 'chave': chave, 'nome': nome, 'sha256': sha256, 'destino': destino},
+                salt=_SALT,
+            ),
+        })
+    return uploads
+
+
+def confirmar_uploads(tokens, destino, storage=None):
+    """
+    Valida os tokens devolvidos pelo browser (assinatura, validade e
+    destino), confirma que cada objeto existe no bucket e marca os tokens
+    como usados. Chamar dentro da transação que cria as linhas: se esta
+    falhar, os tokens podem ser confirmados outra vez.
+    Retorna uma lista de (chave, nome_original, sha256); o sha256 fica
+    vazio nos uploads sem checksum.
+    """
+    storage = storage or default_storage
+    if not tokens:
+        raise ErroUploadDireto("Nenhum upload para confirmar.")
+    if not isinstance(tokens, list) or not all(isinstance(token, str) for token in tokens):
+        raise ErroUploadDireto("Pedido inválido (tokens).")
+    if len(tokens) > MAXIMO_FICHEIROS:
+        raise ErroUploadDireto(f"No máximo {MAXIMO_FICHEIROS} ficheiros por envio.")
+
+    confirmados, ids = [], []
+    for token in tokens:
+        try:
+            dados = signing.loads(token, salt=_SALT, max_age=VALIDADE_TOKEN)
+        except signing.BadSignature:
+            raise ErroUploadDireto("Token de upload inválido ou expirado.")
+        if not dados.get('id'):
+            raise ErroUploadDireto("Token de upload inválido ou expirado.")
+        if dados.get('destino') != destino:
+            raise ErroUploadDireto("O upload não pertence a este registo.")
+        if not storage.exists(dados['chave']):
+            raise ErroUploadDireto(f"O ficheiro '{dados['nome']}' não chegou ao armazenamento.")
+        confirmados.append((dados['chave'], dados['nome'], dados.get('sha256', '')))
+        ids.append(dados['id'])
+
+    # (Os tokens expirados já não passam no 'max_age': o registo deles pode sair)
+    UploadConfirmado.objects.filter(data_criacao__lt=timezone.now() - timedelta(seconds=VALIDADE_TOKEN)).delete()
+    try:
+        # (A restrição 'unique' também apanha dois pedidos iguais em simultâneo)
+        with transaction.atomic():
+            UploadConfirmado.objects.bulk_create([UploadConfirmado(token_id=token_id) for token_id in ids])
+    except IntegrityError:
+        raise ErroUploadDireto("Este upload já foi confirmado.")
+    return confirmados
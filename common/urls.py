@@ -5,4 +5,8 @@ urlpatterns = [
     # APIs
     path('api/get_produto_data/<int:produto_id>/', views.get_produto_data, name='get_produto_data'),
     path('api/check_cliente/', views.check_cliente, name='check_cliente'),
+
+    # Exportações em segundo plano
+    path('api/exportacoes/<int:tarefa_id>/', views.exportacao_status, name='exportacao_status'),
+    path('exportacoes/<int:tarefa_id>/download/', views.exportacao_download, name='exportacao_download'),
 ]
\ No newline at end of file
@@ -1,6 +1,8 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse, Http404
+from django.shortcuts import redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from .models import Produto, Cliente
+from .models import Produto, Cliente, TarefaExportacao
+from .exportacao_tarefas import interrompida, retomar_interrompidas, tarefa_para_json
 
 @login_required
 def get_produto_data(request, produto_id):
@@ -47,4 +49,28 @@ def check_cliente(request):
         }
         return JsonResponse(data)
     else: 
-        return JsonResponse({'status': 'not_found'})
\ No newline at end of file
+        return JsonResponse({'status': 'not_found'})
+
+@login_required
+def exportacao_status(request, tarefa_id):
+    """ API de progresso de uma exportação em segundo plano (só o dono a vê) """
+    tarefa = get_object_or_404(TarefaExportacao, id=tarefa_id, utilizador=request.user)
+    if interrompida(tarefa):
+        retomar_interrompidas()
+        tarefa.refresh_from_db()
+    return JsonResponse(tarefa_para_json(tarefa))
+
+@login_required
+def exportacao_download(request, tarefa_id):
+    """ Descarrega o ficheiro de uma exportação concluída """
+    tarefa = get_object_or_404(TarefaExportacao, id=tarefa_id, utilizador=request.user, status='concluida')
+    if not tarefa.arquivo:
+        raise Http404("Ficheiro da exportação não encontrado")
+    try:
+        # (Armazenamento local: o Django serve o ficheiro)
+        tarefa.arquivo.path
+    except NotImplementedError:
+        # (S3: redireciona para o URL assinado)
+        return redirect(tarefa.arquivo.url)
+    nome = f"{tarefa.tipo}_{tarefa.data_criacao:%Y%m%d_%H%M}.{tarefa.formato}"
+    return FileResponse(tarefa.arquivo.open('rb'), as_attachment=True, filename=nome)
@@ -1,5 +1,4 @@
 import os
-import sys
 from pathlib import Path
 import environ
 
@@ -9,34 +8,23 @@ env = environ.Env(DEBUG=(bool, False))
 
 # 🔧 SÓ LÊ O .ENV SE NÃO ESTIVER EM PRODUÇÃO
 # Detecta se está rodando no AWS (App Runner, ECS, Lambda, etc.)
+# (Nada é impresso aqui: as settings são lidas no arranque de cada processo)
 if not os.environ.get('AWS_EXECUTION_ENV') and not os.environ.get('AWS_REGION'):
     env_file = os.path.join(BASE_DIR, '.env')
     if os.path.exists(env_file):
         environ.Env.read_env(env_file)
-        print("📄 Lendo .env local", file=sys.stderr)
-    else:
-        print("⚠️ Arquivo .env não encontrado", file=sys.stderr)
-else:
-    print("☁️ Ambiente AWS detectado - usando variáveis de ambiente", file=sys.stderr)
 
 SECRET_KEY = env('DJANGO_SECRET_KEY')
 
 # --- DEBUG / HOSTS / CSRF ---
 DEBUG = env.bool('DJANGO_DEBUG', default=False)
 
-# 🔍 DEBUG TEMPORÁRIO
-print(f"🔍 DEBUG: {DEBUG}", file=sys.stderr)
-print(f"🔍 DJANGO_DEBUG env var: {os.environ.get('DJANGO_DEBUG')}", file=sys.stderr)
-print(f"🔍 AWS_STORAGE_BUCKET_NAME: {os.environ.get('AWS_STORAGE_BUCKET_NAME')}", file=sys.stderr)
-
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', default=[])
 CSRF_TRUSTED_ORIGINS = env.list('CSRF_TRUSTED_ORIGINS', default=[])
 
 if DEBUG:
+    # (Modo desenvolvimento: storage local)
     ALLOWED_HOSTS.extend(['localhost', '127.0.0.1'])
-    print("⚠️ MODO DESENVOLVIMENTO - USANDO STORAGE LOCAL", file=sys.stderr)
-else:
-    print("✅ MODO PRODUÇÃO - USANDO S3", file=sys.stderr)
 
 
 # --- APPS ---
@@ -46,12 +34,13 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
 
     # Apps do projeto
     'common.apps.CommonConfig',
     'comissoes.apps.ComissoesConfig',
     'vendas',
+    # (Depois da 'common': o 'collectstatic' da 'common' substitui o do Django)
+    'django.contrib.staticfiles',
 
     # Terceiros
     'storages',
@@ -103,6 +92,61 @@ DATABASES = {
     )
 }
 
+# Ligações persistentes: cada thread reutiliza a sua ligação durante
+# DB_CONN_MAX_AGE segundos (sem TLS + autenticação a cada pedido), e o
+# Django verifica-a antes de a reutilizar num novo pedido.
+# DB_POOL=1 (só PostgreSQL, com o psycopg 3 e o psycopg_pool do requirements.txt)
+# usa antes um pool de ligações por processo. O tamanho depende de DB_PROCESSO:
+# - 'web' (gunicorn): uma ligação por thread, mais as threads de segundo
+#   plano (exportações, miniaturas, remoções);
+# - 'worker' (comandos com --continuo): uma ou duas ligações.
+# 'manage.py benchmark_bd' compara a latência por pedido de cada modo.
+DATABASES['default']['CONN_HEALTH_CHECKS'] = env.bool('DB_CONN_HEALTH_CHECKS', default=True)
+DB_PROCESSO = env('DB_PROCESSO', default='web')
+
+if env.bool('DB_POOL', default=False) and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    if DB_PROCESSO == 'worker':
+        _pool_min, _pool_max = 1, 2
+    else:
+        _pool_min, _pool_max = 2, env.int('GUNICORN_THREADS', default=4) + 3
+    # (O pool não pode ser combinado com ligações persistentes)
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': env.int('DB_POOL_MIN', default=_pool_min),
+        'max_size': env.int('DB_POOL_MAX', default=_pool_max),
+        'timeout': env.int('DB_POOL_TIMEOUT', default=10),
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=60)
+
+
+# --- Cache ---
+# (Cache local por processo; usada p.ex. para os grupos/permissões dos utilizadores)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'meekah-default',
+    },
+    # URLs assinadas do S3 (ver 'core/storages.py'). LocMemCache descarta
+    # as entradas menos usadas (LRU) quando passa de MAX_ENTRIES.
+    'urls_assinadas': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'meekah-urls-assinadas',
+        'TIMEOUT': 50 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 4},
+    },
+    # Grupos dos utilizadores (ver 'common/permissions.py'). Em memória,
+    # cada worker tem a sua cópia e a invalidação quando os grupos mudam
+    # só chega ao worker que fez a alteração: os outros usam os grupos
+    # antigos até PERMISSOES_CACHE_TTL. Com vários workers/instâncias,
+    # PERMISSOES_CACHE_URL (ex.: redis://..., requer o pacote 'redis')
+    # partilha a cache e a invalidação passa a valer para todos.
+    'permissoes': env.cache_url('PERMISSOES_CACHE_URL', default='locmemcache://meekah-permissoes'),
+}
+
+# Segundos que os grupos de um utilizador ficam em cache (ver acima)
+PERMISSOES_CACHE_TTL = env.int('PERMISSOES_CACHE_TTL', default=10)
+
 
 # --- Validações de senha ---
 AUTH_PASSWORD_VALIDATORS = [
@@ -130,19 +174,18 @@ LOGIN_URL = 'login'
 # ⚙️ CONFIGURAÇÃO DE STATIC E MEDIA
 # ============================================================
 
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
 if DEBUG:
     # --- MODO DESENVOLVIMENTO ---
     STATIC_URL = '/static/'
-    STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
     STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
     MEDIA_URL = '/media/'
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 else:
-    # --- MODO PRODUÇÃO (DEBUG=False) ---
-    print("✅ Configurando S3 STORAGE", file=sys.stderr)
-    
+    # --- MODO PRODUÇÃO (DEBUG=False): S3 ---
     AWS_ACCESS_KEY_ID = env('AWS_ACCESS_KEY_ID')
     AWS_SECRET_ACCESS_KEY = env('AWS_SECRET_ACCESS_KEY')
     AWS_STORAGE_BUCKET_NAME = env('AWS_STORAGE_BUCKET_NAME')
@@ -157,6 +200,7 @@ else:
         "default": {
             "BACKEND": "core.storages.MediaStorage",
         },
+        # Nomes com hash + manifesto, Cache-Control imutável e gzip/brotli
         "staticfiles": {
             "BACKEND": "core.storages.StaticStorage",
         },
@@ -167,8 +211,4 @@ else:
     MEDIA_URL = f"https://{AWS_STORAGE_BUCKET_NAME}.s3.{AWS_S3_REGION_NAME}.amazonaws.com/media/"
 
     # Local temporário dentro do container
-    STATIC_ROOT = "/app/staticfiles_prod"
-    
-    print(f"🔍 STORAGES configurado", file=sys.stderr)
-    print(f"🔍 STATIC_URL: {STATIC_URL}", file=sys.stderr)
-    print(f"🔍 MEDIA_URL: {MEDIA_URL}", file=sys.stderr)
\ No newline at end of file
+    STATIC_ROOT = "/app/staticfiles_prod"
\ No newline at end of file
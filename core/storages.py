@@ -1,13 +1,250 @@
+import gzip
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin
+from django.core.cache import caches
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+# Nomes com o hash do conteúdo gerados pelo ManifestFilesMixin ('app.1a2b3c4d5e6f.css')
+NOME_COM_HASH = re.compile(r'\.[0-9a-f]{12}(\.[^/.]+)?(\.br)?$')
 
-class StaticStorage(S3Boto3Storage):
-    """Storage para arquivos estáticos (CSS, JS, imagens do site)"""
+
+class StaticStorage(ManifestFilesMixin, S3Boto3Storage):
+    """
+    Storage para arquivos estáticos (CSS, JS, imagens do site).
+    O collectstatic grava cópias com o hash do conteúdo no nome e o manifesto
+    'staticfiles.json'; o {% static %} aponta para essas cópias, que nunca
+    mudam e por isso ficam em cache no browser durante um ano.
+    """
     location = 'static'
-    file_overwrite = False
+    # (Os nomes com hash não mudam de conteúdo; o manifesto é regravado)
+    file_overwrite = True
+    # URLs públicas e estáveis: uma URL assinada muda a cada página e anula a cache
+    querystring_auth = False
+    # CSS, JS e SVG gravados já comprimidos (Content-Encoding: gzip)
+    gzip = True
+    # Cópia '.br' ao lado dos ficheiros comprimíveis, para uma CDN à frente do
+    # bucket a servir a quem aceita brotli (o S3 sozinho não escolhe a
+    # codificação pelo Accept-Encoding).
+    brotli = True
+    envios_paralelos = 16
+
+    cache_imutavel = 'public, max-age=31536000, immutable'
+    cache_revalidar = 'no-cache'
+
+    # Estado do 'envio_em_lote' (só durante o collectstatic)
+    _inventario = None
+    _envios = None
+    _a_enviar = ()
+    _a_apagar = ()
+
+    def get_object_parameters(self, name):
+        params = super().get_object_parameters(name)
+        params['CacheControl'] = self.cache_imutavel if NOME_COM_HASH.search(name) else self.cache_revalidar
+        return params
+
+    # --- Envio em lote (collectstatic) ---
+
+    @contextmanager
+    def envio_em_lote(self, paralelo=None):
+        """
+        Durante o bloco, lê uma única vez a lista de objetos do bucket e
+        acumula as gravações e remoções: as gravações são enviadas em
+        paralelo (ver 'enviar_pendentes'), sem repetir os ficheiros cujo ETag
+        coincide com o conteúdo local, e as remoções só são feitas no fim. O
+        pós-processamento apaga e regrava os CSS/JS a cada passagem; assim só
+        chega ao S3 o resultado final. Ver 'common/management/commands/collectstatic.py'.
+        """
+        self._inventario = self._listar_objetos()
+        self._a_enviar = {}
+        self._a_apagar = set()
+        self._envios = ThreadPoolExecutor(
+            max_workers=paralelo or self.envios_paralelos, thread_name_prefix='collectstatic',
+        )
+        try:
+            yield
+            self.enviar_pendentes()
+            a_apagar = sorted(self._a_apagar)
+            self._envios.shutdown()
+            self._envios = self._inventario = None
+            for name in a_apagar:
+                self.delete(name)
+        finally:
+            if self._envios is not None:
+                self._envios.shutdown(cancel_futures=True)
+            self._envios = self._inventario = None
+            self._a_enviar = self._a_apagar = ()
+
+    def _listar_objetos(self):
+        """ {nome: ETag} de todos os objetos do storage. """
+        prefixo = f"{self.location}/" if self.location else ''
+        paginador = self.connection.meta.client.get_paginator('list_objects_v2')
+        objetos = {}
+        for pagina in paginador.paginate(Bucket=self.bucket_name, Prefix=prefixo):
+            for obj in pagina.get('Contents', []):
+                objetos[obj['Key'][len(prefixo):]] = obj['ETag'].strip('"')
+        return objetos
+
+    def _preparar(self, name, dados):
+        """ (chave, parâmetros, corpo) do objeto tal como é enviado para o S3. """
+        chave = self._normalize_name(clean_name(name))
+        params = self._get_write_parameters(chave)
+        if self.gzip and params['ContentType'] in self.gzip_content_types and 'ContentEncoding' not in params:
+            # (mtime=0: o mesmo conteúdo dá sempre os mesmos bytes, e o mesmo ETag)
+            dados = gzip.compress(dados, compresslevel=9, mtime=0)
+            params['ContentEncoding'] = 'gzip'
+        return chave, params, dados
+
+    def _usar_brotli(self, name, params):
+        return (
+            self.brotli and NOME_COM_HASH.search(name)
+            and params['ContentType'] in self.gzip_content_types
+        )
+
+    def inalterado(self, name, content):
+        """ True se o objeto no bucket já tem este conteúdo (pelo ETag). """
+        if self._inventario is None:
+            return False
+        _, _, corpo = self._preparar(name, _ler_bytes(content))
+        return self._inventario.get(clean_name(name)) == hashlib.md5(corpo).hexdigest()
+
+    def enviar_pendentes(self):
+        """ Envia em paralelo as gravações acumuladas e espera por elas (propaga o primeiro erro). """
+        if not self._a_enviar:
+            return
+        pendentes, self._a_enviar = self._a_enviar, {}
+        futuros = []
+        for nome, dados in pendentes.items():
+            chave, params, corpo = self._preparar(nome, dados)
+            etag = hashlib.md5(corpo).hexdigest()
+            alterado = self._inventario.get(nome) != etag
+            if alterado:
+                futuros.append(self._envios.submit(self._enviar, chave, params, corpo))
+                self._inventario[nome] = etag
+            if self._usar_brotli(nome, params) and (alterado or f"{nome}.br" not in self._inventario):
+                futuros.append(self._envios.submit(self._enviar_brotli, chave, params, dados))
+                self._inventario[f"{nome}.br"] = None
+        for futuro in futuros:
+            futuro.result()
+
+    def _enviar(self, chave, params, corpo):
+        # (Cada thread usa a sua ligação: os 'resources' do boto3 não são
+        # partilháveis entre threads, ao contrário do 'self.bucket')
+        self.connection.meta.client.put_object(Bucket=self.bucket_name, Key=chave, Body=corpo, **params)
+
+    def _enviar_brotli(self, chave, params, dados):
+        import brotli
+        self._enviar(f"{chave}.br", {**params, 'ContentEncoding': 'br'}, brotli.compress(dados))
+
+    def exists(self, name):
+        if self._inventario is not None:
+            nome = clean_name(name)
+            return nome in self._a_enviar or (nome in self._inventario and nome not in self._a_apagar)
+        return super().exists(name)
+
+    def delete(self, name):
+        if self._envios is None:
+            return super().delete(name)
+        nome = clean_name(name)
+        self._a_enviar.pop(nome, None)
+        if nome in self._inventario:
+            self._a_apagar.add(nome)
+
+    def _save(self, name, content):
+        if self._envios is None:
+            return super()._save(name, content)
+        nome = clean_name(name)
+        self._a_apagar.discard(nome)
+        self._a_enviar[nome] = _ler_bytes(content)
+        return nome
+
+    def post_process(self, *args, **kwargs):
+        # (O pós-processamento pode ler do bucket os originais acabados de copiar)
+        if self._envios is not None:
+            self.enviar_pendentes()
+        yield from super().post_process(*args, **kwargs)
+
+    def save_manifest(self):
+        # (O manifesto é o último a ser enviado: só aponta para ficheiros que já estão no bucket)
+        if self._envios is not None:
+            self.enviar_pendentes()
+        super().save_manifest()
+
+
+def _ler_bytes(content):
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    dados = content.read()
+    return dados.encode() if isinstance(dados, str) else dados
+
 
 class MediaStorage(S3Boto3Storage):
     """Storage para arquivos de upload dos usuários"""
     location = 'media'
     file_overwrite = False
     querystring_auth = True  # Gera URLs assinadas
-    querystring_expire = 3600  # Expira em 1 hora
\ No newline at end of file
+    querystring_expire = 3600  # Expira em 1 hora
+
+    # URLs assinadas ficam em cache (alias 'urls_assinadas', LRU limitado)
+    # durante a maior parte da validade: listas com centenas de anexos
+    # deixam de calcular uma assinatura SigV4 por link.
+    url_cache_alias = 'urls_assinadas'
+    url_cache_ttl = getattr(settings, 'MEDIA_URL_CACHE_TTL', 50 * 60)
+
+    def _url_cache_key(self, name):
+        digest = hashlib.sha256(f"{self.bucket_name}:{self.location}:{name}".encode()).hexdigest()
+        return f"media-url:{digest}"
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        # (Pedidos com parâmetros próprios não usam a cache)
+        if parameters or expire or http_method:
+            return super().url(name, parameters, expire, http_method)
+        cache = caches[self.url_cache_alias]
+        chave = self._url_cache_key(name)
+        url = cache.get(chave)
+        if url is None:
+            url = super().url(name)
+            # (Nunca mais do que a validade da assinatura, com 5 minutos de margem)
+            cache.set(chave, url, min(self.url_cache_ttl, self.querystring_expire - 300))
+        return url
+
+    # Objetos que nunca mudam depois de gravados (miniaturas, ver
+    # 'vendas/miniaturas.py'): o browser guarda-os durante um ano.
+    sufixos_imutaveis = ('.mini.jpg',)
+
+    def get_object_parameters(self, name):
+        params = super().get_object_parameters(name)
+        if name.endswith(self.sufixos_imutaveis):
+            params['CacheControl'] = 'private, max-age=31536000, immutable'
+        return params
+
+    def delete(self, name):
+        super().delete(name)
+        caches[self.url_cache_alias].delete(self._url_cache_key(name))
+
+    # (Limite do S3 por pedido 'DeleteObjects')
+    delete_many_max = 1000
+
+    def delete_many(self, names):
+        """
+        Apaga vários ficheiros com 'DeleteObjects' (até 1000 por pedido).
+        Retorna {nome: erro} dos que o S3 não conseguiu apagar.
+        """
+        names = list(names)
+        erros = {}
+        for inicio in range(0, len(names), self.delete_many_max):
+            bloco = names[inicio:inicio + self.delete_many_max]
+            chaves = {self._normalize_name(clean_name(name)): name for name in bloco}
+            resposta = self.bucket.meta.client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': chave} for chave in chaves], 'Quiet': True},
+            )
+            for erro in resposta.get('Errors', []):
+                erros[chaves.get(erro['Key'], erro['Key'])] = f"{erro.get('Code')}: {erro.get('Message')}"
+        caches[self.url_cache_alias].delete_many([self._url_cache_key(name) for name in names])
+        return erros
@@ -0,0 +1,127 @@
+# Em: gunicorn.conf.py
+#
+# Configuração do Gunicorn em produção (usada pelo 'entrypoint.sh').
+# - Workers e threads são calculados a partir dos CPUs e da memória do
+#   container (limites do cgroup, como no App Runner/ECS);
+# - workers 'gthread': os pedidos passam a maior parte do tempo à espera
+#   do S3 e do Postgres, por isso cada worker atende vários em paralelo;
+# - preload_app: a aplicação é importada uma vez no master e partilhada
+#   pelos workers (copy-on-write), o que reduz a memória e o arranque;
+# - max_requests com jitter: os workers são reciclados aos poucos, sem
+#   reiniciarem todos ao mesmo tempo.
+# Todos os valores podem ser alterados por variáveis de ambiente GUNICORN_*.
+
+import multiprocessing
+import os
+
+
+def _env_int(nome, padrao):
+    valor = os.environ.get(nome)
+    return int(valor) if valor not in (None, '') else padrao
+
+
+def _env_bool(nome, padrao):
+    valor = os.environ.get(nome)
+    if valor in (None, ''):
+        return padrao
+    return valor.strip().lower() in ('1', 'true', 'yes', 'sim', 'on')
+
+
+def _ler(caminho):
+    try:
+        with open(caminho) as ficheiro:
+            return ficheiro.read().strip()
+    except OSError:
+        return None
+
+
+def cpus_disponiveis():
+    """ CPUs do container: quota do cgroup (v2 ou v1) ou, sem limite, os do host. """
+    quota = _ler('/sys/fs/cgroup/cpu.max')
+    if quota and not quota.startswith('max'):
+        limite, periodo = quota.split()
+        return max(1, int(int(limite) / int(periodo)))
+    limite, periodo = _ler('/sys/fs/cgroup/cpu/cpu.cfs_quota_us'), _ler('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if limite and periodo and int(limite) > 0:
+        return max(1, int(int(limite) / int(periodo)))
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+def memoria_disponivel_mb():
+    """ Memória do container em MB (limite do cgroup ou memória física). """
+    for caminho in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        valor = _ler(caminho)
+        # (Sem limite, o cgroup v1 devolve um número enorme)
+        if valor and valor.isdigit() and int(valor) < 1 << 50:
+            return int(valor) // (1024 * 1024)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def calcular_workers(cpus, memoria_mb, memoria_por_worker_mb, reserva_mb=256):
+    """ 2 * CPUs + 1, limitado pela memória que cabe depois da reserva do master. """
+    workers = 2 * cpus + 1
+    if memoria_mb:
+        workers = min(workers, (memoria_mb - reserva_mb) // memoria_por_worker_mb)
+    return max(1, workers)
+
+
+CPUS = cpus_disponiveis()
+MEMORIA_MB = memoria_disponivel_mb()
+MEMORIA_POR_WORKER_MB = _env_int('GUNICORN_MEMORIA_POR_WORKER_MB', 200)
+
+# --- Servidor ---
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = _env_int('GUNICORN_WORKERS', calcular_workers(CPUS, MEMORIA_MB, MEMORIA_POR_WORKER_MB))
+threads = _env_int('GUNICORN_THREADS', 4)
+preload_app = _env_bool('GUNICORN_PRELOAD', True)
+
+# --- Reciclagem dos workers ---
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+
+# --- Tempos ---
+# (As exportações grandes correm em segundo plano; 60 s cobre os uploads
+# que ainda passam pelo Django)
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+# (O load balancer do App Runner mantém as ligações abertas)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+# O heartbeat dos workers em memória: o disco dos containers pode bloquear
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# --- Logs (stdout/stderr, para o App Runner) ---
+# (GUNICORN_ACCESSLOG vazio desliga o access log)
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
+
+
+def when_ready(server):
+    server.log.info(
+        "Gunicorn: %s workers '%s' x %s threads, preload=%s, max_requests=%s (+%s), "
+        "%s CPU(s), %s MB",
+        workers, worker_class, threads, preload_app, max_requests, max_requests_jitter,
+        CPUS, MEMORIA_MB if MEMORIA_MB is not None else '?',
+    )
+
+
+def pre_fork(server, worker):
+    # (Com preload, as ligações à base de dados que a aplicação tenha aberto
+    # no master são fechadas no master, antes de cada fork: assim nenhum
+    # worker herda um socket partilhado. Fechá-las no worker enviaria o fim
+    # da sessão pelo socket do master. O pool, se DB_POOL=1, também fecha:
+    # as suas threads não sobrevivem ao fork)
+    if preload_app:
+        from django.db import connections
+        for conexao in connections.all(initialized_only=True):
+            conexao.close()
+            if conexao.settings_dict['OPTIONS'].get('pool'):
+                conexao.close_pool()
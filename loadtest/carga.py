@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# Em: loadtest/carga.py
+#
+# Teste de carga simples (só a biblioteca padrão) para dimensionar o Gunicorn
+# (ver gunicorn.conf.py): N pedidos GET com C em simultâneo; no fim mostra
+# pedidos/s, erros e latências (p50/p95/p99).
+#
+# O cenário dos números do gunicorn.conf.py (600 pedidos, 16 em simultâneo):
+#   GUNICORN_ACCESSLOG= gunicorn core.wsgi:application -c gunicorn.conf.py
+#   python loadtest/carga.py http://127.0.0.1:8000 --caminho /login/ --pedidos 600 --concorrencia 16
+# e repetir com GUNICORN_WORKER_CLASS=sync (ou outros GUNICORN_WORKERS /
+# GUNICORN_THREADS) para comparar.
+#
+# Com --utilizador (password na variável CARGA_PASSWORD) cada ligação faz
+# login antes da medição, para medir as páginas autenticadas, que passam pela
+# base de dados e pelo S3 (p.ex. --caminho / --caminho /vendas/).
+
+import argparse
+import http.cookiejar
+import os
+import queue
+import re
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+CSRF = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+CAMINHO_LOGIN = '/login/'
+
+
+def abrir_sessao(base, utilizador=None, password=None):
+    """ Opener com cookies próprios; com utilizador, já autenticado. """
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    if not utilizador:
+        return opener
+    url = base + CAMINHO_LOGIN
+    token = CSRF.search(opener.open(url).read().decode())
+    if token is None:
+        raise SystemExit(f"Sem token CSRF em {url}.")
+    dados = urllib.parse.urlencode({
+        'username': utilizador, 'password': password or '', 'csrfmiddlewaretoken': token.group(1),
+    }).encode()
+    resposta = opener.open(urllib.request.Request(url, data=dados, headers={'Referer': url}))
+    if urllib.parse.urlparse(resposta.geturl()).path == CAMINHO_LOGIN:
+        raise SystemExit(f"Login de '{utilizador}' falhou.")
+    return opener
+
+
+def medir(base, caminhos, pedidos, concorrencia, utilizador=None, password=None):
+    """ Retorna (segundos, latências dos pedidos certos, nº de erros). """
+    # (Os logins são feitos antes de começar a contar)
+    sessoes = queue.Queue()
+    for _ in range(concorrencia):
+        sessoes.put(abrir_sessao(base, utilizador, password))
+
+    def pedido(indice):
+        caminho = caminhos[indice % len(caminhos)]
+        opener = sessoes.get()
+        inicio = time.perf_counter()
+        try:
+            with opener.open(base + caminho, timeout=60) as resposta:
+                resposta.read()
+                # (Uma página protegida que redireciona para o login não conta)
+                final = urllib.parse.urlparse(resposta.geturl()).path
+                certo = caminho == CAMINHO_LOGIN or final != CAMINHO_LOGIN
+        except (urllib.error.URLError, OSError):
+            certo = False
+        finally:
+            sessoes.put(opener)
+        return time.perf_counter() - inicio, certo
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        resultados = list(executor.map(pedido, range(pedidos)))
+    duracao = time.perf_counter() - inicio
+
+    latencias = [latencia for latencia, certo in resultados if certo]
+    return duracao, latencias, len(resultados) - len(latencias)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga (GET) para dimensionar o Gunicorn.")
+    parser.add_argument('url', help="URL base do servidor, p.ex. http://127.0.0.1:8000")
+    parser.add_argument(
+        '--caminho', action='append', dest='caminhos',
+        help="Caminho a pedir (repetível; os pedidos alternam entre eles). Padrão: /login/",
+    )
+    parser.add_argument('--pedidos', type=int, default=600)
+    parser.add_argument('--concorrencia', type=int, default=16)
+    parser.add_argument('--utilizador', help="Faz login com este utilizador (password em CARGA_PASSWORD).")
+    args = parser.parse_args(argv)
+
+    base = args.url.rstrip('/')
+    caminhos = args.caminhos or [CAMINHO_LOGIN]
+    duracao, latencias, erros = medir(
+        base, caminhos, args.pedidos, args.concorrencia, args.utilizador, os.environ.get('CARGA_PASSWORD'),
+    )
+
+    print(f"{args.pedidos} pedidos, {args.concorrencia} em simultâneo, {duracao:.2f} s: "
+          f"{args.pedidos / duracao:.1f} pedidos/s, {erros} erro(s)")
+    if len(latencias) >= 2:
+        percentis = statistics.quantiles(latencias, n=100)
+        print("Latência (ms): p50 {:.1f}  p95 {:.1f}  p99 {:.1f}  máx {:.1f}".format(
+            percentis[49] * 1000, percentis[94] * 1000, percentis[98] * 1000, max(latencias) * 1000,
+        ))
+    return 1 if erros else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -24,7 +24,7 @@ class VendaAdmin(admin.ModelAdmin):
 
 @admin.register(AnexoVenda)
 class AnexoVendaAdmin(admin.ModelAdmin):
-    list_display = ('venda', 'tipo', 'link_para_o_arquivo', 'data_upload')
+    list_display = ('venda', 'tipo', 'pre_visualizacao', 'link_para_o_arquivo', 'data_upload')
     search_fields = ('venda__id',)
     list_filter = ('tipo',) 
     
@@ -32,4 +32,10 @@ class AnexoVendaAdmin(admin.ModelAdmin):
         if obj.arquivo: 
             return format_html('<a href="{}" target="_blank">Abrir Anexo</a>', obj.arquivo.url)
         return "Nenhum arquivo"
-    link_para_o_arquivo.short_description = "Link do Arquivo"
\ No newline at end of file
+    link_para_o_arquivo.short_description = "Link do Arquivo"
+
+    def pre_visualizacao(self, obj):
+        if obj.miniatura_estado == 'pronta':
+            return format_html('<img src="{}" alt="" loading="lazy" height="48">', obj.miniatura.url)
+        return "-"
+    pre_visualizacao.short_description = "Pré-visualização"
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class VendasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'vendas'
+
+    def ready(self):
+        # Regista os sinais que mantêm o resumo diário (VendaResumoDiario)
+        from . import signals  # noqa: F401
+        # Regista a definição da exportação de vendas (tarefas em segundo plano)
+        from . import exportacao  # noqa: F401
@@ -0,0 +1,112 @@
+# Em: vendas/exportacao.py
+#
+# Definição das colunas do relatório de Vendas (usada pelas exportações).
+
+from common.exportacao import EXPORTACAO_CHUNK_SIZE, DefinicaoExportacao, registar_exportacao
+
+from .filtros import FILTROS_VENDAS, filtrar_vendas
+from .models import Venda
+
+VENDAS_CABECALHO = [
+    'ID Venda',
+    'Data',
+    'Vendedor',
+    'Cliente',
+    'CPF/CNPJ',
+    'Produto',
+    'Honorarios Totais',
+    'Entrada',
+    'N Parcelas',
+    'Valor Parcela',
+    'Exito',
+    'Aporte',
+    'Status Venda',
+    'Status Pagamento',
+    'Status Contrato'
+]
+
+VENDAS_CAMPOS = [
+    'id',
+    'data_venda',
+    'vendedor__username',
+    'cliente__nome_completo',
+    'cliente__cpf_cnpj',
+    'produto__nome',
+    'honorarios',
+    'valor_entrada',
+    'num_parcelas',
+    'valor_parcela',
+    'valor_exito',
+    'valor_aporte',
+    'status_venda',
+    'status_pagamento',
+    'status_contrato',
+]
+
+# Mapas pré-calculados (substituem get_*_display() linha a linha)
+_STATUS_VENDA = dict(Venda.STATUS_VENDA_CHOICES)
+_STATUS_PAGAMENTO = dict(Venda.STATUS_PAGAMENTO_CHOICES)
+_STATUS_CONTRATO = dict(Venda.STATUS_CONTRATO_CHOICES)
+
+
+def _linhas_brutas(vendas):
+    """ Tuplas (values_list) das vendas, lidas do banco em blocos. """
+    return vendas.values_list(*VENDAS_CAMPOS).iterator(chunk_size=EXPORTACAO_CHUNK_SIZE)
+
+
+def linhas_vendas_csv(vendas):
+    for (venda_id, data_venda, vendedor, cliente, cpf_cnpj, produto, honorarios, entrada,
+         num_parcelas, valor_parcela, exito, aporte, status_venda, status_pagamento, status_contrato) in _linhas_brutas(vendas):
+        yield [
+            venda_id,
+            data_venda.strftime('%Y-%m-%d %H:%M'),
+            vendedor,
+            cliente,
+            cpf_cnpj,
+            produto,
+            honorarios,
+            entrada,
+            num_parcelas,
+            valor_parcela,
+            exito,
+            aporte,
+            _STATUS_VENDA.get(status_venda, status_venda),
+            _STATUS_PAGAMENTO.get(status_pagamento, status_pagamento),
+            _STATUS_CONTRATO.get(status_contrato, status_contrato),
+        ]
+
+
+def linhas_vendas_xlsx(vendas):
+    for (venda_id, data_venda, vendedor, cliente, cpf_cnpj, produto, honorarios, entrada,
+         num_parcelas, valor_parcela, exito, aporte, status_venda, status_pagamento, status_contrato) in _linhas_brutas(vendas):
+        yield [
+            venda_id,
+            data_venda.replace(tzinfo=None),
+            vendedor,
+            cliente,
+            cpf_cnpj,
+            produto,
+            float(honorarios or 0),
+            float(entrada or 0),
+            num_parcelas,
+            float(valor_parcela or 0),
+            float(exito or 0),
+            float(aporte or 0),
+            _STATUS_VENDA.get(status_venda, status_venda),
+            _STATUS_PAGAMENTO.get(status_pagamento, status_pagamento),
+            _STATUS_CONTRATO.get(status_contrato, status_contrato),
+        ]
+
+
+registar_exportacao(DefinicaoExportacao(
+    tipo='vendas',
+    filtrar=filtrar_vendas,
+    campos_filtro=FILTROS_VENDAS,
+    nome_ficheiro='relatorio_vendas',
+    cabecalho_csv=VENDAS_CABECALHO,
+    linhas_csv=linhas_vendas_csv,
+    titulo_xlsx="Relatório de Vendas",
+    cabecalho_xlsx=VENDAS_CABECALHO,
+    linhas_xlsx=linhas_vendas_xlsx,
+    largura_colunas=20,
+))
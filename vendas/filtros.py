@@ -0,0 +1,60 @@
+# Em: vendas/filtros.py
+
+from datetime import datetime, timedelta
+
+from common.permissions import get_permissoes
+
+from .models import Venda
+
+# Parâmetros (GET) aceites pelos filtros da lista de vendas
+FILTROS_VENDAS = (
+    'cliente', 'vendedor', 'data_inicio', 'data_fim', 'produto',
+    'status_venda', 'status_pagamento', 'status_contrato',
+)
+
+
+def filtrar_vendas(user, params):
+    """
+    Retorna o queryset de Vendas filtrado pelos parâmetros ('params' é um
+    QueryDict ou dicionário com as chaves de FILTROS_VENDAS) e com as
+    permissões corretas para o utilizador.
+    """
+    perms = get_permissoes(user)
+
+    query_cliente = params.get('cliente', '')
+    query_vendedor = params.get('vendedor', '')
+    query_data_inicio = params.get('data_inicio', '')
+    query_data_fim = params.get('data_fim', '')
+    query_produto = params.get('produto', '')
+    query_status_venda = params.get('status_venda', '')
+    query_status_pagamento = params.get('status_pagamento', '')
+    query_status_contrato = params.get('status_contrato', '')
+
+    if perms.ve_todas_as_vendas:
+        vendas = Venda.objects.all()
+    else:
+        vendas = Venda.objects.filter(vendedor=user)
+
+    if query_cliente:
+        vendas = vendas.filter(cliente__nome_completo__icontains=query_cliente)
+    if perms.ve_todas_as_vendas and query_vendedor:
+        vendas = vendas.filter(vendedor_id=query_vendedor)
+    if query_data_inicio:
+        vendas = vendas.filter(data_venda__gte=query_data_inicio)
+    if query_data_fim:
+        try:
+            data_fim_plus_one = datetime.strptime(query_data_fim, '%Y-%m-%d').date() + timedelta(days=1)
+            vendas = vendas.filter(data_venda__lt=data_fim_plus_one)
+        except (ValueError, TypeError):
+            pass
+    if query_produto:
+        vendas = vendas.filter(produto_id=query_produto)
+    if query_status_venda:
+        vendas = vendas.filter(status_venda=query_status_venda)
+    if query_status_pagamento:
+        vendas = vendas.filter(status_pagamento=query_status_pagamento)
+    if query_status_contrato:
+        vendas = vendas.filter(status_contrato=query_status_contrato)
+
+    # (O 'id' desempata vendas com a mesma data e torna a paginação por cursor estável)
+    return vendas.select_related('cliente', 'produto', 'vendedor').order_by('-data_venda', 'id')
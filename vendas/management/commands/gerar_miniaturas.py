@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vendas.miniaturas import extensoes_suportadas, processar_miniaturas
+
+
+class Command(BaseCommand):
+    help = "Gera as miniaturas dos anexos pendentes (usar com MINIATURAS_MODO = 'comando' ou para os anexos antigos)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help="Fica em execução e verifica novos anexos a cada --intervalo segundos.",
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=5.0,
+            help="Segundos entre verificações no modo contínuo (padrão: 5).",
+        )
+
+    def handle(self, *args, **options):
+        if not extensoes_suportadas():
+            raise CommandError("O Pillow não está instalado: não é possível gerar miniaturas.")
+
+        if not options['continuo']:
+            total = processar_miniaturas()
+            self.stdout.write(self.style.SUCCESS(f"{total} anexo(s) processado(s)."))
+            return
+
+        self.stdout.write("A aguardar anexos sem miniatura (Ctrl+C para terminar)...")
+        try:
+            while True:
+                total = processar_miniaturas()
+                if total:
+                    self.stdout.write(f"{total} anexo(s) processado(s).")
+                else:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
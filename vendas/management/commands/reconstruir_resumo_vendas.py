@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vendas.resumo import reconstruir_resumo
+
+
+class Command(BaseCommand):
+    help = "Reconstrói a tabela de resumo diário de vendas (VendaResumoDiario) a partir das vendas."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            help="Reconstrói apenas a partir deste dia (AAAA-MM-DD). Por padrão reconstrói tudo.",
+        )
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = datetime.strptime(options['desde'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Data inválida em --desde (use AAAA-MM-DD).")
+
+        total = reconstruir_resumo(desde)
+        self.stdout.write(self.style.SUCCESS(f"Resumo diário reconstruído: {total} linha(s)."))
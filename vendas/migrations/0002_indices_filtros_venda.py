@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comissoes', '0001_initial'),
+        ('common', '0001_initial'),
+        ('vendas', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['-data_venda', 'id'], name='venda_data_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['vendedor', '-data_venda', 'id'], name='venda_vendedor_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['status_pagamento', '-data_venda', 'id'], name='venda_status_pag_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(condition=models.Q(('status_pagamento', 'aprovado')), fields=['data_venda', 'vendedor'], name='venda_aprovada_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(condition=models.Q(('lote_pagamento__isnull', True), ('status_pagamento', 'aprovado')), fields=['vendedor', 'data_venda'], name='venda_aprov_sem_lote_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def preencher_resumo(apps, schema_editor):
+    """ Carga inicial do resumo a partir das vendas existentes. """
+    Venda = apps.get_model('vendas', 'Venda')
+    VendaResumoDiario = apps.get_model('vendas', 'VendaResumoDiario')
+    linhas = Venda.objects.annotate(dia=TruncDate('data_venda')).values(
+        'dia', 'vendedor_id', 'produto_id', 'status_pagamento'
+    ).annotate(
+        total_honorarios=Sum('honorarios'),
+        total_valor_entrada=Sum('valor_entrada'),
+        total_comissao=Sum('comissao_calculada_final'),
+        contagem=Count('id'),
+        contagem_comissao=Count('comissao_calculada_final'),
+    ).order_by()
+    VendaResumoDiario.objects.bulk_create([
+        VendaResumoDiario(
+            dia=linha['dia'],
+            vendedor_id=linha['vendedor_id'],
+            produto_id=linha['produto_id'],
+            status_pagamento=linha['status_pagamento'],
+            total_honorarios=linha['total_honorarios'] or 0,
+            total_valor_entrada=linha['total_valor_entrada'] or 0,
+            total_comissao=linha['total_comissao'] or 0,
+            contagem=linha['contagem'],
+            contagem_comissao=linha['contagem_comissao'],
+        )
+        for linha in linhas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0002_cliente_nome_trigram'),
+        ('vendas', '0002_indices_filtros_venda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(verbose_name='Dia')),
+                ('status_pagamento', models.CharField(choices=[('pendente', 'Pendente (Sem comprovante)'), ('aguardando_validacao', 'Aguardando Validação'), ('aprovado', 'Aprovado'), ('reprovado', 'Reprovado')], max_length=30)),
+                ('total_honorarios', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_valor_entrada', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_comissao', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('contagem', models.PositiveIntegerField(default=0, verbose_name='Nº de Vendas')),
+                ('contagem_comissao', models.PositiveIntegerField(default=0, verbose_name='Nº de Vendas com Comissão')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='common.produto', verbose_name='Produto')),
+                ('vendedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Vendedor')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário de Vendas',
+                'verbose_name_plural': 'Resumos Diários de Vendas',
+                'unique_together': {('dia', 'vendedor', 'produto', 'status_pagamento')},
+            },
+        ),
+        migrations.RunPython(preencher_resumo, migrations.RunPython.noop),
+    ]
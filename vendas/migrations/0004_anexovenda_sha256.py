@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendas', '0003_venda_resumo_diario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anexovenda',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='SHA-256'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendas', '0004_anexovenda_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anexovenda',
+            name='miniatura',
+            field=models.FileField(blank=True, editable=False, max_length=150, upload_to='', verbose_name='Miniatura'),
+        ),
+        migrations.AddField(
+            model_name='anexovenda',
+            name='miniatura_estado',
+            field=models.CharField(choices=[('pendente', 'Pendente'), ('pronta', 'Pronta'), ('indisponivel', 'Indisponível')], db_index=True, default='pendente', editable=False, max_length=12),
+        ),
+    ]
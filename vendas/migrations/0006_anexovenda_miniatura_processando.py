@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendas', '0005_anexovenda_miniatura'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anexovenda',
+            name='miniatura_inicio',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Início da Geração da Miniatura'),
+        ),
+        migrations.AlterField(
+            model_name='anexovenda',
+            name='miniatura_estado',
+            field=models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Em Processamento'), ('pronta', 'Pronta'), ('indisponivel', 'Indisponível')], db_index=True, default='pendente', editable=False, max_length=12),
+        ),
+    ]
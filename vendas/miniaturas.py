@@ -0,0 +1,181 @@
+# Em: vendas/miniaturas.py
+#
+# Miniaturas (pré-visualizações) dos anexos das vendas.
+# Os anexos novos ficam com miniatura_estado='pendente'; um worker (thread
+# do próprio processo ou 'manage.py gerar_miniaturas') lê o original do
+# storage, gera um JPEG pequeno e guarda-o ao lado do original
+# ('<nome>.mini.jpg'). As imagens precisam do Pillow e os PDFs também do
+# PyMuPDF; sem eles os anexos ficam pendentes até a dependência existir.
+# O worker reclama um bloco (miniatura_estado='processando', commit) e só
+# depois descarrega e gera, fora da transação: nenhuma linha fica
+# bloqueada durante o trabalho lento. Um anexo 'processando' há mais de
+# TEMPO_MAXIMO (o worker morreu) volta a ser reclamável.
+# Os objetos das miniaturas nunca mudam, por isso o MediaStorage grava-os
+# com Cache-Control longo (ver 'core/storages.py').
+
+import importlib.util
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AnexoVenda
+
+logger = logging.getLogger(__name__)
+
+# 'thread': gera no próprio processo logo após o commit;
+# 'comando': apenas marca como pendente, e o 'manage.py gerar_miniaturas' gera.
+MODO_EXECUCAO = getattr(settings, 'MINIATURAS_MODO', 'thread')
+
+LADO_MAXIMO = 320
+QUALIDADE_JPEG = 75
+TAMANHO_BLOCO = 20
+TEMPO_MAXIMO = timedelta(minutes=10)
+SUFIXO = '.mini.jpg'
+
+EXTENSOES_IMAGEM = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff')
+EXTENSOES_PDF = ('.pdf',)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='miniaturas')
+    return _executor
+
+
+def nome_da_miniatura(nome):
+    return os.path.splitext(nome)[0] + SUFIXO
+
+
+def _instalado(modulo):
+    # (Só procura o pacote: o Pillow e o PyMuPDF são importados ao gerar)
+    return importlib.util.find_spec(modulo) is not None
+
+
+def extensoes_suportadas():
+    """ Extensões para as quais as dependências instaladas geram miniaturas. """
+    if not _instalado('PIL'):
+        return ()
+    return EXTENSOES_IMAGEM + (EXTENSOES_PDF if _instalado('pymupdf') else ())
+
+
+def _filtro_extensoes(extensoes):
+    filtro = Q(pk__in=[])
+    for ext in extensoes:
+        filtro |= Q(arquivo__iendswith=ext)
+    return filtro
+
+
+def agendar_miniaturas():
+    """ Pede a geração das miniaturas pendentes depois do commit atual. """
+    if MODO_EXECUCAO == 'thread' and extensoes_suportadas():
+        transaction.on_commit(lambda: _get_executor().submit(_processar_em_thread))
+
+
+def gerar_miniatura(nome, storage=None):
+    """ Retorna os bytes (JPEG) da miniatura do ficheiro 'nome'. """
+    from PIL import Image, ImageOps
+
+    storage = storage or default_storage
+    with storage.open(nome, 'rb') as ficheiro:
+        if nome.lower().endswith(EXTENSOES_PDF):
+            import pymupdf
+            documento = pymupdf.open(stream=ficheiro.read(), filetype='pdf')
+            pagina = documento.load_page(0)
+            escala = LADO_MAXIMO / max(pagina.rect.width, pagina.rect.height)
+            pixmap = pagina.get_pixmap(matrix=pymupdf.Matrix(escala, escala), alpha=False)
+            imagem = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+        else:
+            imagem = Image.open(ficheiro)
+            # (Nos JPEG, descodifica já numa escala reduzida)
+            imagem.draft('RGB', (LADO_MAXIMO, LADO_MAXIMO))
+            imagem = ImageOps.exif_transpose(imagem)
+        imagem.thumbnail((LADO_MAXIMO, LADO_MAXIMO))
+        saida = io.BytesIO()
+        imagem.convert('RGB').save(saida, 'JPEG', quality=QUALIDADE_JPEG, optimize=True)
+    return saida.getvalue()
+
+
+def _gerar_para_anexo(anexo, storage):
+    # (Conteúdo repetido, ver 'common/armazenamento.py': reutiliza a miniatura já gerada)
+    miniatura = AnexoVenda.objects.filter(
+        arquivo=anexo.arquivo.name, miniatura_estado='pronta'
+    ).values_list('miniatura', flat=True).first()
+    estado = 'pronta'
+    if not miniatura:
+        try:
+            dados = gerar_miniatura(anexo.arquivo.name, storage)
+            miniatura = storage.save(nome_da_miniatura(anexo.arquivo.name), ContentFile(dados))
+        except Exception:
+            logger.warning("Não foi possível gerar a miniatura do anexo #%s", anexo.id, exc_info=True)
+            miniatura, estado = '', 'indisponivel'
+    # (Só se o anexo ainda for deste worker: pode ter sido apagado ou reclamado por outro)
+    AnexoVenda.objects.filter(
+        pk=anexo.pk, miniatura_estado='processando', miniatura_inicio=anexo.miniatura_inicio,
+    ).update(miniatura=miniatura, miniatura_estado=estado)
+
+
+def _reclamar_bloco(extensoes):
+    """ Marca um bloco de anexos como 'processando' (e faz commit). Retorna os anexos. """
+    agora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            AnexoVenda.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(miniatura_estado='pendente') |
+                Q(miniatura_estado='processando', miniatura_inicio__lt=agora - TEMPO_MAXIMO)
+            )
+            .filter(_filtro_extensoes(extensoes))
+            .order_by('id')
+            .values_list('id', flat=True)[:TAMANHO_BLOCO]
+        )
+        AnexoVenda.objects.filter(id__in=ids).update(miniatura_estado='processando', miniatura_inicio=agora)
+    return list(AnexoVenda.objects.filter(id__in=ids).order_by('id'))
+
+
+def processar_bloco(storage=None):
+    """ Gera as miniaturas de um bloco de anexos pendentes. Retorna quantos tratou. """
+    storage = storage or default_storage
+    extensoes = extensoes_suportadas()
+    if not extensoes:
+        return 0
+    anexos = _reclamar_bloco(extensoes)
+    for anexo in anexos:
+        _gerar_para_anexo(anexo, storage)
+    return len(anexos)
+
+
+def processar_miniaturas(storage=None):
+    """ Gera todas as miniaturas pendentes. """
+    # (Tipos sem pré-visualização possível, ex.: .docx, deixam de estar pendentes)
+    AnexoVenda.objects.filter(miniatura_estado='pendente').exclude(
+        _filtro_extensoes(EXTENSOES_IMAGEM + EXTENSOES_PDF)
+    ).update(miniatura_estado='indisponivel')
+
+    total = 0
+    while True:
+        tratados = processar_bloco(storage)
+        total += tratados
+        if tratados < TAMANHO_BLOCO:
+            return total
+
+
+def _processar_em_thread():
+    close_old_connections()
+    try:
+        processar_miniaturas()
+    except Exception:
+        logger.exception("Erro ao gerar as miniaturas dos anexos")
+    finally:
+        close_old_connections()
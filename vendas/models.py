@@ -103,6 +103,28 @@ class Venda(models.Model):
     )
     
     # (NÃO adicionamos db_table aqui, pois este modelo não se moveu)
+
+    class Meta:
+        indexes = [
+            # Lista de vendas (paginação por cursor em -data_venda, id)
+            models.Index(fields=['-data_venda', 'id'], name='venda_data_id_idx'),
+            # Lista do vendedor / filtro por vendedor e metas individuais
+            models.Index(fields=['vendedor', '-data_venda', 'id'], name='venda_vendedor_data_idx'),
+            # Filtro por status de pagamento na lista e nos dashboards
+            models.Index(fields=['status_pagamento', '-data_venda', 'id'], name='venda_status_pag_data_idx'),
+            # Progresso de metas e dashboard de comissões (apenas vendas aprovadas)
+            models.Index(
+                fields=['data_venda', 'vendedor'],
+                name='venda_aprovada_data_idx',
+                condition=models.Q(status_pagamento='aprovado'),
+            ),
+            # Fecho de comissões (aprovadas e ainda sem lote)
+            models.Index(
+                fields=['vendedor', 'data_venda'],
+                name='venda_aprov_sem_lote_idx',
+                condition=models.Q(status_pagamento='aprovado', lote_pagamento__isnull=True),
+            ),
+        ]
     
     def __str__(self): 
         return f"Venda #{self.id} - {self.cliente.nome_completo}"
@@ -117,7 +139,22 @@ class AnexoVenda(models.Model):
     tipo = models.CharField(max_length=20, choices=TIPO_ANEXO_CHOICES, default='comprovante')
     arquivo = models.FileField(upload_to=get_anexo_upload_path, verbose_name="Arquivo")
     descricao = models.CharField(max_length=255, blank=True, null=True, verbose_name="Nome Original")
+    # (Ficheiros guardados por conteúdo, ver 'common/armazenamento.py')
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True, editable=False, verbose_name="SHA-256")
     data_upload = models.DateTimeField(auto_now_add=True, verbose_name="Data do Upload")
+
+    # Pré-visualização (imagens e PDFs), gerada em segundo plano por 'vendas/miniaturas.py'
+    MINIATURA_ESTADO_CHOICES = (
+        ('pendente', 'Pendente'),
+        ('processando', 'Em Processamento'),
+        ('pronta', 'Pronta'),
+        ('indisponivel', 'Indisponível'),
+    )
+    miniatura = models.FileField(max_length=150, blank=True, editable=False, verbose_name="Miniatura")
+    miniatura_estado = models.CharField(
+        max_length=12, choices=MINIATURA_ESTADO_CHOICES, default='pendente', db_index=True, editable=False
+    )
+    miniatura_inicio = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Início da Geração da Miniatura")
     
     # (NÃO adicionamos db_table aqui)
     
@@ -126,4 +163,31 @@ class AnexoVenda(models.Model):
         verbose_name_plural = "Anexos da Venda"
     
     def __str__(self): 
-        return f"{self.get_tipo_display()} da Venda #{self.venda.id}"
\ No newline at end of file
+        return f"{self.get_tipo_display()} da Venda #{self.venda.id}"
+
+class VendaResumoDiario(models.Model):
+    """
+    Totais diários de vendas por (dia, vendedor, produto, status_pagamento).
+    Mantido pelos sinais em 'vendas/signals.py' e reconstruído pelo comando
+    'manage.py reconstruir_resumo_vendas'. Os dashboards leem desta tabela
+    sempre que os filtros ativos o permitem (ver 'vendas/resumo.py').
+    """
+    dia = models.DateField(verbose_name="Dia")
+    vendedor = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name="+", verbose_name="Vendedor")
+    produto = models.ForeignKey('common.Produto', on_delete=models.CASCADE, related_name="+", verbose_name="Produto")
+    status_pagamento = models.CharField(max_length=30, choices=Venda.STATUS_PAGAMENTO_CHOICES)
+
+    total_honorarios = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_valor_entrada = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_comissao = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    contagem = models.PositiveIntegerField(default=0, verbose_name="Nº de Vendas")
+    contagem_comissao = models.PositiveIntegerField(default=0, verbose_name="Nº de Vendas com Comissão")
+
+    class Meta:
+        verbose_name = "Resumo Diário de Vendas"
+        verbose_name_plural = "Resumos Diários de Vendas"
+        # (A constraint única também serve de índice para os filtros por dia)
+        unique_together = ('dia', 'vendedor', 'produto', 'status_pagamento')
+
+    def __str__(self):
+        return f"Resumo {self.dia} - {self.vendedor_id}/{self.produto_id} ({self.status_pagamento})"
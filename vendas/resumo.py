@@ -0,0 +1,188 @@
+# Em: vendas/resumo.py
+#
+# Tabela de resumo diário (VendaResumoDiario) usada pelos dashboards.
+# Cada linha guarda os totais de um "bucket" (dia local, vendedor, produto,
+# status_pagamento). Os sinais de Venda recalculam só os buckets afetados,
+# por isso o custo dos dashboards depende do nº de dias e não do nº de vendas.
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Venda, VendaResumoDiario
+
+CAMPOS_TOTAIS = ['total_honorarios', 'total_valor_entrada', 'total_comissao', 'contagem', 'contagem_comissao']
+
+# Filtros de '_get_vendas_filtradas' que o resumo não consegue responder
+FILTROS_NAO_SUPORTADOS = ('cliente', 'status_venda', 'status_contrato')
+
+# Nº máximo de buckets por operação de escrita
+TAMANHO_LOTE_BUCKETS = 500
+
+
+def inicio_do_dia(dia):
+    """ Início do dia no fuso horário local, como datetime 'aware'. """
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def chave_da_venda(venda):
+    """ Chave do bucket (dia local, vendedor_id, produto_id, status_pagamento) de uma venda. """
+    if venda.data_venda is None:
+        return None
+    return (timezone.localdate(venda.data_venda), venda.vendedor_id, venda.produto_id, venda.status_pagamento)
+
+
+def _agregar_por_bucket(vendas):
+    """ Agrupa um queryset de vendas por bucket, com os totais do resumo. """
+    return vendas.annotate(dia=TruncDate('data_venda')).values(
+        'dia', 'vendedor_id', 'produto_id', 'status_pagamento'
+    ).annotate(
+        total_honorarios=Sum('honorarios'),
+        total_valor_entrada=Sum('valor_entrada'),
+        total_comissao=Sum('comissao_calculada_final'),
+        contagem=Count('id'),
+        contagem_comissao=Count('comissao_calculada_final'),
+    ).order_by()
+
+
+def _linha_para_resumo(linha):
+    return VendaResumoDiario(
+        dia=linha['dia'],
+        vendedor_id=linha['vendedor_id'],
+        produto_id=linha['produto_id'],
+        status_pagamento=linha['status_pagamento'],
+        total_honorarios=linha['total_honorarios'] or Decimal(0),
+        total_valor_entrada=linha['total_valor_entrada'] or Decimal(0),
+        total_comissao=linha['total_comissao'] or Decimal(0),
+        contagem=linha['contagem'],
+        contagem_comissao=linha['contagem_comissao'],
+    )
+
+
+def _filtro_das_chaves(chaves):
+    filtro = Q()
+    for dia, vendedor_id, produto_id, status in chaves:
+        filtro |= Q(dia=dia, vendedor_id=vendedor_id, produto_id=produto_id, status_pagamento=status)
+    return filtro
+
+
+@transaction.atomic
+def _recalcular_lote_buckets(chaves):
+    # Os buckets são bloqueados antes de serem recalculados: duas gravações
+    # simultâneas no mesmo bucket esperam uma pela outra e a segunda já vê a
+    # venda da primeira (sem o bloqueio, a última a gravar apagava a outra).
+    # Os que ainda não existem são criados vazios, para haver uma linha a
+    # bloquear; a ordem fixa evita deadlocks entre gravações.
+    chaves = sorted(chaves)
+    VendaResumoDiario.objects.bulk_create(
+        [
+            VendaResumoDiario(dia=dia, vendedor_id=vendedor_id, produto_id=produto_id, status_pagamento=status)
+            for dia, vendedor_id, produto_id, status in chaves
+        ],
+        ignore_conflicts=True,
+    )
+    list(
+        VendaResumoDiario.objects.select_for_update().filter(_filtro_das_chaves(chaves))
+        .order_by('dia', 'vendedor_id', 'produto_id', 'status_pagamento').values_list('pk', flat=True)
+    )
+
+    dias = {chave[0] for chave in chaves}
+    vendas = Venda.objects.filter(
+        data_venda__gte=inicio_do_dia(min(dias)),
+        data_venda__lt=inicio_do_dia(max(dias) + timedelta(days=1)),
+        vendedor_id__in={chave[1] for chave in chaves},
+        produto_id__in={chave[2] for chave in chaves},
+        status_pagamento__in={chave[3] for chave in chaves},
+    )
+    novos = []
+    for linha in _agregar_por_bucket(vendas):
+        chave = (linha['dia'], linha['vendedor_id'], linha['produto_id'], linha['status_pagamento'])
+        if chave in chaves:
+            novos.append(_linha_para_resumo(linha))
+
+    vazias = set(chaves) - {(r.dia, r.vendedor_id, r.produto_id, r.status_pagamento) for r in novos}
+    if novos:
+        VendaResumoDiario.objects.bulk_create(
+            novos,
+            update_conflicts=True,
+            unique_fields=['dia', 'vendedor', 'produto', 'status_pagamento'],
+            update_fields=CAMPOS_TOTAIS,
+        )
+    if vazias:
+        VendaResumoDiario.objects.filter(_filtro_das_chaves(vazias)).delete()
+
+
+def recalcular_buckets(chaves):
+    """ Recalcula (a partir das vendas) apenas os buckets indicados. """
+    chaves = [chave for chave in set(chaves) if chave]
+    for i in range(0, len(chaves), TAMANHO_LOTE_BUCKETS):
+        _recalcular_lote_buckets(set(chaves[i:i + TAMANHO_LOTE_BUCKETS]))
+
+
+def atualizar_resumo_das_vendas(vendas):
+    """
+    Recalcula os buckets de um queryset de vendas.
+    Usar depois de 'update()' / 'bulk_update()', que não disparam sinais.
+    """
+    chaves = [
+        (linha['dia'], linha['vendedor_id'], linha['produto_id'], linha['status_pagamento'])
+        for linha in vendas.annotate(dia=TruncDate('data_venda'))
+                           .values('dia', 'vendedor_id', 'produto_id', 'status_pagamento')
+                           .order_by().distinct()
+    ]
+    recalcular_buckets(chaves)
+
+
+@transaction.atomic
+def reconstruir_resumo(desde=None):
+    """ Apaga e reconstrói o resumo (todo, ou a partir do dia 'desde'). Retorna o nº de buckets. """
+    vendas = Venda.objects.all()
+    resumos = VendaResumoDiario.objects.all()
+    if desde:
+        vendas = vendas.filter(data_venda__gte=inicio_do_dia(desde))
+        resumos = resumos.filter(dia__gte=desde)
+    resumos.delete()
+    novos = [_linha_para_resumo(linha) for linha in _agregar_por_bucket(vendas).iterator(chunk_size=2000)]
+    VendaResumoDiario.objects.bulk_create(novos, batch_size=1000)
+    return len(novos)
+
+
+def get_resumo_filtrado(request, perms):
+    """
+    Equivalente de '_get_vendas_filtradas' sobre o resumo diário.
+    Retorna None quando algum filtro ativo não existe no resumo
+    (cliente, status da venda/contrato), e o dashboard usa as vendas.
+    """
+    if any(request.GET.get(filtro) for filtro in FILTROS_NAO_SUPORTADOS):
+        return None
+
+    query_vendedor = request.GET.get('vendedor', '')
+    query_data_inicio = request.GET.get('data_inicio', '')
+    query_data_fim = request.GET.get('data_fim', '')
+    query_produto = request.GET.get('produto', '')
+    query_status_pagamento = request.GET.get('status_pagamento', '')
+
+    if perms.ve_todas_as_vendas:
+        resumo = VendaResumoDiario.objects.all()
+    else:
+        resumo = VendaResumoDiario.objects.filter(vendedor=request.user)
+
+    if perms.ve_todas_as_vendas and query_vendedor:
+        resumo = resumo.filter(vendedor_id=query_vendedor)
+    # (Datas num formato que o resumo por dia não representa: usa as vendas)
+    try:
+        if query_data_inicio:
+            resumo = resumo.filter(dia__gte=datetime.strptime(query_data_inicio, '%Y-%m-%d').date())
+        if query_data_fim:
+            resumo = resumo.filter(dia__lte=datetime.strptime(query_data_fim, '%Y-%m-%d').date())
+    except ValueError:
+        return None
+    if query_produto:
+        resumo = resumo.filter(produto_id=query_produto)
+    if query_status_pagamento:
+        resumo = resumo.filter(status_pagamento=query_status_pagamento)
+    return resumo
@@ -0,0 +1,45 @@
+# Em: vendas/signals.py
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from common.remocoes import apagar_ficheiros_ao_remover
+
+from .miniaturas import agendar_miniaturas
+from .models import AnexoVenda, Venda
+from .resumo import chave_da_venda, recalcular_buckets
+
+
+@receiver(pre_save, sender=Venda)
+def guardar_chave_resumo_anterior(sender, instance, raw=False, **kwargs):
+    """ Guarda o bucket antigo da venda (dia/vendedor/produto/status podem mudar). """
+    if raw or instance.pk is None:
+        instance._chave_resumo_anterior = None
+        return
+    anterior = Venda.objects.filter(pk=instance.pk).only(
+        'data_venda', 'vendedor_id', 'produto_id', 'status_pagamento'
+    ).first()
+    instance._chave_resumo_anterior = chave_da_venda(anterior) if anterior else None
+
+
+@receiver(post_save, sender=Venda)
+def atualizar_resumo_apos_gravar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    recalcular_buckets([getattr(instance, '_chave_resumo_anterior', None), chave_da_venda(instance)])
+
+
+@receiver(post_delete, sender=Venda)
+def atualizar_resumo_apos_apagar(sender, instance, **kwargs):
+    recalcular_buckets([chave_da_venda(instance)])
+
+
+@receiver(post_save, sender=AnexoVenda)
+def gerar_miniatura_apos_gravar(sender, instance, created, raw=False, **kwargs):
+    """ Anexos gravados um a um (ex.: admin); os 'bulk_create' chamam 'agendar_miniaturas'. """
+    if created and not raw and instance.miniatura_estado == 'pendente':
+        agendar_miniaturas()
+
+
+# Os ficheiros dos anexos (também na cascata de uma Venda) vão para a fila de remoções
+apagar_ficheiros_ao_remover(AnexoVenda)
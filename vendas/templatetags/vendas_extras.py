@@ -1,5 +1,6 @@
 from django import template
 from django.template.defaultfilters import stringfilter
+from common.permissions import get_permissoes
 
 register = template.Library()
 
@@ -32,22 +33,13 @@ def status_to_color(status_value):
 
 @register.simple_tag
 def user_can_create_vendas(user):
-    if not user.is_authenticated: return False
-    if user.is_superuser: return True
-    if user.groups.filter(name__in=['Gestor', 'Vendedor']).exists(): return True
-    return False
+    return get_permissoes(user).pode_criar_vendas
 
 @register.simple_tag
 def user_can_manage_comissoes(user):
-    if not user.is_authenticated: return False
-    if user.is_superuser: return True
-    if user.groups.filter(name__in=['Gestor', 'Financeiro']).exists(): return True
-    return False
+    return get_permissoes(user).pode_gerir_comissoes
 
 @register.simple_tag
 def user_can_manage_metas(user):
     """ Verifica se o user é Admin ou Gestor para gerir metas """
-    if not user.is_authenticated: return False
-    if user.is_superuser: return True
-    if user.groups.filter(name='Gestor').exists(): return True
-    return False
\ No newline at end of file
+    return get_permissoes(user).pode_gerir_metas
\ No newline at end of file
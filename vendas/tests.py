@@ -1,3 +1,498 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from common.armazenamento import ErroArmazenamento
+from common.exportacao import EXPORTACOES, gerar_linhas_csv, gerar_xlsx
+from common.models import Produto
+from common.permissions import Permissoes
+from common.testing import criar_base, criar_lote, criar_utilizador, criar_venda
+
+from comissoes.fechamento import vendas_por_fechar
+
+from .miniaturas import LADO_MAXIMO, TEMPO_MAXIMO, processar_bloco
+from .exportacao import VENDAS_CABECALHO
+from .models import AnexoVenda, Venda, VendaResumoDiario
+from .resumo import CAMPOS_TOTAIS, _agregar_por_bucket, _linha_para_resumo, get_resumo_filtrado
+from .views import _contar_vendas_aproximado, _paginar_vendas
+
+so_postgresql = unittest.skipUnless(connection.vendor == 'postgresql', "Requer PostgreSQL.")
+
+
+class ResumoDiarioTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor, cls.produto, cls.cliente = criar_base()
+
+    def test_buckets_acompanham_as_vendas(self):
+        venda = criar_venda(self.vendedor, self.produto, self.cliente)
+        criar_venda(self.vendedor, self.produto, self.cliente, honorarios=Decimal('50.00'))
+        resumo = VendaResumoDiario.objects.get()
+        self.assertEqual((resumo.contagem, resumo.total_honorarios), (2, Decimal('150.00')))
+
+        venda.status_pagamento = 'aprovado'
+        venda.save()
+        totais = dict(VendaResumoDiario.objects.values_list('status_pagamento', 'contagem'))
+        self.assertEqual(totais, {'pendente': 1, 'aprovado': 1})
+
+        venda.delete()
+        self.assertEqual(list(VendaResumoDiario.objects.values_list('status_pagamento', flat=True)), ['pendente'])
+
+    def assertResumoIgualAsVendas(self):
+        """ O resumo mantido pelos sinais é igual a uma agregação nova das vendas. """
+        def linhas(resumos):
+            return sorted(
+                (r.dia, r.vendedor_id, r.produto_id, r.status_pagamento, *(getattr(r, campo) for campo in CAMPOS_TOTAIS))
+                for r in resumos
+            )
+        novo = [_linha_para_resumo(linha) for linha in _agregar_por_bucket(Venda.objects.all())]
+        self.assertEqual(linhas(VendaResumoDiario.objects.all()), linhas(novo))
+
+    def test_resumo_consistente_ao_criar_editar_e_apagar(self):
+        outro_vendedor, outro_produto = User.objects.create_user('outro', password='x'), Produto.objects.create(
+            nome='Outro', valor=500, tipo_comissao='P', valor_comissao=5,
+        )
+        # (23h30 locais: já é o dia seguinte em UTC)
+        noite = timezone.make_aware(datetime(2025, 1, 6, 23, 30))
+        vendas = [criar_venda(self.vendedor, self.produto, self.cliente) for _ in range(3)]
+        for venda in vendas[:2]:
+            venda.data_venda = noite
+            venda.save()
+        self.assertResumoIgualAsVendas()
+
+        primeira, segunda, terceira = vendas
+        for campo, valor in (
+            ('status_pagamento', 'aprovado'), ('honorarios', Decimal('75.50')),
+            ('comissao_calculada_final', Decimal('7.55')), ('vendedor', outro_vendedor),
+            ('produto', outro_produto), ('data_venda', noite + timedelta(days=1)),
+        ):
+            with self.subTest(campo=campo):
+                setattr(primeira, campo, valor)
+                primeira.save()
+                self.assertResumoIgualAsVendas()
+
+        segunda.delete()
+        self.assertResumoIgualAsVendas()
+        Venda.objects.filter(pk=terceira.pk).delete()
+        self.assertResumoIgualAsVendas()
+        primeira.delete()
+        self.assertFalse(VendaResumoDiario.objects.exists())
+
+    def test_datas_invalidas_usam_as_vendas(self):
+        perms = Permissoes(is_admin=True)
+        for parametros in ({'data_inicio': '31/01/2025'}, {'data_fim': '31/01/2025'}):
+            with self.subTest(parametros=parametros):
+                request = RequestFactory().get('/', parametros)
+                request.user = self.vendedor
+                self.assertIsNone(get_resumo_filtrado(request, perms))
+
+
+class ListaVendasPaginacaoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor, produto, cliente = criar_base()
+        vendas = [criar_venda(cls.vendedor, produto, cliente) for _ in range(7)]
+        # (Várias vendas no mesmo instante: o id desempata)
+        instante = timezone.now() - timedelta(days=1)
+        Venda.objects.filter(pk__in=[v.pk for v in vendas[:4]]).update(data_venda=instante)
+        cls.ordem = list(Venda.objects.order_by('-data_venda', 'id').values_list('pk', flat=True))
+
+    def test_cursor_percorre_todas_as_vendas_uma_vez(self):
+        vistas, cursor = [], None
+        while True:
+            pagina, cursor = _paginar_vendas(Venda.objects.order_by('-data_venda', 'id'), cursor, por_pagina=3)
+            vistas += [venda.pk for venda in pagina]
+            if cursor is None:
+                break
+        self.assertEqual(vistas, self.ordem)
+
+    def test_carregar_mais(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        primeira, cursor = _paginar_vendas(Venda.objects.order_by('-data_venda', 'id'), por_pagina=2)
+        resposta = self.client.get(reverse('lista_vendas_mais'), {'cursor': cursor})
+        self.assertEqual(resposta.json()['quantidade'], 5)
+        self.assertIsNone(resposta.json()['proximo_cursor'])
+
+        # (Cursor inválido: volta à primeira página, sem erro)
+        resposta = self.client.get(reverse('lista_vendas_mais'), {'cursor': 'lixo'})
+        self.assertEqual(resposta.json()['quantidade'], 7)
+
+    def test_contagem_limitada(self):
+        with mock.patch('vendas.views.LIMITE_CONTAGEM_EXATA', 3):
+            self.assertEqual(_contar_vendas_aproximado(Venda.objects.all(), filtrado=True), (3, False))
+        self.assertEqual(_contar_vendas_aproximado(Venda.objects.all(), filtrado=True), (7, True))
+
+
+
+class ExportacaoCsvTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor, produto, cliente = criar_base()
+        cls.vendas = [criar_venda(cls.vendedor, produto, cliente, honorarios=Decimal(valor)) for valor in ('100.00', '250.50')]
+
+    def test_csv_em_streaming(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        resposta = self.client.get(reverse('export_vendas_csv'))
+        self.assertTrue(resposta.streaming)
+        self.assertEqual(resposta['Content-Disposition'], 'attachment; filename="relatorio_vendas.csv"')
+
+        linhas = list(csv.reader(io.StringIO(b''.join(resposta.streaming_content).decode()), delimiter=';'))
+        self.assertEqual(linhas[0], VENDAS_CABECALHO)
+        self.assertEqual(len(linhas), 1 + len(self.vendas))
+        por_id = {int(linha[0]): linha for linha in linhas[1:]}
+        venda = self.vendas[1]
+        self.assertEqual(por_id[venda.pk][1:7], [
+            venda.data_venda.strftime('%Y-%m-%d %H:%M'), 'vendedor', 'Cliente',
+            '00000000000', 'Produto', '250.50',
+        ])
+        self.assertEqual(por_id[venda.pk][12], venda.get_status_venda_display())
+
+
+@so_postgresql
+class ResumoDiarioConcorrenciaTests(TransactionTestCase):
+
+    def test_gravacoes_simultaneas_no_mesmo_bucket(self):
+        vendedor, produto, cliente = criar_base()
+        gravada = threading.Event()
+        erros = []
+
+        def primeira():
+            try:
+                with transaction.atomic():
+                    criar_venda(vendedor, produto, cliente)
+                    gravada.set()
+                    # (A segunda gravação começa enquanto esta ainda não fez commit)
+                    time.sleep(0.5)
+            except Exception as exc:
+                erros.append(exc)
+                gravada.set()
+            finally:
+                connection.close()
+
+        def segunda():
+            try:
+                gravada.wait()
+                with transaction.atomic():
+                    criar_venda(vendedor, produto, cliente)
+            except Exception as exc:
+                erros.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=primeira), threading.Thread(target=segunda)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(erros, [])
+        resumo = VendaResumoDiario.objects.get(dia=timezone.localdate())
+        self.assertEqual((resumo.contagem, resumo.total_honorarios), (2, Decimal('200.00')))
+
+
+
+class DetalheVendaAnexosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor, produto, cliente = criar_base()
+        cls.vendas = {}
+        for quantidade in (1, 10):
+            venda = criar_venda(cls.vendedor, produto, cliente)
+            AnexoVenda.objects.bulk_create([
+                AnexoVenda(venda=venda, tipo=tipo, arquivo=f'vendas/testes/{tipo}_{i}.pdf')
+                for tipo in ('comprovante', 'contrato', 'nota_fiscal') for i in range(quantidade)
+            ])
+            cls.vendas[quantidade] = venda
+
+    def detalhe(self, quantidade):
+        resposta = self.client.get(reverse('detalhe_venda', args=[self.vendas[quantidade].pk]))
+        self.assertEqual(resposta.status_code, 200)
+        return resposta
+
+    def test_anexos_carregados_uma_vez_e_sem_urls_assinados(self):
+        self.client.force_login(self.vendedor)
+        # (O primeiro pedido preenche a cache de permissões)
+        self.detalhe(1)
+        storage = AnexoVenda._meta.get_field('arquivo').storage
+        with mock.patch.object(storage, 'url', side_effect=AssertionError("URL gerado ao mostrar a venda")):
+            with CaptureQueriesContext(connection) as poucas:
+                self.detalhe(1)
+            with self.assertNumQueries(len(poucas)):
+                resposta = self.detalhe(10)
+        self.assertEqual(
+            [len(resposta.context[nome]) for nome in ('anexos_comprovante', 'anexos_contrato', 'anexos_nota_fiscal')],
+            [10, 10, 10],
+        )
+
+    def test_abrir_anexo_respeita_a_visibilidade(self):
+        anexo = self.vendas[1].anexos.first()
+        storage = AnexoVenda._meta.get_field('arquivo').storage
+        self.client.force_login(criar_utilizador('outro'))
+        self.assertEqual(self.client.get(reverse('abrir_anexo', args=[anexo.pk])).status_code, 403)
+
+        self.client.force_login(self.vendedor)
+        with mock.patch.object(storage, 'url', return_value='https://s3.exemplo/assinado') as url:
+            resposta = self.client.get(reverse('abrir_anexo', args=[anexo.pk]))
+        self.assertRedirects(resposta, 'https://s3.exemplo/assinado', fetch_redirect_response=False)
+        url.assert_called_once_with(anexo.arquivo.name)
+
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class EnvioAnexosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.venda = criar_venda(*criar_base())
+        cls.admin = User.objects.create_superuser('admin', password='x')
+
+    def enviar(self, *conteudos):
+        self.client.force_login(self.admin)
+        ficheiros = [SimpleUploadedFile(f'comprovante_{i}.pdf', conteudo) for i, conteudo in enumerate(conteudos)]
+        return self.client.post(
+            reverse('detalhe_venda', args=[self.venda.pk]), {'acao': 'add_comprovante', 'arquivos': ficheiros},
+        )
+
+    def test_varios_ficheiros_num_pedido(self):
+        self.enviar(b'um', b'dois', b'tres')
+        anexos = self.venda.anexos.order_by('descricao')
+        self.assertEqual(
+            [a.descricao for a in anexos], ['comprovante_0.pdf', 'comprovante_1.pdf', 'comprovante_2.pdf'],
+        )
+        self.assertTrue(all(default_storage.exists(a.arquivo.name) for a in anexos))
+        self.venda.refresh_from_db()
+        self.assertEqual(self.venda.status_pagamento, 'aguardando_validacao')
+
+    def test_falha_no_envio_nao_grava_nada(self):
+        with mock.patch('common.armazenamento.guardar_em_paralelo', side_effect=ErroArmazenamento("S3 indisponível")):
+            resposta = self.enviar(b'um', b'dois')
+        self.assertFalse(self.venda.anexos.exists())
+        mensagens = [str(m) for m in get_messages(resposta.wsgi_request)]
+        self.assertEqual(mensagens, ["Nenhum ficheiro foi guardado. S3 indisponível"])
+        self.venda.refresh_from_db()
+        self.assertEqual(self.venda.status_pagamento, 'pendente')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class MiniaturasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.venda = criar_venda(*criar_base())
+
+    def criar_anexo(self, nome, conteudo, **campos):
+        nome = default_storage.save(f'vendas/testes/{nome}', ContentFile(conteudo))
+        return AnexoVenda.objects.create(venda=self.venda, arquivo=nome, **campos)
+
+    def assertMiniaturaJpeg(self, anexo):
+        from PIL import Image
+
+        anexo.refresh_from_db()
+        self.assertEqual(anexo.miniatura_estado, 'pronta')
+        with default_storage.open(anexo.miniatura.name, 'rb') as ficheiro:
+            imagem = Image.open(ficheiro)
+            self.assertEqual(imagem.format, 'JPEG')
+            self.assertLessEqual(max(imagem.size), LADO_MAXIMO)
+
+    @unittest.skipUnless(importlib.util.find_spec('PIL'), "Requer o Pillow.")
+    def test_miniatura_de_imagem(self):
+        from PIL import Image
+
+        saida = io.BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(saida, 'PNG')
+        anexo = self.criar_anexo('foto.png', saida.getvalue())
+        self.assertEqual(processar_bloco(), 1)
+        self.assertMiniaturaJpeg(anexo)
+
+    @unittest.skipUnless(importlib.util.find_spec('PIL') and importlib.util.find_spec('pymupdf'), "Requer o Pillow e o PyMuPDF.")
+    def test_miniatura_de_pdf(self):
+        import pymupdf
+
+        documento = pymupdf.open()
+        documento.new_page(width=595, height=842).insert_text((72, 72), "Comprovante")
+        anexo = self.criar_anexo('comprovante.pdf', documento.tobytes())
+        self.assertEqual(processar_bloco(), 1)
+        self.assertMiniaturaJpeg(anexo)
+
+    @unittest.skipUnless(importlib.util.find_spec('PIL'), "Requer o Pillow.")
+    def test_so_reclama_anexos_em_processamento_ha_muito_tempo(self):
+        recente = self.criar_anexo('a.png', b'', miniatura_estado='processando', miniatura_inicio=timezone.now())
+        parado = self.criar_anexo(
+            'b.png', b'nao e uma imagem', miniatura_estado='processando',
+            miniatura_inicio=timezone.now() - TEMPO_MAXIMO - timedelta(minutes=1),
+        )
+        with self.assertLogs('vendas.miniaturas', 'WARNING'):
+            self.assertEqual(processar_bloco(), 1)
+        recente.refresh_from_db()
+        parado.refresh_from_db()
+        self.assertEqual((recente.miniatura_estado, parado.miniatura_estado), ('processando', 'indisponivel'))
+
+
+class UploadDiretoViewsTests(TestCase):
+
+    def test_pedido_mal_formado_responde_400(self):
+        vendedor, produto, cliente = criar_base()
+        venda = criar_venda(vendedor, produto, cliente)
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        url = reverse('anexo_upload_confirmar', args=[venda.pk])
+        for corpo in ('[1, 2]', '"texto"', json.dumps({'tipo': ['contrato']}), json.dumps({'tipo': 'contrato', 'tokens': 'x'})):
+            with self.subTest(corpo=corpo):
+                resposta = self.client.post(url, corpo, content_type='application/json')
+                self.assertEqual(resposta.status_code, 400)
+
+
+@so_postgresql
+class IndicesVendaTests(TestCase):
+    """ Os filtros mais usados das vendas continuam a usar os índices (EXPLAIN). """
+
+    @classmethod
+    def setUpTestData(cls):
+        vendedor, produto, cliente = criar_base()
+        vendedores = [vendedor] + [User.objects.create_user(f'vendedor{i}', password='x') for i in range(1, 10)]
+        Venda.objects.bulk_create([
+            Venda(
+                vendedor=vendedores[i % len(vendedores)], produto=produto, cliente=cliente, honorarios=Decimal('100.00'),
+                status_pagamento='cancelado' if i % 20 == 0 else 'pendente' if i % 10 == 1 else 'aprovado',
+            )
+            for i in range(3000)
+        ])
+        cls.vendedor = vendedor
+        lote = criar_lote(vendedor, vendedor)
+        with connection.cursor() as cursor:
+            # (Uma venda por hora, para trás; as aprovadas há mais de 30 dias já estão num lote)
+            cursor.execute("UPDATE vendas_venda SET data_venda = now() - id * interval '1 hour'")
+            cursor.execute(
+                "UPDATE vendas_venda SET lote_pagamento_id = %s "
+                "WHERE status_pagamento = 'aprovado' AND data_venda < now() - interval '30 days'", [lote.pk]
+            )
+            cursor.execute('ANALYZE vendas_venda')
+
+    def assertUsaIndice(self, queryset, indice):
+        plano = queryset.explain()
+        self.assertIn(indice, plano, plano)
+        return plano
+
+    def test_lista_de_vendas(self):
+        # (A mesma ordem de 'filtrar_vendas', ver 'vendas/filtros.py')
+        for queryset, indice in (
+            (Venda.objects.all(), 'venda_data_id_idx'),
+            (Venda.objects.filter(vendedor=self.vendedor), 'venda_vendedor_data_idx'),
+            (Venda.objects.filter(status_pagamento='cancelado'), 'venda_status_pag_data_idx'),
+        ):
+            with self.subTest(indice=indice):
+                plano = self.assertUsaIndice(queryset.order_by('-data_venda', 'id')[:25], indice)
+                # (A ordem vem do índice: sem ordenar a tabela)
+                self.assertNotIn('Sort', plano)
+
+    def test_vendas_aprovadas(self):
+        inicio = timezone.now() - timedelta(days=7)
+        self.assertUsaIndice(
+            Venda.objects.filter(status_pagamento='aprovado', data_venda__gte=inicio).values('vendedor'),
+            'venda_aprovada_data_idx',
+        )
+        self.assertUsaIndice(
+            vendas_por_fechar(inicio, timezone.now(), self.vendedor.pk), 'venda_aprov_sem_lote_idx',
+        )
+
+    def test_pesquisa_de_cliente_por_nome(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                self.skipTest("Extensão pg_trgm indisponível.")
+            # (Poucos clientes: o planner preferiria ler a tabela toda)
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertUsaIndice(Venda.objects.filter(cliente__nome_completo__icontains='silva'), 'cliente_nome_trgm_idx')
+
+
+def medir_exportacao(formato, linhas):
+    """
+    Corre num processo novo (ver ExportacaoMemoriaTests), com uma base de
+    dados SQLite em ficheiro: cria 'linhas' vendas com um INSERT ... SELECT
+    (sem objetos em memória), exporta-as e escreve quanto cresceu o pico de
+    memória do processo (ru_maxrss, em KB), incluindo os buffers em C.
+    """
+    import resource
+
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0)
+    criar_venda(*criar_base())
+    colunas = ', '.join(
+        connection.ops.quote_name(campo.column) for campo in Venda._meta.concrete_fields if not campo.primary_key
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH RECURSIVE n(i) AS (SELECT 2 UNION ALL SELECT i + 1 FROM n WHERE i < %s) "
+            f"INSERT INTO vendas_venda ({colunas}) SELECT {colunas} FROM vendas_venda, n", [linhas]
+        )
+
+    definicao = EXPORTACOES['vendas']
+
+    def exportar(vendas):
+        if formato == 'csv':
+            for _ in gerar_linhas_csv(definicao.cabecalho_csv, definicao.linhas_csv(vendas)):
+                pass
+        else:
+            with tempfile.TemporaryFile() as ficheiro:
+                gerar_xlsx(ficheiro, definicao.titulo_xlsx, definicao.cabecalho_xlsx, definicao.linhas_xlsx(vendas))
+
+    # (A primeira exportação carrega módulos e caches: não conta)
+    exportar(Venda.objects.order_by('id')[:100])
+    antes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    exportar(Venda.objects.order_by('id'))
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - antes)
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), "ru_maxrss em KB só no Linux.")
+class ExportacaoMemoriaTests(SimpleTestCase):
+    """ A memória das exportações não cresce com o nº de linhas (ru_maxrss de um processo novo). """
+
+    LINHAS = 5000
+    # (Com 10x mais linhas o pico pode subir pouco; a exportação de 50 000
+    # vendas carregadas numa lista sobe mais de 40 MB)
+    MARGEM_KB = 10 * 1024
+
+    def crescimento(self, formato, linhas):
+        with tempfile.TemporaryDirectory() as pasta:
+            ambiente = {**os.environ, 'DATABASE_URL': f"sqlite:///{pasta}/memoria.sqlite3"}
+            processo = subprocess.run(
+                [sys.executable, '-c', 'import sys, django; django.setup(); from vendas.tests import medir_exportacao; '
+                                       'medir_exportacao(sys.argv[1], int(sys.argv[2]))', formato, str(linhas)],
+                cwd=settings.BASE_DIR, env=ambiente, capture_output=True, text=True,
+            )
+        self.assertEqual(processo.returncode, 0, processo.stderr)
+        return int(processo.stdout.split()[-1])
+
+    def test_pico_de_memoria_nao_cresce_com_as_linhas(self):
+        for formato in ('csv', 'xlsx'):
+            with self.subTest(formato=formato):
+                referencia = self.crescimento(formato, self.LINHAS)
+                pico = self.crescimento(formato, self.LINHAS * 10)
+                self.assertLess(pico, referencia + self.MARGEM_KB, (referencia, pico))
@@ -10,6 +10,7 @@ urlpatterns = [
     # --- Abas Principais (Vendas) ---
     path('', views.dashboard_graficos, name='dashboard'),
     path('vendas/', views.lista_vendas, name='lista_vendas'),
+    path('vendas/mais/', views.lista_vendas_mais, name='lista_vendas_mais'),
     path('venda/nova/', views.nova_venda, name='nova_venda'),
     path('venda/<int:venda_id>/', views.detalhe_venda, name='detalhe_venda'),
     
@@ -18,5 +19,9 @@ urlpatterns = [
     path('vendas/export/xlsx/', views.export_vendas_xlsx, name='export_vendas_xlsx'),
     
     # --- API (Apenas de Vendas) ---
+    path('venda/<int:venda_id>/anexos/upload/preparar/', views.anexo_upload_preparar, name='anexo_upload_preparar'),
+    path('venda/<int:venda_id>/anexos/upload/confirmar/', views.anexo_upload_confirmar, name='anexo_upload_confirmar'),
+    path('anexo/<int:anexo_id>/abrir/', views.abrir_anexo, name='abrir_anexo'),
+    path('anexo/<int:anexo_id>/miniatura/', views.miniatura_anexo, name='miniatura_anexo'),
     path('anexo/<int:anexo_id>/delete/', views.delete_anexo, name='delete_anexo'),
 ]
\ No newline at end of file
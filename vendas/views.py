@@ -3,7 +3,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages 
-from django.db import transaction 
+from django.db import transaction, connection
 from django.http import JsonResponse, HttpResponseForbidden, HttpResponse
 from django.db.models import Q, Sum, Avg, Count
 from django.db.models.functions import TruncMonth
@@ -15,22 +15,25 @@ from django.contrib.auth.models import User
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.utils.cache import patch_cache_control
+from django.core.exceptions import PermissionDenied
 from django.http import HttpResponse
 from django.conf import settings
-import sys
+from django.template.loader import render_to_string
 
-import json, csv, openpyxl
-from openpyxl.utils import get_column_letter
+import json, base64
 from datetime import datetime, timedelta
 from decimal import Decimal
-from functools import wraps
 
 # --- (ATUALIZADO) Imports dos Modelos ---
-from .models import Venda, AnexoVenda
+from .models import Venda, AnexoVenda, get_anexo_upload_path
+from .resumo import get_resumo_filtrado
+from .filtros import filtrar_vendas
+from .exportacao import VENDAS_CABECALHO, linhas_vendas_csv, linhas_vendas_xlsx
+from .miniaturas import agendar_miniaturas
 from common.models import Cliente, Produto
-from comissoes.models import (
-    RegraComissaoVendedor, MetaVenda
-)
+from comissoes.calculo import calcular_comissao
 
 # --- (ATUALIZADO) Imports dos Forms ---
 from .forms import (
@@ -40,6 +43,14 @@ from .forms import (
     VendaEditForm
 )
 from common.forms import ClienteForm, ClienteEditForm
+from common.permissions import get_permissoes
+from common.exportacao import resposta_csv_streaming, resposta_xlsx_streaming
+from common.exportacao_tarefas import pedido_assincrono, resposta_exportacao_assincrona
+from common.armazenamento import ErroArmazenamento, apagar_novos, guardar_por_conteudo
+from common.uploads_diretos import (
+    ErroUploadDireto, confirmar_uploads, ler_pedido_json, preparar_uploads, suporta_upload_direto
+)
+from comissoes.metas import get_metas_ativas_visiveis, get_progresso_metas
 # (Forms de comissões e metas foram removidos)
 
 
@@ -50,100 +61,86 @@ from common.forms import ClienteForm, ClienteEditForm
 # (Estas funções helper permanecem aqui, pois são a "base" da lógica de negócio)
 
 def _get_user_permissions(user):
-    """ Verifica os grupos do utilizador e retorna um dicionário de flags. """
-    return {
-        'is_admin': user.is_superuser,
-        'is_gestor': user.groups.filter(name='Gestor').exists(),
-        'is_financeiro': user.groups.filter(name='Financeiro').exists(),
-        'is_advogado': user.groups.filter(name='Advogado').exists(),
-        'is_vendedor': user.groups.filter(name='Vendedor').exists(),
-    }
-
-def gestor_ou_admin_required(view_func):
-    """ Decorator para as views de Gestão de Metas (movido para comissoes.views) """
-    # (Este decorator foi movido para 'comissoes/views.py')
-    # (Pode ser apagado daqui se não for mais usado em 'vendas')
-    # *Vou deixá-lo aqui por segurança, caso o movamos de volta*
-    @wraps(view_func)
-    def _wrapped_view(request, *args, **kwargs):
-        perms = _get_user_permissions(request.user)
-        if not (perms['is_admin'] or perms['is_gestor']):
-            messages.error(request, "Você não tem permissão para aceder a esta página.")
-            return redirect('dashboard')
-        return view_func(request, *args, **kwargs)
-    return _wrapped_view
+    """
+    Retorna as flags de perfil do utilizador (objeto Permissoes imutável).
+    Os grupos são lidos uma vez por request (e ficam em cache por user id),
+    ver 'common/permissions.py'.
+    """
+    return get_permissoes(user)
 
 def _calcular_e_salvar_comissao(venda):
     """
     Executa a cascata de lógica de cálculo de comissão.
-    (Agora importa 'RegraComissaoVendedor' de 'comissoes.models')
+    (A regra está em 'comissoes/calculo.py', partilhada com o recálculo em massa)
     """
-    if venda.comissao_personalizada_valor is not None:
-        venda.comissao_calculada_final = venda.comissao_personalizada_valor
-        venda.save()
-        return
-
-    regra = RegraComissaoVendedor.objects.filter(vendedor=venda.vendedor, produto=venda.produto).first()
-    if regra:
-        if regra.tipo_comissao == 'F':
-            venda.comissao_calculada_final = regra.valor_comissao
-        else:
-            venda.comissao_calculada_final = venda.honorarios * (regra.valor_comissao / Decimal(100))
-        venda.save()
-        return
-
-    produto = venda.produto
-    if produto.tipo_comissao == 'F':
-        venda.comissao_calculada_final = produto.valor_comissao
-    else:
-        venda.comissao_calculada_final = venda.honorarios * (produto.valor_comissao / Decimal(100))
-    venda.save()
-    return
+    venda.comissao_calculada_final = calcular_comissao(venda)
+    venda.save(update_fields=['comissao_calculada_final'])
 
 def _get_vendas_filtradas(request):
     """
     Função auxiliar que lê os filtros do request (GET) e retorna
     o queryset de Vendas já filtrado e com as permissões corretas.
-    (Sem alterações de lógica, apenas de imports)
+    (A lógica está em 'vendas/filtros.py', para ser usada também fora de um request)
     """
-    perms = _get_user_permissions(request.user)
-    
-    query_cliente = request.GET.get('cliente', '')
-    query_vendedor = request.GET.get('vendedor', '')
-    query_data_inicio = request.GET.get('data_inicio', '')
-    query_data_fim = request.GET.get('data_fim', '')
-    query_produto = request.GET.get('produto', '')
-    query_status_venda = request.GET.get('status_venda', '')
-    query_status_pagamento = request.GET.get('status_pagamento', '')
-    query_status_contrato = request.GET.get('status_contrato', '')
+    return filtrar_vendas(request.user, request.GET)
 
-    if perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro'] or perms['is_advogado']:
-        vendas = Venda.objects.all()
-    else: 
-        vendas = Venda.objects.filter(vendedor=request.user)
-
-    if query_cliente:
-        vendas = vendas.filter(cliente__nome_completo__icontains=query_cliente)
-    if (perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro'] or perms['is_advogado']) and query_vendedor:
-        vendas = vendas.filter(vendedor_id=query_vendedor)
-    if query_data_inicio:
-        vendas = vendas.filter(data_venda__gte=query_data_inicio)
-    if query_data_fim:
-        try:
-            data_fim_plus_one = datetime.strptime(query_data_fim, '%Y-%m-%d').date() + timedelta(days=1)
-            vendas = vendas.filter(data_venda__lt=data_fim_plus_one)
-        except (ValueError, TypeError): 
-            pass
-    if query_produto:
-        vendas = vendas.filter(produto_id=query_produto)
-    if query_status_venda:
-        vendas = vendas.filter(status_venda=query_status_venda)
-    if query_status_pagamento:
-        vendas = vendas.filter(status_pagamento=query_status_pagamento)
-    if query_status_contrato:
-        vendas = vendas.filter(status_contrato=query_status_contrato)
-        
-    return vendas.select_related('cliente', 'produto', 'vendedor').order_by('-data_venda')
+# --- Paginação por cursor (keyset) da lista de vendas ---
+
+VENDAS_POR_PAGINA = 50
+LIMITE_CONTAGEM_EXATA = 10000
+# (Segundos que o browser guarda o redirect de uma miniatura)
+MINIATURA_REDIRECT_MAX_AGE = 10 * 60
+
+def _codificar_cursor(venda):
+    """ Gera o cursor opaco (data_venda + id) da última venda de uma página. """
+    bruto = f"{venda.data_venda.isoformat()}|{venda.id}"
+    return base64.urlsafe_b64encode(bruto.encode()).decode()
+
+def _decodificar_cursor(cursor):
+    """ Devolve (data_venda, id) do cursor, ou None se for inválido. """
+    try:
+        bruto = base64.urlsafe_b64decode(cursor.encode()).decode()
+        data_str, id_str = bruto.rsplit('|', 1)
+        return datetime.fromisoformat(data_str), int(id_str)
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+def _paginar_vendas(vendas, cursor=None, por_pagina=VENDAS_POR_PAGINA):
+    """
+    Paginação por cursor sobre a ordenação (-data_venda, id).
+    Em vez de OFFSET, filtra a partir da última venda já mostrada, por isso
+    o custo de cada página não depende do número total de vendas.
+    Retorna (lista_de_vendas, proximo_cursor).
+    """
+    posicao = _decodificar_cursor(cursor) if cursor else None
+    if posicao:
+        data_venda, venda_id = posicao
+        vendas = vendas.filter(
+            Q(data_venda__lt=data_venda) | Q(data_venda=data_venda, id__gt=venda_id)
+        )
+    pagina = list(vendas[:por_pagina + 1])
+    proximo_cursor = None
+    if len(pagina) > por_pagina:
+        pagina = pagina[:por_pagina]
+        proximo_cursor = _codificar_cursor(pagina[-1])
+    return pagina, proximo_cursor
+
+def _contar_vendas_aproximado(vendas, filtrado):
+    """
+    Contagem aproximada para a lista de vendas. Retorna (total, exato).
+    - Sem filtros no PostgreSQL: usa a estimativa do planner (pg_class.reltuples), sem varrer a tabela.
+    - Com filtros: conta no máximo LIMITE_CONTAGEM_EXATA linhas.
+    """
+    if not filtrado and connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [Venda._meta.db_table])
+            linha = cursor.fetchone()
+        if linha and linha[0] > LIMITE_CONTAGEM_EXATA:
+            return linha[0], False
+    total = vendas.order_by()[:LIMITE_CONTAGEM_EXATA + 1].count()
+    if total > LIMITE_CONTAGEM_EXATA:
+        return LIMITE_CONTAGEM_EXATA, False
+    return total, True
 
 # ---
 # SEÇÃO 2: VIEWS DE AUTENTICAÇÃO
@@ -188,18 +185,32 @@ def dashboard_graficos(request):
     default_start_str = (today_date - timedelta(days=30)).strftime('%Y-%m-%d')
     default_end_str = today_date.strftime('%Y-%m-%d')
     
-    vendas_filtradas = _get_vendas_filtradas(request)
+    # Usa o resumo diário sempre que os filtros ativos o permitem (ver 'vendas/resumo.py')
+    resumo = get_resumo_filtrado(request, perms)
+    if resumo is not None:
+        kpis = resumo.aggregate(
+            total_vendas=Sum('total_honorarios'),
+            contagem_vendas=Sum('contagem')
+        )
+        if kpis['contagem_vendas']:
+            kpis['ticket_medio'] = kpis['total_vendas'] / kpis['contagem_vendas']
+
+        vendas_por_vendedor = resumo.values('vendedor__username').annotate(total=Sum('total_honorarios')).order_by('-total')
+        vendas_por_produto = resumo.values('produto__nome').annotate(total=Sum('total_honorarios')).order_by('-total')
+        vendas_por_mes = resumo.annotate(mes=TruncMonth('dia')).values('mes').annotate(total=Sum('total_honorarios')).order_by('mes')
+    else:
+        vendas_filtradas = _get_vendas_filtradas(request)
+            
+        kpis = vendas_filtradas.aggregate(
+            total_vendas=Sum('honorarios'),
+            ticket_medio=Avg('honorarios'),
+            contagem_vendas=Count('id')
+        )
         
-    kpis = vendas_filtradas.aggregate(
-        total_vendas=Sum('honorarios'),
-        ticket_medio=Avg('honorarios'),
-        contagem_vendas=Count('id')
-    )
-    
-    # Dados para Gráficos (Querysets)
-    vendas_por_vendedor = vendas_filtradas.values('vendedor__username').annotate(total=Sum('honorarios')).order_by('-total')
-    vendas_por_produto = vendas_filtradas.values('produto__nome').annotate(total=Sum('honorarios')).order_by('-total')
-    vendas_por_mes = vendas_filtradas.annotate(mes=TruncMonth('data_venda')).values('mes').annotate(total=Sum('honorarios')).order_by('mes')
+        # Dados para Gráficos (Querysets)
+        vendas_por_vendedor = vendas_filtradas.values('vendedor__username').annotate(total=Sum('honorarios')).order_by('-total')
+        vendas_por_produto = vendas_filtradas.values('produto__nome').annotate(total=Sum('honorarios')).order_by('-total')
+        vendas_por_mes = vendas_filtradas.annotate(mes=TruncMonth('data_venda')).values('mes').annotate(total=Sum('honorarios')).order_by('mes')
                            
     vendas_por_vendedor_payload = [{'vendedor__username': v['vendedor__username'], 'total': float(v['total'] or 0)} for v in vendas_por_vendedor]
     vendas_por_produto_payload = [{'produto__nome': p['produto__nome'], 'total': float(p['total'] or 0)} for p in vendas_por_produto]
@@ -207,59 +218,9 @@ def dashboard_graficos(request):
     data_linha = [float(v['total'] or 0) for v in vendas_por_mes]
     
     # --- LÓGICA DE METAS ---
-    grupos_do_utilizador = request.user.groups.all()
-    
-    if perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro'] or perms['is_advogado']:
-        # Admin/Gestor vê TODAS as metas ativas
-        metas_ativas_hoje = MetaVenda.objects.filter(
-            data_inicio__lte=today_date,
-            data_fim__gte=today_date
-        ).select_related('vendedor', 'grupo').order_by('grupo', 'vendedor')
-    else:
-        # Vendedor vê as suas + Gerais + Equipas
-        filtro_metas_visiveis = Q(vendedor=request.user) | Q(vendedor__isnull=True, grupo__isnull=True) | Q(grupo__in=grupos_do_utilizador)
-        metas_ativas_hoje = MetaVenda.objects.filter(
-            filtro_metas_visiveis,
-            data_inicio__lte=today_date,
-            data_fim__gte=today_date
-        ).select_related('vendedor', 'grupo').order_by('grupo', 'vendedor')
-
-    # 2. Prepara os dados de progresso (O resto da lógica permanece 100% igual)
-    meta_data_list = []
-    
-    for meta in metas_ativas_hoje:
-        if meta.vendedor:
-            filtro_vendas_meta = Q(vendedor=meta.vendedor)
-            vendedor_nome = meta.vendedor.get_full_name() or meta.vendedor.username
-            titulo = f"Meta Individual ({vendedor_nome})"
-        elif meta.grupo:
-            filtro_vendas_meta = Q(vendedor__groups=meta.grupo)
-            titulo = f"Meta Equipa ({meta.grupo.name})"
-        else:
-            filtro_vendas_meta = Q() 
-            titulo = "Meta Geral da Empresa"
-        
-        try:
-            data_fim_para_query = meta.data_fim + timedelta(days=1)
-        except TypeError:
-            data_fim_para_query = meta.data_fim 
-
-        progresso = Venda.objects.filter(
-            filtro_vendas_meta,
-            data_venda__gte=meta.data_inicio,
-            data_venda__lt=data_fim_para_query, 
-            status_pagamento='aprovado'
-        ).aggregate(total=Sum('valor_entrada'))['total'] or 0
-
-        percentual = int((progresso / meta.valor_meta) * 100) if meta.valor_meta > 0 else 0
-
-        meta_data_list.append({
-            'meta_titulo': titulo,
-            'meta_periodo': f"{meta.data_inicio.strftime('%d/%m')} - {meta.data_fim.strftime('%d/%m')}",
-            'meta_valor': meta.valor_meta,
-            'meta_progresso': progresso,
-            'meta_percentual': percentual
-        })
+    # (Progresso de todas as metas visíveis calculado numa única query, ver 'comissoes/metas.py')
+    metas_ativas_hoje = get_metas_ativas_visiveis(request.user, perms, today_date)
+    meta_data_list = get_progresso_metas(metas_ativas_hoje)
     # --- FIM LÓGICA DE METAS ---
     
     todos_vendedores = User.objects.filter(is_superuser=False, is_active=True).order_by('username')
@@ -292,11 +253,24 @@ def lista_vendas(request):
     """ Aba 2: Lista de Vendas """
     perms = _get_user_permissions(request.user)
     vendas_filtradas = _get_vendas_filtradas(request)
+    vendas, proximo_cursor = _paginar_vendas(vendas_filtradas, request.GET.get('cursor'))
+
+    # Vendedores só veem as suas vendas: a base já vem filtrada, por isso conta como filtro
+    ve_todas = perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro'] or perms['is_advogado']
+    filtros_ativos = any(v for k, v in request.GET.items() if k != 'cursor')
+    total_vendas, total_exato = _contar_vendas_aproximado(vendas_filtradas, filtros_ativos or not ve_todas)
+
+    params_filtro = request.GET.copy()
+    params_filtro.pop('cursor', None)
     
     todos_vendedores = User.objects.filter(is_superuser=False, is_active=True).order_by('username')
     todos_produtos = Produto.objects.all().order_by('nome') # (Importa Produto de 'common.models')
     context = {
-        'vendas': vendas_filtradas, 
+        'vendas': vendas, 
+        'proximo_cursor': proximo_cursor,
+        'params_filtro': params_filtro.urlencode(),
+        'total_vendas': total_vendas,
+        'total_exato': total_exato,
         'perms': perms,
         'todos_vendedores': todos_vendedores, 
         'todos_produtos': todos_produtos,
@@ -306,6 +280,17 @@ def lista_vendas(request):
     }
     return render(request, 'vendas/lista_vendas.html', context)
 
+@login_required
+def lista_vendas_mais(request):
+    """ API (JSON): Próxima página da lista de vendas ("Carregar mais") """
+    vendas, proximo_cursor = _paginar_vendas(_get_vendas_filtradas(request), request.GET.get('cursor'))
+    html = render_to_string('vendas/_linhas_vendas.html', {'vendas': vendas}, request=request)
+    return JsonResponse({
+        'html': html,
+        'quantidade': len(vendas),
+        'proximo_cursor': proximo_cursor,
+    })
+
 @login_required
 @transaction.atomic 
 def nova_venda(request):
@@ -324,20 +309,22 @@ def nova_venda(request):
             cliente_form = ClienteForm(request.POST)
         
         if cliente_form.is_valid() and venda_form.is_valid() and anexo_form.is_valid():
-            cliente = cliente_form.save()
-            venda = venda_form.save(commit=False)
-            venda.cliente = cliente 
-            venda.vendedor = request.user
-            venda.save() 
-            
-            ficheiros_enviados = request.FILES.getlist('arquivo') 
-            if ficheiros_enviados:
-                for f in ficheiros_enviados:
-                    AnexoVenda.objects.create(venda=venda, tipo='comprovante', arquivo=f, descricao=f.name)
-                if venda.status_pagamento == 'pendente':
-                    venda.status_pagamento = 'aguardando_validacao'
-                    venda.save()
-            return redirect('dashboard')
+            try:
+                # (Se o envio dos anexos falhar, a venda e o cliente são desfeitos)
+                with transaction.atomic():
+                    cliente = cliente_form.save()
+                    venda = venda_form.save(commit=False)
+                    venda.cliente = cliente 
+                    venda.vendedor = request.user
+                    venda.save() 
+                    
+                    ficheiros_enviados = request.FILES.getlist('arquivo') 
+                    if ficheiros_enviados:
+                        _criar_anexos_venda(venda, 'comprovante', ficheiros_enviados)
+                        _marcar_comprovante_enviado(venda, 'comprovante')
+                return redirect('dashboard')
+            except ErroArmazenamento as exc:
+                anexo_form.add_error('arquivo', f"Não foi possível enviar os ficheiros. {exc}")
     
     else: # GET
         venda_form = VendaForm()
@@ -360,10 +347,11 @@ def detalhe_venda(request, venda_id):
     
     perms = _get_user_permissions(request.user)
     
+    vendas = Venda.objects.select_related('cliente', 'produto', 'vendedor', 'forma_pagamento')
     if perms['is_admin'] or perms['is_gestor'] or perms['is_financeiro'] or perms['is_advogado']:
-        venda = get_object_or_404(Venda, id=venda_id)
+        venda = get_object_or_404(vendas, id=venda_id)
     else: 
-        venda = get_object_or_404(Venda, id=venda_id, vendedor=request.user)
+        venda = get_object_or_404(vendas, id=venda_id, vendedor=request.user)
     
     is_locked = (venda.status_contrato != 'nao_gerado')
     pagamento_aprovado = (venda.status_pagamento == 'aprovado')
@@ -376,21 +364,18 @@ def detalhe_venda(request, venda_id):
         acao = request.POST.get('acao')
         
         if acao in ['add_comprovante', 'add_contrato', 'add_nota_fiscal']:
-            # ... (Lógica de upload de AnexoVenda permanece a mesma) ...
-            tipo_anexo = acao.split('_')[-1]
+            # (Com S3 o browser envia diretamente, ver 'anexo_upload_preparar')
+            tipo_anexo = acao[len('add_'):]
             ficheiros_enviados = request.FILES.getlist('arquivos')
-            pode_enviar = (perms['is_admin'] or perms['is_gestor'] or
-                           (perms['is_financeiro'] and tipo_anexo in ['comprovante', 'nota_fiscal']) or
-                           (perms['is_advogado'] and tipo_anexo == 'contrato') or
-                           (perms['is_vendedor'] and tipo_anexo == 'comprovante'))
+            pode_enviar = _pode_enviar_anexo(perms, tipo_anexo)
             
             if pode_enviar and ficheiros_enviados:
-                for f in ficheiros_enviados:
-                    AnexoVenda.objects.create(venda=venda, tipo=tipo_anexo, arquivo=f, descricao=f.name)
-                if tipo_anexo == 'comprovante' and venda.status_pagamento == 'pendente':
-                    venda.status_pagamento = 'aguardando_validacao'
-                    venda.save()
-                messages.success(request, f"{len(ficheiros_enviados)} ficheiro(s) enviado(s).")
+                try:
+                    _criar_anexos_venda(venda, tipo_anexo, ficheiros_enviados)
+                    _marcar_comprovante_enviado(venda, tipo_anexo)
+                    messages.success(request, f"{len(ficheiros_enviados)} ficheiro(s) enviado(s).")
+                except ErroArmazenamento as exc:
+                    messages.error(request, f"Nenhum ficheiro foi guardado. {exc}")
             elif not ficheiros_enviados: messages.error(request, "Nenhum ficheiro selecionado.")
             else: messages.error(request, "Você não tem permissão para enviar este tipo de anexo.")
             return redirect('detalhe_venda', venda_id=venda.id)
@@ -441,8 +426,18 @@ def detalhe_venda(request, venda_id):
     venda_form = VendaEditForm(instance=venda)
     cliente_form = ClienteEditForm(instance=venda.cliente) # (Usa ClienteEditForm de 'common.forms')
 
+    # Anexos: uma única query, agrupados por tipo para as três secções do template.
+    # (Os links apontam para 'abrir_anexo', que só gera o URL assinado no clique)
+    anexos_por_tipo = {tipo: [] for tipo, _ in AnexoVenda.TIPO_ANEXO_CHOICES}
+    for anexo in venda.anexos.order_by('data_upload'):
+        anexos_por_tipo.setdefault(anexo.tipo, []).append(anexo)
+
     context = {
         'venda': venda, 'anexo_form': AnexoForm(), 'status_form': status_form,
+        'anexos_comprovante': anexos_por_tipo['comprovante'],
+        'anexos_contrato': anexos_por_tipo['contrato'],
+        'anexos_nota_fiscal': anexos_por_tipo['nota_fiscal'],
+        'upload_direto': suporta_upload_direto(),
         'venda_form': venda_form, 'cliente_form': cliente_form,
         'perms': perms, 'is_locked': is_locked, 'pagamento_aprovado': pagamento_aprovado,
         'can_edit_data': can_edit_data,
@@ -463,6 +458,113 @@ def detalhe_venda(request, venda_id):
 # ---
 # (As views 'get_produto_data' e 'check_cliente' foram MOVIDAS)
 
+def _pode_enviar_anexo(perms, tipo_anexo):
+    """ Quem pode enviar cada tipo de anexo de uma venda. """
+    return (perms['is_admin'] or perms['is_gestor'] or
+            (perms['is_financeiro'] and tipo_anexo in ['comprovante', 'nota_fiscal']) or
+            (perms['is_advogado'] and tipo_anexo == 'contrato') or
+            (perms['is_vendedor'] and tipo_anexo == 'comprovante'))
+
+def _criar_anexos_venda(venda, tipo_anexo, ficheiros):
+    """
+    Guarda os ficheiros por conteúdo (em paralelo, sem repetir o que já
+    existe) e cria os AnexoVenda com um único bulk_create.
+    Em caso de falha nada fica gravado.
+    """
+    guardados = guardar_por_conteudo(ficheiros)
+    try:
+        AnexoVenda.objects.bulk_create([
+            AnexoVenda(venda=venda, tipo=tipo_anexo, arquivo=g.nome, sha256=g.sha256, descricao=g.descricao)
+            for g in guardados
+        ])
+    except Exception:
+        apagar_novos(guardados)
+        raise
+    agendar_miniaturas()
+
+def _marcar_comprovante_enviado(venda, tipo_anexo):
+    """ Um comprovante enviado numa venda pendente passa-a para 'aguardando validação'. """
+    if tipo_anexo == 'comprovante' and venda.status_pagamento == 'pendente':
+        venda.status_pagamento = 'aguardando_validacao'
+        venda.save()
+
+def _venda_para_upload(request, venda_id, tipo_anexo):
+    perms = _get_user_permissions(request.user)
+    vendas = Venda.objects.all() if perms.ve_todas_as_vendas else Venda.objects.filter(vendedor=request.user)
+    venda = get_object_or_404(vendas, id=venda_id)
+    if not isinstance(tipo_anexo, str):
+        raise ErroUploadDireto("Tipo de anexo inválido.")
+    if tipo_anexo not in dict(AnexoVenda.TIPO_ANEXO_CHOICES) or not _pode_enviar_anexo(perms, tipo_anexo):
+        raise PermissionDenied
+    return venda
+
+@login_required
+@require_POST
+def anexo_upload_preparar(request, venda_id):
+    """ API: políticas de upload direto (S3) para anexos da venda, ver 'common/uploads_diretos.py' """
+    try:
+        if not suporta_upload_direto():
+            raise ErroUploadDireto("Upload direto indisponível neste ambiente.")
+        dados = ler_pedido_json(request)
+        tipo_anexo = dados.get('tipo')
+        venda = _venda_para_upload(request, venda_id, tipo_anexo)
+        uploads = preparar_uploads(
+            dados.get('ficheiros'),
+            lambda nome: get_anexo_upload_path(AnexoVenda(venda=venda, tipo=tipo_anexo), nome),
+            destino=f"venda:{venda.id}:{tipo_anexo}",
+        )
+    except ErroUploadDireto as exc:
+        return JsonResponse({'erro': str(exc)}, status=400)
+    return JsonResponse({'uploads': uploads})
+
+@login_required
+@require_POST
+@transaction.atomic
+def anexo_upload_confirmar(request, venda_id):
+    """ API: cria os AnexoVenda dos ficheiros que o browser enviou diretamente ao S3 """
+    try:
+        dados = ler_pedido_json(request)
+        tipo_anexo = dados.get('tipo')
+        venda = _venda_para_upload(request, venda_id, tipo_anexo)
+        confirmados = confirmar_uploads(dados.get('tokens'), destino=f"venda:{venda.id}:{tipo_anexo}")
+    except ErroUploadDireto as exc:
+        return JsonResponse({'erro': str(exc)}, status=400)
+
+    AnexoVenda.objects.bulk_create([
+        AnexoVenda(venda=venda, tipo=tipo_anexo, arquivo=chave, descricao=nome, sha256=sha256)
+        for chave, nome, sha256 in confirmados
+    ])
+    agendar_miniaturas()
+    _marcar_comprovante_enviado(venda, tipo_anexo)
+    messages.success(request, f"{len(confirmados)} ficheiro(s) enviado(s).")
+    return JsonResponse({'criados': len(confirmados)})
+
+@login_required
+def abrir_anexo(request, anexo_id):
+    """
+    Redireciona para o ficheiro do anexo. O URL (assinado, no S3) só é
+    gerado aqui, no clique, e não para todos os anexos ao mostrar a venda.
+    """
+    anexo = get_object_or_404(AnexoVenda.objects.select_related('venda'), id=anexo_id)
+    perms = _get_user_permissions(request.user)
+    if not perms.ve_todas_as_vendas and anexo.venda.vendedor_id != request.user.id:
+        return HttpResponseForbidden()
+    return redirect(anexo.arquivo.url)
+
+@login_required
+def miniatura_anexo(request, anexo_id):
+    """ Redireciona para a miniatura do anexo (ver 'vendas/miniaturas.py'). """
+    anexo = get_object_or_404(
+        AnexoVenda.objects.select_related('venda'), id=anexo_id, miniatura_estado='pronta'
+    )
+    perms = _get_user_permissions(request.user)
+    if not perms.ve_todas_as_vendas and anexo.venda.vendedor_id != request.user.id:
+        return HttpResponseForbidden()
+    resposta = redirect(anexo.miniatura.url)
+    # (O browser reutiliza o redirect; o URL assinado fica válido bem mais tempo)
+    patch_cache_control(resposta, private=True, max_age=MINIATURA_REDIRECT_MAX_AGE)
+    return resposta
+
 # (A view 'delete_anexo' permanece aqui, pois está ligada ao AnexoVenda)
 @login_required
 @transaction.atomic
@@ -484,7 +586,7 @@ def delete_anexo(request, anexo_id):
         if anexo.tipo == 'comprovante' and not pagamento_aprovado:
             pode_excluir = True
     if pode_excluir:
-        anexo.arquivo.delete(save=False); anexo.delete()
+        anexo.delete()  # (O ficheiro é apagado em segundo plano, ver 'common/remocoes.py')
         messages.success(request, f"Anexo '{anexo.descricao or anexo.id}' foi excluído com sucesso.")
     else: messages.error(request, "Você não tem permissão para excluir este anexo.")
     return redirect('detalhe_venda', venda_id=venda.id)
@@ -496,99 +598,22 @@ def delete_anexo(request, anexo_id):
 
 @login_required
 def export_vendas_csv(request):
-    """ Exportação de Vendas (Permanece aqui) """
+    """ Exportação de Vendas em CSV (streaming, ver 'vendas/exportacao.py') """
+    if pedido_assincrono(request):
+        return resposta_exportacao_assincrona(request, 'vendas', 'csv')
     vendas = _get_vendas_filtradas(request)
-    response = HttpResponse(content_type='text/csv'); 
-    response['Content-Disposition'] = 'attachment; filename="relatorio_vendas.csv"'
-    writer = csv.writer(response, delimiter=';') 
-    writer.writerow([
-        'ID Venda', 
-        'Data', 
-        'Vendedor', 
-        'Cliente', 
-        'CPF/CNPJ', 
-        'Produto', 
-        'Honorarios Totais', 
-        'Entrada', 
-        'N Parcelas', 
-        'Valor Parcela', 
-        'Exito', 
-        'Aporte', 
-        'Status Venda', 
-        'Status Pagamento', 
-        'Status Contrato'
-    ])
-    for venda in vendas: 
-        writer.writerow([
-            venda.id, 
-            venda.data_venda.strftime('%Y-%m-%d %H:%M'), 
-            venda.vendedor.username, 
-            venda.cliente.nome_completo, 
-            venda.cliente.cpf_cnpj, 
-            venda.produto.nome, 
-            venda.honorarios, 
-            venda.valor_entrada, 
-            venda.num_parcelas, 
-            venda.valor_parcela, 
-            venda.valor_exito, 
-            venda.valor_aporte, 
-            venda.get_status_venda_display(), 
-            venda.get_status_pagamento_display(), 
-            venda.get_status_contrato_display()
-        ])
-    return response
+    return resposta_csv_streaming(VENDAS_CABECALHO, linhas_vendas_csv(vendas), 'relatorio_vendas.csv')
 
 @login_required
 def export_vendas_xlsx(request):
-    """ Exportação de Vendas (Permanece aqui) """
+    """ Exportação de Vendas em XLSX (write-only, ver 'common/exportacao.py') """
+    if pedido_assincrono(request):
+        return resposta_exportacao_assincrona(request, 'vendas', 'xlsx')
     vendas = _get_vendas_filtradas(request)
-    wb = openpyxl.Workbook(); 
-    ws = wb.active; ws.title = "Relatório de Vendas"
-    headers = [
-        'ID Venda',
-        'Data',
-        'Vendedor',
-        'Cliente',
-        'CPF/CNPJ',
-        'Produto',
-        'Honorarios Totais',
-        'Entrada',
-        'N Parcelas',
-        'Valor Parcela',
-        'Exito',
-        'Aporte',
-        'Status Venda',
-        'Status Pagamento',
-        'Status Contrato'
-    ]
-    ws.append(headers)
-    for venda in vendas: 
-        ws.append([
-            venda.id,
-            venda.data_venda.replace(tzinfo=None),
-            venda.vendedor.username,
-            venda.cliente.nome_completo,
-            venda.cliente.cpf_cnpj,
-            venda.produto.nome,
-            float(venda.honorarios or 0),
-            float(venda.valor_entrada or 0),
-            venda.num_parcelas,
-            float(venda.valor_parcela or 0),
-            float(venda.valor_exito or 0),
-            float(venda.valor_aporte or 0),
-            venda.get_status_venda_display(),
-            venda.get_status_pagamento_display(),
-            venda.get_status_contrato_display()
-        ])
-    try:
-        for col_num, header in enumerate(headers, 1): 
-            ws.column_dimensions[get_column_letter(col_num)].width = 20
-    except ImportError:
-        pass 
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet');
-    response['Content-Disposition'] = 'attachment; filename="relatorio_vendas.xlsx"'
-    wb.save(response)
-    return response
+    return resposta_xlsx_streaming(
+        "Relatório de Vendas", VENDAS_CABECALHO, linhas_vendas_xlsx(vendas),
+        'relatorio_vendas.xlsx', largura_colunas=20
+    )
 
 # ---
 # SEÇÃO 7: VIEWS DE GESTÃO DE METAS (MOVIDAS PARA 'comissoes/views.py')